@@ -2,18 +2,31 @@
 
 import { useState, useEffect } from 'react'
 import { useRouter } from 'next/navigation'
-import { RunResult } from '@/lib/types'
-import { getAllRuns } from '@/lib/storage'
+import { RunSummary } from '@/lib/types'
+import { listRuns } from '@/lib/api'
 
 export default function HistoryPage() {
   const router = useRouter()
-  const [runs, setRuns] = useState<RunResult[]>([])
+  const [runs, setRuns] = useState<RunSummary[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
 
   useEffect(() => {
-    setRuns(getAllRuns())
+    listRuns()
+      .then((page) => {
+        setRuns(page.items)
+        setNextCursor(page.nextCursor)
+      })
+      .catch((error) => console.error('Error loading runs:', error))
   }, [])
 
-  const getStatusColor = (status: RunResult['status']) => {
+  const loadMore = async () => {
+    if (!nextCursor) return
+    const page = await listRuns(nextCursor)
+    setRuns((current) => [...current, ...page.items])
+    setNextCursor(page.nextCursor)
+  }
+
+  const getStatusColor = (status: RunSummary['status']) => {
     switch (status) {
       case 'success':
         return 'bg-sage-100 text-sage-800'
@@ -106,6 +119,16 @@ export default function HistoryPage() {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <div className="border-t border-neutral-200 p-4 text-center">
+              <button
+                onClick={loadMore}
+                className="text-sm font-medium text-neutral-700 hover:text-neutral-900"
+              >
+                Load more
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -53,6 +53,13 @@ Requirements:
     },
     createPR: false,
     branch: 'main',
+    flakyReruns: 0,
+    flakyAction: 'quarantine',
+    mutationTesting: false,
+    mutationThreshold: 0,
+    minimizeSuite: false,
+    profileTests: false,
+    slowTestSeconds: 1,
   })
 
   const parseFunctions = (code: string): string[] => {
@@ -419,6 +426,84 @@ Requirements:
                 className="mt-1 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
               />
             </div>
+            <div>
+              <label className="block text-sm font-medium text-neutral-700">
+                Flaky Test Reruns
+              </label>
+              <input
+                type="number"
+                min="0"
+                max="20"
+                value={options.flakyReruns ?? 0}
+                onChange={(e) => setOptions({ ...options, flakyReruns: parseInt(e.target.value) || 0 })}
+                className="mt-1 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
+              />
+              {(options.flakyReruns ?? 0) > 0 && (
+                <select
+                  value={options.flakyAction ?? 'quarantine'}
+                  onChange={(e) => setOptions({ ...options, flakyAction: e.target.value as 'quarantine' | 'fix' })}
+                  className="mt-2 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
+                >
+                  <option value="quarantine">Quarantine flaky tests</option>
+                  <option value="fix">Send flaky tests to the fixer</option>
+                </select>
+              )}
+            </div>
+            <div>
+              <label className="flex items-center gap-2 text-sm font-medium text-neutral-700">
+                <input
+                  type="checkbox"
+                  checked={options.mutationTesting ?? false}
+                  onChange={(e) => setOptions({ ...options, mutationTesting: e.target.checked })}
+                  className="rounded border-neutral-300 text-sage-600 focus:ring-sage-500"
+                />
+                Mutation Testing
+              </label>
+              {options.mutationTesting && (
+                <input
+                  type="number"
+                  min="0"
+                  max="100"
+                  value={options.mutationThreshold ?? 0}
+                  onChange={(e) => setOptions({ ...options, mutationThreshold: parseInt(e.target.value) || 0 })}
+                  placeholder="Minimum mutation score (%)"
+                  className="mt-2 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
+                />
+              )}
+            </div>
+            <div>
+              <label className="flex items-center gap-2 text-sm font-medium text-neutral-700">
+                <input
+                  type="checkbox"
+                  checked={options.minimizeSuite ?? false}
+                  onChange={(e) => setOptions({ ...options, minimizeSuite: e.target.checked })}
+                  className="rounded border-neutral-300 text-sage-600 focus:ring-sage-500"
+                />
+                Remove Redundant Tests
+              </label>
+            </div>
+            <div>
+              <label className="flex items-center gap-2 text-sm font-medium text-neutral-700">
+                <input
+                  type="checkbox"
+                  checked={options.profileTests ?? false}
+                  onChange={(e) => setOptions({ ...options, profileTests: e.target.checked })}
+                  className="rounded border-neutral-300 text-sage-600 focus:ring-sage-500"
+                />
+                Profile Tests
+              </label>
+              {options.profileTests && (
+                <input
+                  type="number"
+                  min="0"
+                  step="0.1"
+                  value={options.slowTestSeconds ?? 1}
+                  onChange={(e) => setOptions({ ...options, slowTestSeconds: parseFloat(e.target.value) || 0 })}
+                  placeholder="Slow test threshold (seconds)"
+                  className="mt-2 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
+                />
+              )}
+            </div>
             <div>
               <label className="block text-sm font-medium text-neutral-700">
                 Test Style
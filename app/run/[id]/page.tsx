@@ -2,15 +2,22 @@
 
 import { useState, useEffect } from 'react'
 import { useRouter, useParams } from 'next/navigation'
-import { RunResult, RunEvent } from '@/lib/types'
-import { getRun, streamRunEvents, cancelRun } from '@/lib/api'
+import { RunResult, RunEvent, RunArtifact } from '@/lib/types'
+import { getRun, getRunArtifact, streamRunEvents, cancelRun, retryRun } from '@/lib/api'
 import { saveRun } from '@/lib/storage'
 import Stepper from '@/components/Stepper'
 import CodeViewer from '@/components/CodeViewer'
 import CoverageTable from '@/components/CoverageTable'
 import DiffViewer from '@/components/DiffViewer'
 
-type Tab = 'progress' | 'tests' | 'coverage' | 'diff' | 'pr'
+type Tab = 'progress' | 'tests' | 'output' | 'coverage' | 'diff' | 'pr'
+
+// Large run outputs, fetched only while the tab showing them is open
+const TAB_ARTIFACTS: Partial<Record<Tab, RunArtifact[]>> = {
+  tests: ['generated_tests'],
+  output: ['stdout', 'stderr'],
+  diff: ['patch_diff'],
+}
 
 export default function RunDetailsPage() {
   const router = useRouter()
@@ -22,11 +29,36 @@ export default function RunDetailsPage() {
   const [logs, setLogs] = useState<string[]>([])
   const [isStreaming, setIsStreaming] = useState(false)
   const [cancelStream, setCancelStream] = useState<(() => void) | null>(null)
+  const [artifacts, setArtifacts] = useState<Partial<Record<RunArtifact, string>>>({})
 
   useEffect(() => {
     loadRun()
   }, [runId])
 
+  useEffect(() => {
+    if (!run) return
+    const finished = run.status === 'success' || run.status === 'failed' || run.status === 'cancelled'
+    // Outputs change while the run is in progress; once it has finished they are fetched once
+    const needed = (TAB_ARTIFACTS[activeTab] ?? []).filter((name) => !finished || !(name in artifacts))
+    if (needed.length > 0) {
+      loadArtifacts(needed)
+    }
+  }, [activeTab, run?.status, run?.updatedAt])
+
+  const loadArtifacts = async (names: RunArtifact[]) => {
+    const loaded = await Promise.all(names.map((name) => getRunArtifact(runId, name)))
+    setArtifacts((prev) => {
+      const next = { ...prev }
+      names.forEach((name, index) => {
+        const content = loaded[index]
+        if (content !== null) {
+          next[name] = content
+        }
+      })
+      return next
+    })
+  }
+
   const loadRun = async () => {
     const loaded = await getRun(runId)
     if (loaded) {
@@ -42,7 +74,7 @@ export default function RunDetailsPage() {
     
     setIsStreaming(true)
     const payload = {
-      code: initialRun.code,
+      code: initialRun.code ?? '',
       functionName: initialRun.functionName,
       options: initialRun.options,
     }
@@ -79,9 +111,16 @@ export default function RunDetailsPage() {
     await loadRun()
   }
 
-  const handleDownloadPatch = () => {
-    if (!run?.patchDiff) return
-    const blob = new Blob([run.patchDiff], { type: 'text/plain' })
+  const handleRetry = async () => {
+    await retryRun(runId)
+    setLogs([])
+    await loadRun()
+  }
+
+  const handleDownloadPatch = async () => {
+    const patchDiff = artifacts.patch_diff ?? await getRunArtifact(runId, 'patch_diff')
+    if (!patchDiff) return
+    const blob = new Blob([patchDiff], { type: 'text/plain' })
     const url = URL.createObjectURL(blob)
     const a = document.createElement('a')
     a.href = url
@@ -106,9 +145,12 @@ export default function RunDetailsPage() {
     )
   }
 
+  const patchReady = run.steps.some((step) => step.name === 'pr_ready_output' && step.status === 'success')
+
   const tabs: { id: Tab; label: string }[] = [
     { id: 'progress', label: 'Progress Log' },
     { id: 'tests', label: 'Generated Tests' },
+    { id: 'output', label: 'Test Output' },
     { id: 'coverage', label: 'Coverage' },
     { id: 'diff', label: 'Diff' },
   ]
@@ -135,7 +177,15 @@ export default function RunDetailsPage() {
               Stop Run
             </button>
           )}
-          {run.patchDiff && (
+          {(run.status === 'failed' || run.status === 'cancelled') && (
+            <button
+              onClick={handleRetry}
+              className="rounded-md border border-neutral-300 bg-white px-4 py-2 text-sm font-medium text-neutral-700 transition-colors hover:bg-neutral-50"
+            >
+              Retry
+            </button>
+          )}
+          {patchReady && (
             <button
               onClick={handleDownloadPatch}
               className="rounded-md border border-neutral-300 bg-white px-4 py-2 text-sm font-medium text-neutral-700 transition-colors hover:bg-neutral-50"
@@ -199,14 +249,35 @@ export default function RunDetailsPage() {
 
               {activeTab === 'tests' && (
                 <div>
-                  {run.generatedTests ? (
-                    <CodeViewer code={run.generatedTests} language="python" filename={`test_${run.functionName}.py`} />
+                  {artifacts.generated_tests ? (
+                    <CodeViewer code={artifacts.generated_tests} language="python" filename={`test_${run.functionName}.py`} />
                   ) : (
                     <div className="text-center py-12 text-neutral-500">Tests not generated yet</div>
                   )}
                 </div>
               )}
 
+              {activeTab === 'output' && (
+                <div className="space-y-4">
+                  {artifacts.stdout || artifacts.stderr ? (
+                    <>
+                      {artifacts.stdout && (
+                        <pre className="overflow-x-auto whitespace-pre-wrap rounded-md bg-neutral-900 p-4 font-mono text-sm text-neutral-100">
+                          {artifacts.stdout}
+                        </pre>
+                      )}
+                      {artifacts.stderr && (
+                        <pre className="overflow-x-auto whitespace-pre-wrap rounded-md bg-neutral-900 p-4 font-mono text-sm text-red-300">
+                          {artifacts.stderr}
+                        </pre>
+                      )}
+                    </>
+                  ) : (
+                    <div className="text-center py-12 text-neutral-500">Test output not available yet</div>
+                  )}
+                </div>
+              )}
+
               {activeTab === 'coverage' && (
                 <div>
                   {run.coverageSummary.lines > 0 ? (
@@ -219,8 +290,8 @@ export default function RunDetailsPage() {
 
               {activeTab === 'diff' && (
                 <div>
-                  {run.patchDiff ? (
-                    <DiffViewer diff={run.patchDiff} />
+                  {artifacts.patch_diff ? (
+                    <DiffViewer diff={artifacts.patch_diff} />
                   ) : (
                     <div className="text-center py-12 text-neutral-500">Diff not available yet</div>
                   )}
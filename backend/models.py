@@ -9,6 +9,9 @@ PipelineStepName = Literal[
     "run_tests",
     "fix_tests",
     "coverage_report",
+    "mutation_testing",
+    "minimize_suite",
+    "profile_tests",
     "pr_ready_output",
     "open_pr",
 ]
@@ -34,6 +37,23 @@ class RunOptions(BaseModel):
     create_pr: bool = False
     repo_url: Optional[str] = None
     branch: str = "main"
+    # Test file path in repo_url; defaults to experiments/{run_id}/test_{function_name}.py
+    test_path: Optional[str] = None
+    # Randomized-order reruns of the passing suite to find flaky tests; 0 disables
+    flaky_reruns: int = 0
+    flaky_action: Literal["quarantine", "fix"] = "quarantine"
+    # Optional mutation-testing step; the step fails below mutation_threshold percent
+    mutation_testing: bool = False
+    mutation_threshold: int = 0
+    # Drop tests that add no line, branch or mutant coverage to the rest of the suite
+    minimize_suite: bool = False
+    # Checkout under LOCAL_REPO_ROOTS to run the tests against, with its own
+    # dependencies; module_path is the code's file in it, for package imports
+    local_repo: Optional[str] = None
+    module_path: Optional[str] = None
+    # Profile the final suite with cProfile; tests slower than slow_test_seconds are flagged
+    profile_tests: bool = False
+    slow_test_seconds: float = 1.0
 
 
 class StartRunPayload(BaseModel):
@@ -42,6 +62,35 @@ class StartRunPayload(BaseModel):
     options: RunOptions
 
 
+class IncrementalRunPayload(BaseModel):
+    code: str
+    previous_run_ids: List[str]
+    options: Optional[RunOptions] = None
+    include_new_functions: bool = True
+
+
+class ParsePayload(BaseModel):
+    code: str
+
+
+class SymbolInfo(BaseModel):
+    name: str
+    qualname: str
+    kind: Literal["function", "async_function", "class", "method"]
+    signature: str
+    lineno: int
+    end_lineno: int
+    complexity: int
+    nesting_depth: int
+    lines: int
+    docstring: Optional[str] = None
+
+
+class ParseResult(BaseModel):
+    content_hash: str
+    symbols: List[SymbolInfo]
+
+
 class PipelineStep(BaseModel):
     name: PipelineStepName
     status: StepStatus
@@ -82,10 +131,27 @@ class RunResult(BaseModel):
     generated_tests: str
     test_run_output: Dict[str, Any]
     coverage_summary: CoverageSummary
+    # Lines and arcs each generated test executed: {node id: {"lines", "arcs"}}
+    test_coverage: Optional[Dict[str, Dict[str, List[Any]]]] = None
     patch_diff: str
     pr: Optional[PRInfo] = None
     artifacts_path: str
     iterations_used: int
+    cache_hit: bool = False
+    token_usage: List[Dict[str, Any]] = []
+    # CPU, memory and wall time of each sandboxed pytest process
+    resource_usage: List[Dict[str, Any]] = []
+    flaky_report: Optional[Dict[str, Any]] = None
+    mutation_score: Optional[float] = None
+    mutation_report: Optional[Dict[str, Any]] = None
+    # Tests removed by minimize_suite and the runtime and size saved
+    minimization: Optional[Dict[str, Any]] = None
+    # Per-test durations, hot functions and time in the target from profile_tests
+    profile: Optional[Dict[str, Any]] = None
+    # pstats listing of the profiled run, served as the "profile" artifact
+    profile_stats: str = ""
+    # Outputs of completed steps, keyed by step name, used to resume a run
+    checkpoints: Dict[str, Dict[str, Any]] = {}
     steps: List[Dict[str, Any]]  # List of PipelineStep dicts
     created_at: str
     updated_at: str
@@ -0,0 +1,138 @@
+import hashlib
+import re
+import zlib
+from typing import Iterator, Mapping, Optional, Tuple
+
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+CHUNK_SIZE = 64 * 1024
+# Payloads smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_ENCODED_SUFFIX = re.compile(r"-(gzip|br)\"$")
+
+
+def compute_etag(content: bytes) -> str:
+    """Strong ETag derived from the artifact content"""
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    # Weak comparison, as required for If-None-Match: any encoding of the same content matches
+    return any(_ENCODED_SUFFIX.sub('"', tag) == etag for tag in candidates)
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single bytes range into inclusive (start, end), or None if unsatisfiable"""
+    match = _RANGE.match(header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    start_text, end_text = match.groups()
+    if not start_text:
+        # Suffix range: the last N bytes
+        length = int(end_text)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(start_text)
+    end = int(end_text) if end_text else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in accept_encoding.split(",")
+        if part.strip() and not part.strip().endswith("q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _iter_chunks(content: bytes) -> Iterator[bytes]:
+    for offset in range(0, len(content), CHUNK_SIZE):
+        yield content[offset:offset + CHUNK_SIZE]
+
+
+def _iter_compressed(content: bytes, encoding: str) -> Iterator[bytes]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        for chunk in _iter_chunks(content):
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        # wbits=31 produces a gzip container
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in _iter_chunks(content):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def artifact_response(
+    content: bytes, media_type: str, request_headers: Mapping[str, str]
+) -> Response:
+    """Serve an artifact with ETag revalidation, byte ranges and compression"""
+    etag = compute_etag(content)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = len(content)
+    range_header = request_headers.get("range")
+    if range_header:
+        if_range = request_headers.get("if-range")
+        if not if_range or if_range == etag:
+            byte_range = _parse_range(range_header, size)
+            if byte_range is None:
+                return Response(
+                    status_code=416,
+                    headers={**headers, "Content-Range": f"bytes */{size}"},
+                )
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _iter_chunks(content[start:end + 1]),
+                status_code=206,
+                media_type=media_type,
+                headers=headers,
+            )
+
+    encoding = None
+    if size >= MIN_COMPRESS_BYTES:
+        encoding = _choose_encoding(request_headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        # Each encoding is a distinct representation and needs its own tag
+        headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+        return StreamingResponse(
+            _iter_compressed(content, encoding), media_type=media_type, headers=headers
+        )
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(_iter_chunks(content), media_type=media_type, headers=headers)
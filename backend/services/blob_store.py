@@ -0,0 +1,62 @@
+import hashlib
+import threading
+import zlib
+from typing import Dict, Set
+
+
+def blob_digest(text: str) -> str:
+    """Content address of a blob"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class MemoryBlobStore:
+    """Content-addressed store for large run text, compressed in memory
+
+    Identical text is stored once however many runs refer to it, e.g. the
+    same source submitted over and over.
+    """
+
+    def __init__(self):
+        self._blobs: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def put(self, text: str) -> str:
+        digest = blob_digest(text)
+        with self._lock:
+            if digest not in self._blobs:
+                self._blobs[digest] = zlib.compress(text.encode("utf-8"))
+        return digest
+
+    def get(self, digest: str) -> str:
+        return zlib.decompress(self._blobs[digest]).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+
+class SQLiteBlobStore:
+    """Content-addressed blobs in the shared state database"""
+
+    def __init__(self, db):
+        self.db = db
+        # Digests this process already wrote, so unchanged text is only hashed on save
+        self._known: Set[str] = set()
+
+    def put(self, text: str) -> str:
+        digest = blob_digest(text)
+        if digest not in self._known:
+            self.db.execute(
+                "INSERT OR IGNORE INTO blobs (digest, data) VALUES (?, ?)",
+                (digest, zlib.compress(text.encode("utf-8"))),
+            )
+            self._known.add(digest)
+        return digest
+
+    def get(self, digest: str) -> str:
+        rows = self.db.execute("SELECT data FROM blobs WHERE digest = ?", (digest,))
+        if not rows:
+            raise KeyError(digest)
+        return zlib.decompress(rows[0][0]).decode("utf-8")
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM blobs")[0][0]
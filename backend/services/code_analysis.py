@@ -0,0 +1,145 @@
+import ast
+import copy
+import hashlib
+from typing import Dict, List, Optional, Set
+
+from services.module_parser import ParsedModule, find_definition, parse_module
+
+
+def _strip_docstrings(node: ast.AST) -> ast.AST:
+    """Remove docstrings so documentation-only edits do not change hashes"""
+    for child in ast.walk(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Module)):
+            body = child.body
+            if (
+                body
+                and isinstance(body[0], ast.Expr)
+                and isinstance(body[0].value, ast.Constant)
+                and isinstance(body[0].value.value, str)
+            ):
+                child.body = body[1:] or [ast.Pass()]
+    return node
+
+
+def normalized_dump(node: ast.AST) -> str:
+    """Dump a node without positions, comments, formatting or docstrings"""
+    clone = copy.deepcopy(node)
+    return ast.dump(_strip_docstrings(clone), include_attributes=False)
+
+
+def top_level_definitions(tree: ast.Module) -> Dict[str, ast.stmt]:
+    """Map every module-level name to the statement that binds it"""
+    definitions: Dict[str, ast.stmt] = {}
+    for stmt in tree.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            definitions[stmt.name] = stmt
+        elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            for alias in stmt.names:
+                name = alias.asname or alias.name.split(".")[0]
+                definitions[name] = stmt
+        elif isinstance(stmt, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+            for target in targets:
+                for name_node in ast.walk(target):
+                    if isinstance(name_node, ast.Name):
+                        definitions[name_node.id] = stmt
+    return definitions
+
+
+def referenced_names(node: ast.AST) -> Set[str]:
+    """Collect the free names a definition reads"""
+    return {
+        child.id
+        for child in ast.walk(node)
+        if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load)
+    }
+
+
+def dependency_slice(tree: ast.Module, name: str) -> List[ast.stmt]:
+    """Return the target definition plus the module-level statements it transitively uses"""
+    target = find_definition(tree, name)
+    if target is None:
+        return []
+
+    definitions = top_level_definitions(tree)
+    seen: Set[int] = {id(target)}
+    ordered: List[ast.stmt] = [target]
+    pending = list(referenced_names(target))
+
+    while pending:
+        dep_name = pending.pop()
+        stmt = definitions.get(dep_name)
+        if stmt is None or id(stmt) in seen:
+            continue
+        seen.add(id(stmt))
+        ordered.append(stmt)
+        pending.extend(referenced_names(stmt))
+
+    # Keep source order so the slice hash does not depend on traversal order
+    return sorted(ordered, key=lambda stmt: (stmt.lineno, stmt.col_offset))
+
+
+def function_fingerprint(code: str, function_name: str) -> Optional[str]:
+    """Hash the normalized AST of a function and its dependency slice
+
+    Returns None when the code does not parse or the target is missing, so
+    callers can fall back to running the full pipeline.
+    """
+    try:
+        module = parse_module(code)
+    except SyntaxError:
+        return None
+    return _module_fingerprint(module, function_name)
+
+
+def _module_fingerprint(module: ParsedModule, function_name: str) -> Optional[str]:
+    key = ("fingerprint", function_name)
+    if key not in module.memo:
+        module.memo[key] = _fingerprint_tree(module.tree, function_name)
+    return module.memo[key]
+
+
+def _fingerprint_tree(tree: ast.Module, function_name: str) -> Optional[str]:
+    slice_nodes = dependency_slice(tree, function_name)
+    if not slice_nodes:
+        return None
+
+    digest = hashlib.sha256()
+    for stmt in slice_nodes:
+        digest.update(normalized_dump(stmt).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def function_hashes(code: str) -> Dict[str, str]:
+    """Fingerprint every module-level function and class in the code"""
+    try:
+        module = parse_module(code)
+    except SyntaxError:
+        return {}
+
+    hashes: Dict[str, str] = {}
+    for stmt in module.tree.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            fingerprint = _module_fingerprint(module, stmt.name)
+            if fingerprint is not None:
+                hashes[stmt.name] = fingerprint
+    return hashes
+
+
+def diff_functions(old_code: str, new_code: str) -> Dict[str, List[str]]:
+    """Compare two module versions at function granularity"""
+    old_hashes = function_hashes(old_code)
+    new_hashes = function_hashes(new_code)
+    return {
+        "changed": sorted(
+            name for name in new_hashes
+            if name in old_hashes and old_hashes[name] != new_hashes[name]
+        ),
+        "added": sorted(name for name in new_hashes if name not in old_hashes),
+        "removed": sorted(name for name in old_hashes if name not in new_hashes),
+        "unchanged": sorted(
+            name for name in new_hashes
+            if name in old_hashes and old_hashes[name] == new_hashes[name]
+        ),
+    }
@@ -1,8 +1,24 @@
+import asyncio
 import os
-import subprocess
 import json
-from typing import Dict, List
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
 from models import CoverageSummary, CoverageFile
+from services.hypothesis_profile import profile_env, pytest_plugin_args, uses_hypothesis
+from services.repo_env import runtime
+from services.sandbox import Sandbox
+
+# {test node id: {"lines": [...], "arcs": [[from, to], ...]}}
+TestCoverage = Dict[str, Dict[str, List[Any]]]
+
+
+def lines_to_tests(test_coverage: TestCoverage) -> Dict[int, Set[str]]:
+    """Invert a per-test coverage map into the tests that executed each line"""
+    contexts: Dict[int, Set[str]] = {}
+    for test, covered in test_coverage.items():
+        for line in covered["lines"]:
+            contexts.setdefault(int(line), set()).add(test)
+    return contexts
 
 
 class CoverageReporter:
@@ -11,11 +27,12 @@ class CoverageReporter:
     def __init__(self):
         self.temp_dir = os.path.join(os.getcwd(), "temp_runs")
         os.makedirs(self.temp_dir, exist_ok=True)
+        self.sandbox = Sandbox()
     
     async def generate_report(
-        self, run_id: str, function_name: str
+        self, run_id: str, function_name: str, usage: Optional[List[Dict[str, Any]]] = None
     ) -> CoverageSummary:
-        """Generate coverage report using pytest-cov"""
+        """Generate coverage report by running pytest-cov in the sandbox"""
         
         run_dir = os.path.join(self.temp_dir, run_id)
         test_path = os.path.join(run_dir, f"test_{function_name}.py")
@@ -25,21 +42,36 @@ class CoverageReporter:
                 lines=0, branches=0, functions=0, files=[]
             )
         
-        # Run pytest with coverage
+        # Run pytest with coverage; this is the final run, so Hypothesis searches fully
         try:
-            result = subprocess.run(
+            with open(test_path, "r") as f:
+                test_code = f.read()
+            python, env = runtime(run_dir)
+            if uses_hypothesis(test_code):
+                with open(os.path.join(run_dir, "your_module.py"), "r") as f:
+                    env.update(profile_env(f.read(), function_name, "full"))
+            result = await asyncio.to_thread(
+                self.sandbox.run,
                 [
+                    python,
+                    "-m",
                     "pytest",
                     test_path,
                     "--cov=your_module",
+                    # Arcs and the test that executed each of them, for per-test maps
+                    "--cov-branch",
+                    "--cov-context=test",
                     "--cov-report=json",
                     "--cov-report=term",
-                ],
-                capture_output=True,
-                text=True,
-                cwd=run_dir,
-                timeout=30,
+                ]
+                + pytest_plugin_args(test_code),
+                run_dir,
+                env=env,
             )
+            if usage is not None:
+                usage.append(
+                    {"command": "coverage", "exit_code": result["exit_code"], **result["resource_usage"]}
+                )
             
             # Parse coverage JSON
             coverage_json_path = os.path.join(run_dir, "coverage.json")
@@ -58,15 +90,16 @@ class CoverageReporter:
                     files.append(
                         CoverageFile(
                             filename=filename,
-                            percent=int(summary.get("percent_covered", 0)),
+                            percent=_percent(summary, "covered_lines", "num_statements"),
                             lines=summary.get("num_statements", 0),
                             branches=summary.get("num_branches", 0),
                         )
                     )
                 
+                # With branch coverage percent_covered mixes lines and branches
                 return CoverageSummary(
-                    lines=int(totals.get("percent_covered", 0)),
-                    branches=int(totals.get("percent_covered_branches", 0)),
+                    lines=_percent(totals, "covered_lines", "num_statements"),
+                    branches=_percent(totals, "covered_branches", "num_branches"),
                     functions=int(totals.get("percent_covered_functions", 0)),
                     files=files,
                 )
@@ -76,32 +109,46 @@ class CoverageReporter:
         
         return CoverageSummary(lines=0, branches=0, functions=0, files=[])
     
-    async def create_patch(
-        self, run_id: str, function_name: str, test_code: str
-    ) -> str:
-        """Create a git patch diff for the test file"""
-        
-        run_dir = os.path.join(self.temp_dir, run_id)
-        test_path = os.path.join(run_dir, f"test_{function_name}.py")
-        artifacts_path = f"experiments/{run_id}/test_{function_name}.py"
-        
-        if not os.path.exists(test_path):
-            return ""
-        
-        # Create a simple diff format
-        with open(test_path, "r") as f:
-            test_lines = f.readlines()
-        
-        diff_lines = [
-            f"diff --git a/{artifacts_path} b/{artifacts_path}",
-            "new file mode 100644",
-            "index 0000000..1234567",
-            "--- /dev/null",
-            f"+++ b/{artifacts_path}",
-            "@@ -0,0 +1,{} @@".format(len(test_lines)),
-        ]
-        
-        for line in test_lines:
-            diff_lines.append(f"+{line.rstrip()}")
-        
-        return "\n".join(diff_lines)
+    def test_contexts(self, run_id: str) -> TestCoverage:
+        """Lines and arcs of your_module each test executed in the last coverage run"""
+        data_path = os.path.join(self.temp_dir, run_id, ".coverage")
+        if not os.path.exists(data_path):
+            return {}
+        try:
+            from coverage import CoverageData
+            
+            data = CoverageData(basename=data_path)
+            data.read()
+            filename = next(
+                (f for f in data.measured_files() if os.path.basename(f) == "your_module.py"),
+                None,
+            )
+            if filename is None:
+                return {}
+            lines: Dict[str, Set[int]] = {}
+            arcs: Dict[str, Set[Tuple[int, int]]] = {}
+            # Contexts look like "test_add.py::test_zero|run"; the empty one is import time
+            for context in sorted(c for c in data.measured_contexts() if c):
+                test = context.rsplit("|", 1)[0]
+                # Query contexts are regexes matched with search
+                data.set_query_contexts([f"^{re.escape(context)}$"])
+                lines.setdefault(test, set()).update(data.lines(filename) or ())
+                arcs.setdefault(test, set()).update(data.arcs(filename) or ())
+            return {
+                test: {"lines": sorted(lines[test]), "arcs": [list(arc) for arc in sorted(arcs[test])]}
+                for test in lines
+                if lines[test]
+            }
+        except Exception as e:
+            print(f"Error reading coverage contexts: {e}")
+            return {}
+    
+    def line_contexts(self, run_id: str) -> Dict[int, Set[str]]:
+        """Test node ids that executed each line of your_module in the last coverage run"""
+        return lines_to_tests(self.test_contexts(run_id))
+
+
+def _percent(summary: Dict[str, Any], covered: str, total: str) -> int:
+    if not summary.get(total):
+        return 0
+    return int(100 * summary.get(covered, 0) / summary[total])
@@ -0,0 +1,233 @@
+import ast
+import asyncio
+import base64
+import difflib
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.repo_env import RepoEnvironments
+from services.state_backend import state_path
+
+# Touched after every successful fetch; its mtime is shared by all workers
+_FETCH_MARKER = "veritas-fetched"
+
+# Network transports a remote repo_url may use; file://, ext:: and the like would
+# let a run mirror or execute whatever is on the server
+_REMOTE_URL = re.compile(r"(https?|ssh|git)://[^/\s]+/\S+|[\w.-]+@[\w.-]+:[^\s-]\S*")
+
+
+def blob_id(content: str) -> str:
+    """The object id git gives a file with this content"""
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def unified_diff(path: str, old: Optional[str], new: str, context: int = 3) -> str:
+    """git-style unified diff turning old (None for a new file) into new at path"""
+    if old == new:
+        return ""
+    old_lines = (old or "").splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    header = [f"diff --git a/{path} b/{path}"]
+    if old is None:
+        header += ["new file mode 100644", f"index 0000000..{blob_id(new)[:7]}"]
+    else:
+        header.append(f"index {blob_id(old)[:7]}..{blob_id(new)[:7]} 100644")
+    header += ["--- /dev/null" if old is None else f"--- a/{path}", f"+++ b/{path}"]
+
+    body = []
+    diff = difflib.unified_diff(old_lines, new_lines, n=context)
+    for line in list(diff)[2:]:  # difflib's own ---/+++ lines
+        if line.endswith("\n"):
+            body.append(line[:-1])
+        else:
+            body += [line, "\\ No newline at end of file"]
+    return "\n".join(header + body) + "\n"
+
+
+def _first_line(node: ast.stmt) -> int:
+    return min([d.lineno for d in getattr(node, "decorator_list", [])] + [node.lineno])
+
+
+def merge_test_module(existing: str, generated: str) -> str:
+    """Fold a generated test module into an existing one with the smallest change
+
+    Definitions the existing file already has are replaced in place, new ones
+    are appended, and imports it lacks go after its own imports.
+    """
+    try:
+        old_tree, new_tree = ast.parse(existing), ast.parse(generated)
+    except SyntaxError:
+        return existing.rstrip("\n") + "\n\n\n" + generated
+    old_lines = existing.splitlines()
+    new_lines = generated.splitlines()
+
+    def segment(node: ast.stmt) -> List[str]:
+        return new_lines[_first_line(node) - 1:node.end_lineno]
+
+    definitions = {
+        stmt.name: stmt for stmt in old_tree.body
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+    imports = [stmt for stmt in old_tree.body if isinstance(stmt, (ast.Import, ast.ImportFrom))]
+    known = {ast.unparse(stmt) for stmt in old_tree.body}
+
+    # (first line, last line, replacement), 1-based and inclusive; last < first inserts
+    edits: List[Tuple[int, int, List[str]]] = []
+    new_imports: List[str] = []
+    appended: List[List[str]] = []
+    for stmt in new_tree.body:
+        if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            if ast.unparse(stmt) not in known:
+                new_imports += segment(stmt)
+        elif getattr(stmt, "name", None) in definitions:
+            old = definitions[stmt.name]
+            if old_lines[_first_line(old) - 1:old.end_lineno] != segment(stmt):
+                edits.append((_first_line(old), old.end_lineno, segment(stmt)))
+        elif ast.unparse(stmt) not in known and not (
+            isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant)
+        ):
+            appended.append(segment(stmt))
+
+    if new_imports:
+        after = imports[-1].end_lineno if imports else 0
+        if not imports and old_tree.body and isinstance(old_tree.body[0], ast.Expr):
+            after = old_tree.body[0].end_lineno  # keep the module docstring first
+        edits.append((after + 1, after, new_imports))
+    for start, end, replacement in sorted(edits, key=lambda edit: edit[0], reverse=True):
+        old_lines[start - 1:end] = replacement
+
+    merged = "\n".join(old_lines).rstrip("\n")
+    for block in appended:
+        merged += "\n\n\n" + "\n".join(block)
+    return merged + "\n"
+
+
+class DiffEngine:
+    """Diffs generated test files against the target repository
+
+    Each repo_url gets a bare, blob-less mirror under GIT_MIRROR_DIR that is
+    shared by every run and updated with incremental fetches, so reading the
+    current version of one file stays fast for large repositories.
+    """
+
+    def __init__(self):
+        self.mirror_dir = os.path.abspath(os.getenv("GIT_MIRROR_DIR", state_path("mirrors")))
+        self.fetch_interval = float(os.getenv("GIT_FETCH_INTERVAL_SECONDS", "60"))
+        self.timeout = float(os.getenv("GIT_TIMEOUT_SECONDS", "300"))
+        # Local checkouts are only mirrored from under LOCAL_REPO_ROOTS
+        self.local_repos = RepoEnvironments()
+
+    def clone_url(self, repo_url: str) -> str:
+        """Normalise the repo_url forms PRCreator accepts into something git can clone
+
+        Raises ValueError for local paths outside LOCAL_REPO_ROOTS and for URLs
+        that do not use a network transport.
+        """
+        if os.path.isabs(repo_url) or os.path.isdir(repo_url):
+            return self.local_repos.resolve(repo_url)
+        if re.fullmatch(r"[\w.-]+/[\w.-]+", repo_url):
+            return f"https://github.com/{repo_url}.git"
+        if _REMOTE_URL.fullmatch(repo_url):
+            return repo_url
+        raise ValueError(f"Unsupported repository URL: {repo_url}")
+
+    def _git(self, args: List[str], cwd: Optional[str] = None) -> subprocess.CompletedProcess:
+        env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+        token = os.getenv("GITHUB_TOKEN")
+        if token:
+            # Passed through the environment so it never shows up in process listings
+            credentials = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+            env.update({
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": "http.https://github.com/.extraheader",
+                "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}",
+            })
+        return subprocess.run(
+            ["git", *args], cwd=cwd, env=env, capture_output=True, text=True, timeout=self.timeout
+        )
+
+    def mirror_path(self, repo_url: str) -> str:
+        url = self.clone_url(repo_url)
+        name = re.sub(r"[^\w.-]", "_", url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git"))
+        return os.path.join(self.mirror_dir, f"{name}-{hashlib.sha256(url.encode()).hexdigest()[:12]}.git")
+
+    def mirror(self, repo_url: str) -> str:
+        """Path of an up-to-date mirror of the repository, cloning it on first use"""
+        path = self.mirror_path(repo_url)
+        marker = os.path.join(path, _FETCH_MARKER)
+        if not os.path.isdir(path):
+            os.makedirs(self.mirror_dir, exist_ok=True)
+            # Clone next to the final path and rename, so no one sees a half-cloned mirror
+            staging = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+            result = self._git(
+                ["clone", "--mirror", "--filter=blob:none", "--quiet", "--", self.clone_url(repo_url), staging]
+            )
+            if result.returncode != 0:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise RuntimeError(f"git clone failed: {result.stderr.strip()}")
+            open(os.path.join(staging, _FETCH_MARKER), "w").close()
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # Another worker cloned it first
+                shutil.rmtree(staging, ignore_errors=True)
+        elif time.time() - os.path.getmtime(marker if os.path.exists(marker) else path) >= self.fetch_interval:
+            result = self._git(["fetch", "--prune", "--quiet", "origin"], cwd=path)
+            if result.returncode == 0:
+                open(marker, "w").close()
+            else:
+                # Diff against what the mirror has rather than fail the step
+                print(f"git fetch failed for {repo_url}: {result.stderr.strip()}")
+        return path
+
+    def read_file(self, repo_url: str, branch: str, path: str) -> Tuple[str, Optional[str]]:
+        """(commit id of branch, content of path there or None if it does not exist)"""
+        mirror = self.mirror(repo_url)
+        for ref in (f"refs/heads/{branch}", branch):
+            result = self._git(["rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}"], cwd=mirror)
+            if result.returncode == 0:
+                commit = result.stdout.strip()
+                break
+        else:
+            raise RuntimeError(f"Branch not found in {repo_url}: {branch}")
+        # Missing blobs of the partial clone are fetched on demand
+        result = self._git(["cat-file", "blob", f"{commit}:{path}"], cwd=mirror)
+        return commit, result.stdout if result.returncode == 0 else None
+
+    async def create_patch(
+        self,
+        run_id: str,
+        function_name: str,
+        test_code: str,
+        repo_url: Optional[str] = None,
+        branch: Optional[str] = None,
+        test_path: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Diff the generated suite against the test file in the target repository
+
+        Returns the patch, the repository path, the full file content the patch
+        produces and the commit it applies to (None without a repository).
+        """
+        path = test_path or f"experiments/{run_id}/test_{function_name}.py"
+        base_commit, existing = None, None
+        if repo_url:
+            try:
+                base_commit, existing = await asyncio.to_thread(
+                    self.read_file, repo_url, branch or "main", path
+                )
+            except (OSError, RuntimeError, ValueError, subprocess.SubprocessError) as e:
+                print(f"Error reading {path} from {repo_url}: {e}")
+        content = merge_test_module(existing, test_code) if existing is not None else test_code
+        return {
+            "patch": unified_diff(path, existing, content),
+            "path": path,
+            "content": content,
+            "base_commit": base_commit,
+        }
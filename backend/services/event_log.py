@@ -0,0 +1,155 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Segment files are named by the offset of their first event and their event count
+_SEGMENT = re.compile(r"^(\d{12})-(\d{6})\.jsonl\.gz$")
+
+
+def _segment_name(first: int, count: int) -> str:
+    return f"{first:012d}-{count:06d}.jsonl.gz"
+
+
+class EventLog:
+    """Append-only per-run event log in compressed segments on disk
+
+    New events collect in an in-memory tail that is written out as a gzip
+    segment every EVENT_SEGMENT_EVENTS events and when the run is sealed, so
+    a finished run keeps nothing in memory. Segments are immutable; sealing
+    compacts a run's segments into one that keeps only the last snapshot.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.segment_events = int(os.getenv("EVENT_SEGMENT_EVENTS", "256"))
+        self._tails: Dict[str, List[Dict[str, Any]]] = {}
+        # Offset of the first tail event of each run with a tail
+        self._flushed: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def _run_dir(self, run_id: str) -> str:
+        return os.path.join(self.root, run_id)
+
+    def _segments(self, run_id: str) -> List[Tuple[int, int, str]]:
+        """(first offset, count, path) of each segment of a run, in order"""
+        try:
+            names = os.listdir(self._run_dir(run_id))
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            match = _SEGMENT.match(name)
+            if match:
+                segments.append(
+                    (int(match.group(1)), int(match.group(2)), os.path.join(self._run_dir(run_id), name))
+                )
+        return sorted(segments)
+
+    def _write_segment(self, run_id: str, first: int, events: Iterator[Dict[str, Any]], count: int) -> None:
+        os.makedirs(self._run_dir(run_id), exist_ok=True)
+        path = os.path.join(self._run_dir(run_id), _segment_name(first, count))
+        staging = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with gzip.open(staging, "wt", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+        os.replace(staging, path)
+
+    def _flush(self, run_id: str) -> None:
+        tail = self._tails.pop(run_id, [])
+        first = self._flushed.pop(run_id, 0)
+        if tail:
+            self._write_segment(run_id, first, iter(tail), len(tail))
+
+    def append(self, run_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            if run_id not in self._tails:
+                self._tails[run_id] = []
+                self._flushed[run_id] = sum(count for _, count, _ in self._segments(run_id))
+            tail = self._tails[run_id]
+            tail.append(event)
+            if len(tail) >= self.segment_events:
+                first = self._flushed[run_id]
+                self._flush(run_id)
+                self._tails[run_id] = []
+                self._flushed[run_id] = first + len(tail)
+
+    def __len__(self) -> int:
+        """Runs with events in memory"""
+        return len(self._tails)
+
+    def read(self, run_id: str, offset: int = 0) -> Iterator[Dict[str, Any]]:
+        """Events from offset on, streamed from the segments and then the tail"""
+        position = offset
+        while True:
+            with self._lock:
+                segments = self._segments(run_id)
+                tail = list(self._tails.get(run_id, []))
+                tail_first = self._flushed.get(run_id)
+            try:
+                for first, count, path in segments:
+                    if first + count <= position:
+                        continue
+                    with gzip.open(path, "rt", encoding="utf-8") as f:
+                        for index, line in enumerate(f, start=first):
+                            if index >= position:
+                                yield json.loads(line)
+                                position = index + 1
+            except FileNotFoundError:
+                # Compacted while we read; list the segments again and carry on
+                continue
+            if tail_first is not None:
+                for event in tail[max(position - tail_first, 0):]:
+                    yield event
+                    position += 1
+            return
+
+    def seal(self, run_id: str) -> None:
+        """Flush a finished run's tail and compact its log to one segment
+
+        Offsets do not change: every event is kept, but only the last one
+        carrying a run snapshot keeps its "data".
+        """
+        with self._lock:
+            self._flush(run_id)
+            segments = self._segments(run_id)
+            if not segments:
+                return
+            snapshots = [index for index, event in enumerate(self.read(run_id)) if "data" in event]
+            last_snapshot = snapshots[-1] if snapshots else -1
+
+            def compacted() -> Iterator[Dict[str, Any]]:
+                for index, event in enumerate(self.read(run_id)):
+                    if index != last_snapshot:
+                        event.pop("data", None)
+                    yield event
+
+            total = sum(count for _, count, _ in segments)
+            if len(segments) > 1 or len(snapshots) > 1:
+                self._write_segment(run_id, 0, compacted(), total)
+                for first, count, path in segments:
+                    if (first, count) != (0, total):
+                        os.remove(path)
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete the logs of runs with no events for max_age_seconds; returns how many"""
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        with self._lock:
+            try:
+                run_ids = os.listdir(self.root)
+            except FileNotFoundError:
+                return 0
+            for run_id in run_ids:
+                path = self._run_dir(run_id)
+                # A run directory's mtime changes whenever a segment is written or compacted
+                if run_id in self._tails or not os.path.isdir(path) or os.path.getmtime(path) >= cutoff:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
@@ -0,0 +1,200 @@
+import ast
+import asyncio
+import os
+import random
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.hypothesis_profile import profile_env, pytest_plugin_args, uses_hypothesis
+from services.repo_env import runtime
+from services.sandbox import Sandbox
+
+QUARANTINE_MARK = '@pytest.mark.skip(reason="quarantined: flaky under randomized reruns")'
+
+
+def collect_node_ids(test_code: str, test_filename: str) -> List[str]:
+    """pytest node ids of the module's tests, without running collection"""
+    tree = ast.parse(test_code)
+    node_ids = []
+    for stmt in tree.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)) and stmt.name.startswith("test"):
+            node_ids.append(f"{test_filename}::{stmt.name}")
+        elif isinstance(stmt, ast.ClassDef) and stmt.name.startswith("Test"):
+            for member in stmt.body:
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)) and member.name.startswith("test"):
+                    node_ids.append(f"{test_filename}::{stmt.name}::{member.name}")
+    return node_ids
+
+
+def _test_key(testcase: ET.Element) -> str:
+    """Identify a junit testcase as "test_name[params]" or "Class::test_name[params]" """
+    classname = testcase.get("classname", "")
+    name = testcase.get("name", "")
+    parts = classname.split(".")
+    if parts and parts[-1][:1].isupper():
+        return f"{parts[-1]}::{name}"
+    return name
+
+
+def parse_junit(path: str) -> Dict[str, Tuple[bool, str]]:
+    """Map each test to (passed, failure text) from a junit XML report; skips are left out"""
+    results: Dict[str, Tuple[bool, str]] = {}
+    for testcase in ET.parse(path).getroot().iter("testcase"):
+        if testcase.find("skipped") is not None:
+            continue
+        problem = testcase.find("failure")
+        if problem is None:
+            problem = testcase.find("error")
+        if problem is None:
+            results[_test_key(testcase)] = (True, "")
+        else:
+            text = "\n".join(part for part in (problem.get("message"), problem.text) if part)
+            results[_test_key(testcase)] = (False, text)
+    return results
+
+
+def junit_durations(path: str) -> Dict[str, Tuple[bool, float]]:
+    """Map each test to (passed, duration in seconds) from a junit XML report; skips are left out"""
+    durations: Dict[str, Tuple[bool, float]] = {}
+    for testcase in ET.parse(path).getroot().iter("testcase"):
+        if testcase.find("skipped") is not None:
+            continue
+        passed = testcase.find("failure") is None and testcase.find("error") is None
+        durations[_test_key(testcase)] = (passed, float(testcase.get("time") or 0))
+    return durations
+
+
+def quarantine(test_code: str, tests: List[str]) -> str:
+    """Mark the given tests as skipped, keeping the rest of the module unchanged"""
+    targets = {test.split("[")[0] for test in tests}
+    tree = ast.parse(test_code)
+    insertions: List[Tuple[int, int]] = []
+    for stmt in tree.body:
+        candidates = [(getattr(stmt, "name", ""), stmt)]
+        if isinstance(stmt, ast.ClassDef):
+            candidates = [(f"{stmt.name}::{m.name}", m) for m in stmt.body]
+        for key, node in candidates:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and key in targets:
+                first = min([d.lineno for d in node.decorator_list] + [node.lineno])
+                insertions.append((first, node.col_offset))
+
+    lines = test_code.splitlines()
+    for lineno, indent in sorted(insertions, reverse=True):
+        lines.insert(lineno - 1, " " * indent + QUARANTINE_MARK)
+    if insertions and not any(
+        isinstance(stmt, ast.Import)
+        and any(alias.name == "pytest" and not alias.asname for alias in stmt.names)
+        for stmt in tree.body
+    ):
+        lines.insert(0, "import pytest")
+    return "\n".join(lines) + "\n"
+
+
+class FlakyDetector:
+    """Reruns a passing suite in random orders to find tests that pass or fail at random
+
+    The reruns run in parallel in the sandbox, so N reruns cost little more
+    wall time than one when the host has idle cores.
+    """
+
+    def __init__(self):
+        self.temp_dir = os.path.join(os.getcwd(), "temp_runs")
+        self.sandbox = Sandbox()
+        self.max_parallel = int(os.getenv("FLAKY_MAX_PARALLEL", str(os.cpu_count() or 2)))
+
+    async def detect(
+        self,
+        test_code: str,
+        original_code: str,
+        function_name: str,
+        run_id: str,
+        reruns: int,
+        usage: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Classify every test as stable, flaky or failing over randomized reruns
+
+        Expects the run directory written by TestRunner for the same suite.
+        """
+        run_dir = os.path.join(self.temp_dir, run_id)
+        test_filename = f"test_{function_name}.py"
+        node_ids = collect_node_ids(test_code, test_filename) or [test_filename]
+        python, env = runtime(run_dir)
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        if uses_hypothesis(test_code):
+            env.update(profile_env(original_code, function_name, "fix"))
+        seeds = [random.randrange(2 ** 32) for _ in range(reruns)]
+        semaphore = asyncio.Semaphore(max(self.max_parallel, 1))
+        started = time.monotonic()
+
+        async def rerun(index: int, seed: int) -> Dict[str, Tuple[bool, str]]:
+            order = list(node_ids)
+            random.Random(seed).shuffle(order)
+            report = os.path.join(run_dir, f".flaky_{index}.xml")
+            args = [python, "-m", "pytest", *order, "-q", "--tb=short", f"--junitxml={report}"]
+            # Parallel reruns share the directory, so none of them writes the cache
+            args += ["-p", "no:cacheprovider"] + pytest_plugin_args(test_code)
+            async with semaphore:
+                result = await asyncio.to_thread(self.sandbox.run, args, run_dir, env=env)
+            if usage is not None:
+                usage.append(
+                    {"command": "flaky_rerun", "exit_code": result["exit_code"], **result["resource_usage"]}
+                )
+            try:
+                return parse_junit(report)
+            except (OSError, ET.ParseError):
+                return {}
+            finally:
+                if os.path.exists(report):
+                    os.remove(report)
+
+        outcomes = await asyncio.gather(*(rerun(i, seed) for i, seed in enumerate(seeds)))
+
+        tests: Dict[str, Dict[str, Any]] = {}
+        for outcome in outcomes:
+            for key, (passed, text) in outcome.items():
+                entry = tests.setdefault(key, {"passed": 0, "failed": 0, "failure": ""})
+                if passed:
+                    entry["passed"] += 1
+                else:
+                    entry["failed"] += 1
+                    entry["failure"] = entry["failure"] or text
+        for entry in tests.values():
+            if not entry["failed"]:
+                entry["status"] = "stable"
+            elif not entry["passed"]:
+                entry["status"] = "failing"
+            else:
+                entry["status"] = "flaky"
+
+        return {
+            "reruns": reruns,
+            "seeds": seeds,
+            "tests": tests,
+            "flaky": sorted(key for key, entry in tests.items() if entry["status"] == "flaky"),
+            "failing": sorted(key for key, entry in tests.items() if entry["status"] == "failing"),
+            "action": None,
+            "wall_seconds": round(time.monotonic() - started, 3),
+        }
+
+    @staticmethod
+    def fixer_output(report: Dict[str, Any]) -> str:
+        """Failure output of the flaky and order-dependent tests only, for the fixer"""
+        sections = []
+        for key in report["flaky"]:
+            entry = report["tests"][key]
+            sections.append(
+                f"___ {key} ___\n"
+                f"FLAKY: passed {entry['passed']} and failed {entry['failed']} of "
+                f"{report['reruns']} runs in random order. Remove the dependence on timing, "
+                f"test order, shared state or exact float equality.\n{entry['failure']}"
+            )
+        for key in report["failing"]:
+            entry = report["tests"][key]
+            sections.append(
+                f"___ {key} ___\n"
+                f"ORDER-DEPENDENT: passed in file order but failed all {report['reruns']} "
+                f"runs in random order. Make it set up its own state instead of relying "
+                f"on tests that ran before it.\n{entry['failure']}"
+            )
+        return "\n\n".join(sections)
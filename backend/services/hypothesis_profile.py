@@ -0,0 +1,111 @@
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+from services.code_analysis import function_fingerprint
+from services.module_parser import content_hash
+from services.state_backend import state_path
+
+# Written next to Hypothesis suites; loads the profile for the current phase
+CONFTEST = '''import os
+
+try:
+    from hypothesis import HealthCheck, settings
+    from hypothesis.database import DirectoryBasedExampleDatabase
+except ImportError:
+    settings = None
+
+if settings is not None and os.environ.get("VERITAS_HYPOTHESIS_PROFILE"):
+    database = DirectoryBasedExampleDatabase(os.environ["VERITAS_HYPOTHESIS_DB"])
+    settings.register_profile(
+        "veritas",
+        max_examples=int(os.environ["VERITAS_HYPOTHESIS_MAX_EXAMPLES"]),
+        deadline=int(os.environ["VERITAS_HYPOTHESIS_DEADLINE_MS"]) or None,
+        database=database,
+        suppress_health_check=[HealthCheck.too_slow],
+        print_blob=True,
+    )
+    settings.load_profile("veritas")
+'''
+
+# Fix iterations only need to find a failure again; the final run searches fully
+PHASES = ("fix", "full")
+
+PRUNE_INTERVAL = 3600.0
+_pruned_at: Optional[float] = None
+
+
+def uses_hypothesis(test_code: str) -> bool:
+    return "hypothesis" in test_code
+
+
+def pytest_plugin_args(test_code: str) -> List[str]:
+    """Skip loading Hypothesis' pytest plugin, which imports all of Hypothesis, when unused"""
+    return [] if uses_hypothesis(test_code) else ["-p", "no:hypothesispytest"]
+
+
+def prune_example_databases(root: str, max_age_seconds: float) -> int:
+    """Delete the databases of functions not tested for max_age_seconds; returns how many"""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    try:
+        fingerprints = os.listdir(root)
+    except FileNotFoundError:
+        return 0
+    for fingerprint in fingerprints:
+        path = os.path.join(root, fingerprint)
+        if not os.path.isdir(path) or os.path.getmtime(path) >= cutoff:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def example_database_path(original_code: str, function_name: str) -> str:
+    """Example database shared by every run of the same function body"""
+    global _pruned_at
+    fingerprint = function_fingerprint(original_code, function_name) or content_hash(original_code)
+    root = os.path.abspath(os.getenv("HYPOTHESIS_DB_DIR", state_path("hypothesis")))
+    path = os.path.join(root, fingerprint)
+    # The directory's mtime records when the function was last tested
+    os.makedirs(path, exist_ok=True)
+    os.utime(path)
+    # 0 keeps every database
+    retention_seconds = float(os.getenv("HYPOTHESIS_DB_RETENTION_DAYS", "30")) * 86400
+    now = time.monotonic()
+    if retention_seconds > 0 and (_pruned_at is None or now - _pruned_at >= PRUNE_INTERVAL):
+        _pruned_at = now
+        prune_example_databases(root, retention_seconds)
+    return path
+
+
+def profile_env(original_code: str, function_name: str, phase: str) -> Dict[str, str]:
+    """Environment selecting the Hypothesis settings of a phase for the test process"""
+    if phase not in PHASES:
+        raise ValueError(f"Unknown Hypothesis phase: {phase}")
+    defaults = {"fix": ("20", "500"), "full": ("100", "1000")}[phase]
+    return {
+        "VERITAS_HYPOTHESIS_PROFILE": phase,
+        "VERITAS_HYPOTHESIS_DB": example_database_path(original_code, function_name),
+        "VERITAS_HYPOTHESIS_MAX_EXAMPLES": os.getenv(
+            f"HYPOTHESIS_{phase.upper()}_MAX_EXAMPLES", defaults[0]
+        ),
+        "VERITAS_HYPOTHESIS_DEADLINE_MS": os.getenv(
+            f"HYPOTHESIS_{phase.upper()}_DEADLINE_MS", defaults[1]
+        ),
+    }
+
+
+def write_conftest(run_dir: str, test_code: str, prelude: str = "") -> None:
+    """Add the profile conftest to a run directory holding a Hypothesis suite
+
+    prelude is other conftest code the run directory needs, such as the module shim.
+    """
+    path = os.path.join(run_dir, "conftest.py")
+    content = prelude + (CONFTEST if uses_hypothesis(test_code) else "")
+    if content:
+        with open(path, "w") as f:
+            f.write(content)
+    elif os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from services.state_backend import SQLiteDatabase, SQLiteRunStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, lease_expires, enqueued_at);
+"""
+
+# Claiming is a single statement, so two workers can never lease the same job
+_CLAIM = """
+UPDATE jobs SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1
+WHERE run_id = (
+    SELECT run_id FROM jobs
+    WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?)
+    ORDER BY enqueued_at
+    LIMIT 1
+)
+RETURNING run_id, payload, attempts
+"""
+
+
+class JobQueue:
+    """Durable queue of pipeline jobs, stored in the shared state database
+
+    Workers lease jobs and renew the lease while the pipeline runs. A job
+    whose worker crashed is handed to another worker once its lease
+    expires, and the pipeline resumes from the run's checkpoints.
+    """
+
+    def __init__(self, db: SQLiteDatabase, lease_seconds: Optional[float] = None):
+        self.db = db
+        self.lease_seconds = lease_seconds or float(os.getenv("JOB_LEASE_SECONDS", "60"))
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        db.executescript(_SCHEMA)
+
+    def enqueue(self, run_id: str, payload: Dict[str, Any]) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO jobs (run_id, payload, status, attempts, enqueued_at) "
+            "VALUES (?, ?, 'queued', 0, ?)",
+            (run_id, json.dumps(payload), time.time()),
+        )
+
+    def claim(self, worker_id: str) -> Optional[Tuple[str, Dict[str, Any], int]]:
+        """Lease the oldest available job, returning (run_id, payload, attempts)"""
+        now = time.time()
+        rows = self.db.transaction([(_CLAIM, (worker_id, now + self.lease_seconds, now))])
+        if not rows:
+            return None
+        run_id, payload, attempts = rows[0]
+        return run_id, json.loads(payload), attempts
+
+    def heartbeat(self, run_id: str, worker_id: str) -> bool:
+        """Extend a lease; False means the job was taken over by another worker"""
+        rows = self.db.transaction([(
+            "UPDATE jobs SET lease_expires = ? "
+            "WHERE run_id = ? AND worker_id = ? AND status = 'leased' RETURNING run_id",
+            (time.time() + self.lease_seconds, run_id, worker_id),
+        )])
+        return bool(rows)
+
+    def complete(self, run_id: str, worker_id: str) -> bool:
+        """Finish a leased job; False means the lease had passed to another worker"""
+        rows = self.db.transaction([(
+            "UPDATE jobs SET status = 'done' "
+            "WHERE run_id = ? AND worker_id = ? AND status = 'leased' RETURNING run_id",
+            (run_id, worker_id),
+        )])
+        return bool(rows)
+
+    def stats(self) -> Dict[str, int]:
+        now = time.time()
+        counts = {"queued": 0, "leased": 0, "expired": 0, "done": 0}
+        for status, expired, count in self.db.execute(
+            "SELECT status, status = 'leased' AND lease_expires < ?, COUNT(*) "
+            "FROM jobs GROUP BY 1, 2",
+            (now,),
+        ):
+            counts["expired" if expired else status] += count
+        return counts
+
+
+def create_job_queue(run_store) -> Optional[JobQueue]:
+    """Build the job queue selected by VERITAS_EXECUTION, or None to run pipelines inline"""
+    mode = os.getenv("VERITAS_EXECUTION", "inline")
+    if mode == "inline":
+        return None
+    if mode == "queue":
+        if not isinstance(run_store, SQLiteRunStore):
+            raise ValueError("VERITAS_EXECUTION=queue requires VERITAS_STATE_BACKEND=sqlite")
+        return JobQueue(run_store.db)
+    raise ValueError(f"Unknown VERITAS_EXECUTION: {mode}")
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import openai
+
+from services.rate_limiter import RateLimiter
+
+# Steps whose model can be routed with LLM_ROUTE_<STEP>
+ROUTED_STEPS = ("infer_behavior", "generate_tests", "fix_tests")
+
+# Weight of the newest sample in the latency moving average
+_LATENCY_SMOOTHING = 0.3
+
+
+class LLMEndpoint:
+    """One OpenAI-compatible API: OpenAI itself or e.g. a local llama.cpp or vLLM server
+
+    Each endpoint has its own client, rate limit budget and latency estimate.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        structured_outputs: bool = True,
+    ):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+        # Whether to request JSON-schema responses; turned off if the server rejects them
+        self.structured_outputs = structured_outputs
+        self.rate_limiter = RateLimiter()
+        self.latency: Optional[float] = None
+        self.last_used = 0.0
+        self._client: Optional[openai.OpenAI] = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        # Local OpenAI-compatible servers usually accept any key
+        return bool(self.api_key or self.base_url)
+
+    @property
+    def client(self) -> Optional[openai.OpenAI]:
+        """Lazily created client, or None if the endpoint has no key or URL"""
+        if self._client is None and self.configured:
+            # Retries are handled by the rate limiter, which also reads the
+            # rate limit headers of every response
+            self._client = openai.OpenAI(
+                api_key=self.api_key or "not-needed",
+                base_url=self.base_url,
+                max_retries=0,
+                timeout=self.timeout,
+                http_client=httpx.Client(
+                    event_hooks={"response": [self.rate_limiter.observe_response]}
+                ),
+            )
+        return self._client
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency = _LATENCY_SMOOTHING * seconds + (1 - _LATENCY_SMOOTHING) * self.latency
+            self.last_used = time.monotonic()
+
+
+class LLMRouter:
+    """Picks the endpoint and model for each pipeline step
+
+    Steps use the primary endpoint and OPENAI_MODEL unless LLM_ROUTE_<STEP>
+    names another model, optionally prefixed with an endpoint
+    ("secondary:qwen2.5-coder"). When a secondary endpoint is configured,
+    calls fall over to it if the preferred endpoint fails or its recent
+    latency exceeds LLM_FAILOVER_LATENCY_SECONDS.
+    """
+
+    def __init__(self):
+        self.primary = LLMEndpoint(
+            "primary",
+            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            api_key=os.getenv("OPENAI_API_KEY") or None,
+            structured_outputs=os.getenv("LLM_STRUCTURED_OUTPUTS", "true").lower() != "false",
+        )
+        self.secondary: Optional[LLMEndpoint] = None
+        if os.getenv("LLM_SECONDARY_BASE_URL"):
+            self.secondary = LLMEndpoint(
+                "secondary",
+                model=os.getenv("LLM_SECONDARY_MODEL", self.primary.model),
+                base_url=os.getenv("LLM_SECONDARY_BASE_URL"),
+                api_key=os.getenv("LLM_SECONDARY_API_KEY") or None,
+                structured_outputs=(
+                    os.getenv("LLM_SECONDARY_STRUCTURED_OUTPUTS", "true").lower() != "false"
+                ),
+            )
+        self.failover_latency = float(os.getenv("LLM_FAILOVER_LATENCY_SECONDS", "20"))
+        # How often a slow endpoint still gets a call, to notice it has recovered
+        self.probe_interval = float(os.getenv("LLM_FAILOVER_PROBE_SECONDS", "30"))
+        self.routes: Dict[str, Tuple[LLMEndpoint, str]] = {}
+        for step in ROUTED_STEPS:
+            route = os.getenv(f"LLM_ROUTE_{step.upper()}")
+            if route:
+                self.routes[step] = self.parse_route(route)
+
+    def endpoints(self) -> List[LLMEndpoint]:
+        return [self.primary] + ([self.secondary] if self.secondary else [])
+
+    def parse_route(self, route: str) -> Tuple[LLMEndpoint, str]:
+        """Parse "model" or "endpoint:model"; model names may contain colons themselves"""
+        name, _, model = route.partition(":")
+        for endpoint in self.endpoints():
+            if model and name == endpoint.name:
+                return endpoint, model
+        return self.primary, route
+
+    def route(self, step: str) -> Tuple[LLMEndpoint, str]:
+        """The preferred endpoint and model for a step"""
+        return self.routes.get(step, (self.primary, self.primary.model))
+
+    def _is_slow(self, endpoint: LLMEndpoint) -> bool:
+        if endpoint.latency is None or endpoint.latency <= self.failover_latency:
+            return False
+        return time.monotonic() - endpoint.last_used < self.probe_interval
+
+    def candidates(self, step: str) -> List[Tuple[LLMEndpoint, str]]:
+        """Endpoints to try for a step, in order"""
+        preferred = self.route(step)
+        others = [
+            (endpoint, endpoint.model)
+            for endpoint in self.endpoints()
+            if endpoint is not preferred[0] and endpoint.configured
+        ]
+        if not others:
+            return [preferred]
+        if self._is_slow(preferred[0]) and not any(self._is_slow(e) for e, _ in others):
+            return others + [preferred]
+        return [preferred] + others
@@ -0,0 +1,175 @@
+import ast
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+DefinitionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef]
+
+# Nodes that add a branch to cyclomatic complexity
+_DECISION_NODES = (
+    ast.If,
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.IfExp,
+    ast.ExceptHandler,
+    ast.Assert,
+    ast.comprehension,
+    ast.match_case,
+)
+
+
+def content_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def find_definition(tree: ast.Module, name: str) -> Optional[DefinitionNode]:
+    """Find a function or class by name, preferring module-level definitions"""
+    for stmt in tree.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and stmt.name == name:
+            return stmt
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.name == name:
+            return node
+    return None
+
+
+def cyclomatic_complexity(node: ast.AST) -> int:
+    """McCabe complexity: one plus the number of decision points"""
+    complexity = 1
+    for child in ast.walk(node):
+        if isinstance(child, _DECISION_NODES):
+            complexity += 1
+            if isinstance(child, ast.comprehension):
+                complexity += len(child.ifs)
+        elif isinstance(child, ast.BoolOp):
+            complexity += len(child.values) - 1
+    return complexity
+
+
+def _nesting_depth(node: ast.AST, depth: int = 0) -> int:
+    deepest = depth
+    for child in ast.iter_child_nodes(node):
+        nested = isinstance(child, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try))
+        deepest = max(deepest, _nesting_depth(child, depth + 1 if nested else depth))
+    return deepest
+
+
+def _signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(base) for base in node.bases + node.keywords)
+        return f"class {node.name}({bases})" if bases else f"class {node.name}"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _symbol(node: ast.AST, kind: str, qualname: str) -> Dict[str, Any]:
+    return {
+        "name": node.name,
+        "qualname": qualname,
+        "kind": kind,
+        "signature": _signature(node),
+        "lineno": node.lineno,
+        "end_lineno": node.end_lineno,
+        "complexity": cyclomatic_complexity(node),
+        "nesting_depth": _nesting_depth(node),
+        "lines": node.end_lineno - node.lineno + 1,
+        "docstring": ast.get_docstring(node),
+    }
+
+
+class ParsedModule:
+    """A parsed module shared by every consumer of the same source
+
+    The tree must be treated as read-only; callers that need to rewrite it
+    should deep-copy it first.
+    """
+
+    def __init__(self, code: str, digest: str):
+        self.code = code
+        self.content_hash = digest
+        self.tree = ast.parse(code)
+        self._symbols: Optional[List[Dict[str, Any]]] = None
+        # Memoized per-function results, e.g. fingerprints
+        self.memo: Dict[Any, Any] = {}
+
+    @property
+    def symbols(self) -> List[Dict[str, Any]]:
+        """Functions, classes and methods with signatures, line ranges and complexity"""
+        if self._symbols is None:
+            symbols: List[Dict[str, Any]] = []
+            for stmt in self.tree.body:
+                if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    kind = "async_function" if isinstance(stmt, ast.AsyncFunctionDef) else "function"
+                    symbols.append(_symbol(stmt, kind, stmt.name))
+                elif isinstance(stmt, ast.ClassDef):
+                    symbols.append(_symbol(stmt, "class", stmt.name))
+                    for member in stmt.body:
+                        if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                            symbols.append(_symbol(member, "method", f"{stmt.name}.{member.name}"))
+            self._symbols = symbols
+        return self._symbols
+
+    def item_type(self, name: str) -> Optional[str]:
+        """Return "class" or "function" for a definition, or None if it is missing"""
+        node = find_definition(self.tree, name)
+        if node is None:
+            return None
+        return "class" if isinstance(node, ast.ClassDef) else "function"
+
+    def symbol_at(self, lineno: int) -> Optional[str]:
+        """Qualified name of the innermost symbol containing a line"""
+        match = None
+        for symbol in self.symbols:
+            if symbol["lineno"] <= lineno <= symbol["end_lineno"]:
+                if match is None or symbol["lineno"] >= match["lineno"]:
+                    match = symbol
+        return match["qualname"] if match else None
+
+
+class ModuleParser:
+    """LRU cache of parsed modules keyed by content hash"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("PARSE_CACHE_SIZE", "128"))
+        self._modules: "OrderedDict[str, ParsedModule]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, code: str) -> ParsedModule:
+        """Return the parsed module for code, raising SyntaxError if it is invalid"""
+        digest = content_hash(code)
+        with self._lock:
+            module = self._modules.get(digest)
+            if module is not None:
+                self._modules.move_to_end(digest)
+                self.hits += 1
+                return module
+        module = ParsedModule(code, digest)
+        with self._lock:
+            self.misses += 1
+            self._modules[digest] = module
+            while len(self._modules) > self.max_entries:
+                self._modules.popitem(last=False)
+        return module
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._modules),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Shared by the API, the pipeline and the analysis helpers so that each
+# module is parsed once however many consumers look at it
+shared_parser = ModuleParser()
+
+
+def parse_module(code: str) -> ParsedModule:
+    return shared_parser.parse(code)
@@ -0,0 +1,277 @@
+import ast
+import asyncio
+import copy
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from services.hypothesis_profile import profile_env, pytest_plugin_args, uses_hypothesis
+from services.module_parser import find_definition, parse_module
+from services.repo_env import runtime
+from services.sandbox import Sandbox
+
+_BINARY_SWAPS = {
+    ast.Add: ast.Sub,
+    ast.Sub: ast.Add,
+    ast.Mult: ast.Div,
+    ast.Div: ast.Mult,
+    ast.FloorDiv: ast.Div,
+    ast.Mod: ast.FloorDiv,
+    ast.Pow: ast.Mult,
+}
+
+_COMPARE_SWAPS = {
+    ast.Lt: ast.LtE,
+    ast.LtE: ast.Lt,
+    ast.Gt: ast.GtE,
+    ast.GtE: ast.Gt,
+    ast.Eq: ast.NotEq,
+    ast.NotEq: ast.Eq,
+    ast.Is: ast.IsNot,
+    ast.IsNot: ast.Is,
+    ast.In: ast.NotIn,
+    ast.NotIn: ast.In,
+}
+
+_SYMBOLS = {
+    ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.FloorDiv: "//", ast.Mod: "%",
+    ast.Pow: "**", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Eq: "==",
+    ast.NotEq: "!=", ast.Is: "is", ast.IsNot: "is not", ast.In: "in", ast.NotIn: "not in",
+    ast.And: "and", ast.Or: "or",
+}
+
+# (index of the node in ast.walk order, description, mutation applied to a copy of that node)
+Mutation = Tuple[int, str, Callable[[ast.AST, ast.AST], None]]
+
+
+def _replace_child(parent: ast.AST, old: ast.AST, new: ast.AST) -> None:
+    for field, value in ast.iter_fields(parent):
+        if value is old:
+            setattr(parent, field, new)
+            return
+        if isinstance(value, list):
+            for i, item in enumerate(value):
+                if item is old:
+                    value[i] = new
+                    return
+
+
+def _mutations(definition: ast.AST) -> List[Mutation]:
+    """Every single-point mutation of a function or class body"""
+    mutations: List[Mutation] = []
+    docstrings = {
+        id(node.body[0].value)
+        for node in ast.walk(definition)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        and node.body and isinstance(node.body[0], ast.Expr)
+        and isinstance(node.body[0].value, ast.Constant)
+    }
+    for index, node in enumerate(ast.walk(definition)):
+        if isinstance(node, (ast.BinOp, ast.AugAssign)) and type(node.op) in _BINARY_SWAPS:
+            new_op = _BINARY_SWAPS[type(node.op)]
+            mutations.append((
+                index,
+                f"{_SYMBOLS[type(node.op)]} -> {_SYMBOLS[new_op]}",
+                lambda n, _p, new_op=new_op: setattr(n, "op", new_op()),
+            ))
+        elif isinstance(node, ast.Compare):
+            for position, op in enumerate(node.ops):
+                if type(op) in _COMPARE_SWAPS:
+                    new_op = _COMPARE_SWAPS[type(op)]
+
+                    def swap(n, _p, position=position, new_op=new_op):
+                        n.ops[position] = new_op()
+
+                    mutations.append((index, f"{_SYMBOLS[type(op)]} -> {_SYMBOLS[new_op]}", swap))
+        elif isinstance(node, ast.BoolOp):
+            new_op = ast.Or if isinstance(node.op, ast.And) else ast.And
+            mutations.append((
+                index,
+                f"{_SYMBOLS[type(node.op)]} -> {_SYMBOLS[new_op]}",
+                lambda n, _p, new_op=new_op: setattr(n, "op", new_op()),
+            ))
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            symbol = "not" if isinstance(node.op, ast.Not) else "unary -"
+            mutations.append((index, f"remove {symbol}", lambda n, p: _replace_child(p, n, n.operand)))
+        elif isinstance(node, ast.Constant) and id(node) not in docstrings:
+            value = node.value
+            if isinstance(value, bool):
+                description = f"{value} -> {not value}"
+                mutations.append((index, description, lambda n, _p: setattr(n, "value", not n.value)))
+            elif isinstance(value, (int, float)):
+                description = f"{value!r} -> {value + 1!r}"
+                mutations.append((index, description, lambda n, _p: setattr(n, "value", n.value + 1)))
+            elif isinstance(value, str) and value:
+                description = f"{value[:20]!r} -> ''"
+                mutations.append((index, description, lambda n, _p: setattr(n, "value", "")))
+        elif isinstance(node, ast.Return) and node.value is not None and not (
+            isinstance(node.value, ast.Constant) and node.value.value is None
+        ):
+            mutations.append((
+                index, "return value -> None", lambda n, _p: setattr(n, "value", ast.Constant(value=None))
+            ))
+    return mutations
+
+
+def _statement_line(definition: ast.AST, node: ast.AST) -> int:
+    """First line of the innermost statement containing a node; coverage records those"""
+    line = node.lineno
+    best = None
+    for candidate in ast.walk(definition):
+        if isinstance(candidate, ast.stmt) and candidate.lineno <= line <= (candidate.end_lineno or line):
+            if best is None or candidate.lineno >= best.lineno:
+                best = candidate
+    if isinstance(best, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        # Defaults and decorators run at import; the tests that call the
+        # function are the ones that execute its first statement
+        body = best.body
+        if len(body) > 1 and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+            body = body[1:]
+        return body[0].lineno
+    return best.lineno if best is not None else line
+
+
+def generate_mutants(code: str, function_name: str, max_mutants: int) -> List[Dict[str, Any]]:
+    """Mutated versions of the module, each changing one point of the target definition"""
+    module = parse_module(code)
+    definition = find_definition(module.tree, function_name)
+    if definition is None:
+        return []
+    nodes = list(ast.walk(definition))
+    mutations = _mutations(definition)
+    if len(mutations) > max_mutants:
+        # Spread the sample over the whole definition
+        step = len(mutations) / max_mutants
+        mutations = [mutations[int(i * step)] for i in range(max_mutants)]
+
+    mutants = []
+    for number, (index, description, apply) in enumerate(mutations):
+        tree = copy.deepcopy(module.tree)
+        copied = list(ast.walk(find_definition(tree, function_name)))
+        target = copied[index]
+        parent = next(
+            (p for p in copied if any(child is target for child in ast.iter_child_nodes(p))),
+            None,
+        )
+        apply(target, parent)
+        try:
+            source = ast.unparse(ast.fix_missing_locations(tree))
+        except Exception:
+            continue
+        mutants.append({
+            "id": number,
+            "line": _statement_line(definition, nodes[index]),
+            "description": description,
+            "source": source,
+        })
+    return mutants
+
+
+class MutationTester:
+    """Scores a suite by how many single-point mutants of the target it kills
+
+    Each mutant runs only the tests that covered its line in the coverage run,
+    stops at the first failing test, and mutants run in parallel.
+    """
+
+    def __init__(self):
+        self.temp_dir = os.path.join(os.getcwd(), "temp_runs")
+        self.sandbox = Sandbox()
+        self.max_mutants = int(os.getenv("MUTATION_MAX_MUTANTS", "40"))
+        self.max_parallel = int(os.getenv("MUTATION_MAX_PARALLEL", str(os.cpu_count() or 2)))
+        self.timeout = float(os.getenv("MUTATION_TIMEOUT_SECONDS", "10"))
+
+    async def run(
+        self,
+        original_code: str,
+        function_name: str,
+        run_id: str,
+        line_contexts: Optional[Dict[int, Set[str]]] = None,
+        usage: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Run every mutant against the suite in the run directory and report the score
+
+        line_contexts maps module lines to the test node ids that executed them;
+        without it every mutant runs the whole suite.
+        """
+        run_dir = os.path.join(self.temp_dir, run_id)
+        test_filename = f"test_{function_name}.py"
+        with open(os.path.join(run_dir, test_filename), "r") as f:
+            test_code = f.read()
+        mutants_dir = os.path.join(self.temp_dir, f"{run_id}_mutants")
+        python, env = runtime(run_dir)
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        if uses_hypothesis(test_code):
+            env.update(profile_env(original_code, function_name, "fix"))
+        semaphore = asyncio.Semaphore(max(self.max_parallel, 1))
+        started = time.monotonic()
+
+        async def execute(mutant: Dict[str, Any]) -> Dict[str, Any]:
+            result = {key: mutant[key] for key in ("id", "line", "description")}
+            if line_contexts:
+                tests = sorted(line_contexts.get(mutant["line"], ()))
+                if not tests:
+                    result["status"] = "no_coverage"
+                    return result
+            else:
+                tests = [test_filename]
+
+            mutant_dir = os.path.join(mutants_dir, str(mutant["id"]))
+            os.makedirs(mutant_dir, exist_ok=True)
+            with open(os.path.join(mutant_dir, "your_module.py"), "w") as f:
+                f.write(mutant["source"])
+            for name in (test_filename, "conftest.py"):
+                if os.path.exists(os.path.join(run_dir, name)):
+                    shutil.copy(os.path.join(run_dir, name), mutant_dir)
+
+            # -x: one failing test is enough to kill the mutant
+            args = [python, "-m", "pytest", *tests, "-x", "-q", "-rf", "--tb=no"]
+            args += ["-p", "no:cacheprovider"] + pytest_plugin_args(test_code)
+            async with semaphore:
+                outcome = await asyncio.to_thread(
+                    self.sandbox.run, args, mutant_dir, timeout=self.timeout, env=env
+                )
+            if usage is not None:
+                usage.append(
+                    {"command": "mutant", "exit_code": outcome["exit_code"], **outcome["resource_usage"]}
+                )
+
+            if outcome["resource_usage"]["limit_exceeded"]:
+                # A mutant that hangs or explodes is detected, so it counts as killed
+                result["status"] = "timeout"
+            elif outcome["exit_code"] == 0:
+                result["status"] = "survived"
+            elif outcome["exit_code"] in (1, 2):
+                result["status"] = "killed"
+                result["killed_by"] = next(
+                    (
+                        line.split(" ", 1)[1].split(" - ")[0]
+                        for line in outcome["stdout"].splitlines()
+                        if line.startswith("FAILED ")
+                    ),
+                    None,
+                )
+            else:
+                result["status"] = "error"
+            return result
+
+        mutants = generate_mutants(original_code, function_name, self.max_mutants)
+        try:
+            results = await asyncio.gather(*(execute(mutant) for mutant in mutants))
+        finally:
+            shutil.rmtree(mutants_dir, ignore_errors=True)
+
+        counts = {
+            status: sum(1 for r in results if r["status"] == status)
+            for status in ("killed", "timeout", "survived", "no_coverage", "error")
+        }
+        detected = counts["killed"] + counts["timeout"]
+        scored = detected + counts["survived"] + counts["no_coverage"]
+        return {
+            "score": round(100 * detected / scored, 1) if scored else None,
+            "total": len(results),
+            **counts,
+            "mutants": list(results),
+            "wall_seconds": round(time.monotonic() - started, 3),
+        }
@@ -50,8 +50,11 @@ class PRCreator:
         run_id: str,
         patch_diff: str,
         test_content: str,
+        file_path: Optional[str] = None,
     ) -> PRInfo:
-        """Create a GitHub pull request"""
+        """Create a GitHub pull request writing test_content to file_path"""
+        
+        file_path = file_path or f"experiments/{run_id}/test_{function_name}.py"
         
         if not repo_url:
             return PRInfo(
@@ -60,12 +63,12 @@ class PRCreator:
 
 - Coverage: {coverage.lines}% lines, {coverage.branches}% branches
 - Generated test suite
-- Output location: `experiments/{run_id}/`
+- Output location: `{file_path}`
 
 Generated by veritas-pytest.
 """,
                 url=None,
-                changed_files=[f"experiments/{run_id}/test_{function_name}.py"],
+                changed_files=[file_path],
             )
         
         if not self.github_token or not self.github:
@@ -75,14 +78,14 @@ Generated by veritas-pytest.
 
 - Coverage: {coverage.lines}% lines, {coverage.branches}% branches
 - Generated test suite
-- Output location: `experiments/{run_id}/`
+- Output location: `{file_path}`
 
 Generated by veritas-pytest.
 
 Note: GITHUB_TOKEN not configured. PR was not actually created.
 """,
                 url=None,
-                changed_files=[f"experiments/{run_id}/test_{function_name}.py"],
+                changed_files=[file_path],
             )
         
         try:
@@ -113,18 +116,29 @@ Note: GITHUB_TOKEN not configured. PR was not actually created.
             if not test_content:
                 raise ValueError("Test content is required to create PR")
             
-            # GitHub's create_file API automatically creates parent directories
-            # So we don't need to create experiments/ folder first
-            file_path = f"experiments/{run_id}/test_{function_name}.py"
-            
-            # Create file in the new branch
-            # GitHub will automatically create the experiments/{run_id}/ directory structure
-            repo.create_file(
-                path=file_path,
-                message=f"Add tests for {function_name} (veritas-pytest)",
-                content=test_content,
-                branch=pr_branch,
-            )
+            # An existing test file is updated in place; GitHub's create_file
+            # API creates any missing parent directories
+            try:
+                existing = repo.get_contents(file_path, ref=pr_branch)
+            except GithubException as e:
+                if getattr(e, "status", None) != 404:
+                    raise
+                existing = None
+            if existing is not None:
+                repo.update_file(
+                    path=file_path,
+                    message=f"Add tests for {function_name} (veritas-pytest)",
+                    content=test_content,
+                    sha=existing.sha,
+                    branch=pr_branch,
+                )
+            else:
+                repo.create_file(
+                    path=file_path,
+                    message=f"Add tests for {function_name} (veritas-pytest)",
+                    content=test_content,
+                    branch=pr_branch,
+                )
             
             # Create pull request
             pr = repo.create_pull(
@@ -133,7 +147,7 @@ Note: GITHUB_TOKEN not configured. PR was not actually created.
 
 - Coverage: {coverage.lines}% lines, {coverage.branches}% branches
 - Generated test suite with veritas-pytest
-- Output location: `experiments/{run_id}/`
+- Output location: `{file_path}`
 
 Generated by veritas-pytest.
 """,
@@ -161,14 +175,14 @@ Generated by veritas-pytest.
 
 - Coverage: {coverage.lines}% lines, {coverage.branches}% branches
 - Generated test suite
-- Output location: `experiments/{run_id}/`
+- Output location: `{file_path}`
 
 Generated by veritas-pytest.
 
 Error creating PR (GitHub API {error_status}): {error_msg}
 """,
                 url=None,
-                changed_files=[f"experiments/{run_id}/test_{function_name}.py"],
+                changed_files=[file_path],
             )
         except Exception as e:
             error_msg = str(e)
@@ -181,12 +195,12 @@ Error creating PR (GitHub API {error_status}): {error_msg}
 
 - Coverage: {coverage.lines}% lines, {coverage.branches}% branches
 - Generated test suite
-- Output location: `experiments/{run_id}/`
+- Output location: `{file_path}`
 
 Generated by veritas-pytest.
 
 Error creating PR: {error_msg}
 """,
                 url=None,
-                changed_files=[f"experiments/{run_id}/test_{function_name}.py"],
+                changed_files=[file_path],
             )
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, TypeVar
+
+import httpx
+import openai
+
+T = TypeVar("T")
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# Status codes worth retrying: timeouts, conflicts, rate limits and server errors
+_RETRYABLE_STATUS = {408, 409, 429}
+
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse rate limit reset headers such as "1s", "6m0s" or "20ms" into seconds"""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, openai.APIConnectionError):
+        # Includes timeouts
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in _RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Server-suggested delay in seconds, if the error response carries one"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            pass
+    return None
+
+
+class RetriesExhausted(Exception):
+    """Raised when an LLM call kept failing with transient errors"""
+
+
+class RateLimiter:
+    """Client-side request and token budget shared by every LLM call in the process
+
+    Calls wait for room in a sliding one-minute window instead of failing.
+    Limits start from LLM_RPM_LIMIT / LLM_TPM_LIMIT and are corrected from the
+    x-ratelimit-* headers of every response, so the budget follows the account.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        window_seconds: float = 60.0,
+    ):
+        self.requests_per_minute = requests_per_minute or int(os.getenv("LLM_RPM_LIMIT", "500"))
+        self.tokens_per_minute = tokens_per_minute or int(os.getenv("LLM_TPM_LIMIT", "200000"))
+        self.window_seconds = window_seconds
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "5"))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+        self.backoff_max = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+        # Each entry is [sent_at, tokens]; tokens are corrected once the call returns
+        self._window: Deque[List[float]] = deque()
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        # Remaining budget reported by the server, with the time it resets
+        self._remaining_requests: Optional[int] = None
+        self._requests_reset_at = 0.0
+        self._remaining_tokens: Optional[int] = None
+        self._tokens_reset_at = 0.0
+        self.waits = 0
+        self.retries = 0
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        """Update limits and remaining budget from x-ratelimit-* response headers"""
+        now = time.monotonic()
+        with self._lock:
+            for kind in ("requests", "tokens"):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = headers.get(f"x-ratelimit-reset-{kind}")
+                if limit and limit.isdigit():
+                    setattr(self, f"{kind}_per_minute", int(limit))
+                if remaining and remaining.isdigit():
+                    reset_in = parse_reset_duration(reset) if reset else None
+                    setattr(self, f"_remaining_{kind}", int(remaining))
+                    setattr(self, f"_{kind}_reset_at", now + (reset_in or self.window_seconds))
+
+    def observe_response(self, response: httpx.Response) -> None:
+        """httpx response hook, so headers are seen for every call including failures"""
+        self.observe(response.headers)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller, e.g. after the server answered 429"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _delay(self, tokens: int, now: float) -> float:
+        while self._window and self._window[0][0] <= now - self.window_seconds:
+            self._window.popleft()
+        delay = self._paused_until - now
+
+        if len(self._window) >= self.requests_per_minute:
+            delay = max(delay, self._window[0][0] + self.window_seconds - now)
+        used = sum(entry[1] for entry in self._window)
+        if used + tokens > self.tokens_per_minute:
+            # Wait until enough of the window has expired to fit this call
+            for sent_at, spent in self._window:
+                used -= spent
+                if used + tokens <= self.tokens_per_minute:
+                    delay = max(delay, sent_at + self.window_seconds - now)
+                    break
+
+        if self._remaining_requests is not None and now < self._requests_reset_at:
+            if self._remaining_requests <= 0:
+                delay = max(delay, self._requests_reset_at - now)
+        if self._remaining_tokens is not None and now < self._tokens_reset_at:
+            if self._remaining_tokens < tokens:
+                delay = max(delay, self._tokens_reset_at - now)
+        return delay
+
+    async def acquire(self, tokens: int) -> List[float]:
+        """Wait until the call fits the budget and reserve it"""
+        # A single oversized call must still be able to go through
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                delay = self._delay(tokens, now)
+                if delay <= 0:
+                    entry = [now, tokens]
+                    self._window.append(entry)
+                    if self._remaining_requests is not None:
+                        self._remaining_requests -= 1
+                    if self._remaining_tokens is not None:
+                        self._remaining_tokens -= tokens
+                    return entry
+                self.waits += 1
+            await asyncio.sleep(delay)
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter, so retrying callers spread out"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def run(
+        self,
+        call: Callable[[], T],
+        tokens: int,
+        used_tokens: Optional[Callable[[T], int]] = None,
+        max_retries: Optional[int] = None,
+    ) -> T:
+        """Run a blocking call in a thread within the budget, retrying transient errors"""
+        if max_retries is None:
+            max_retries = self.max_retries
+        for attempt in range(max_retries + 1):
+            entry = await self.acquire(tokens)
+            try:
+                result = await asyncio.to_thread(call)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt >= max_retries:
+                    raise RetriesExhausted(
+                        f"LLM call failed after {attempt + 1} attempts: {e}"
+                    ) from e
+                delay = retry_after(e) or self.backoff(attempt)
+                if isinstance(e, openai.RateLimitError):
+                    # The limit is shared, so everyone backs off, not just this caller
+                    self.pause(delay)
+                self.retries += 1
+                print(f"LLM call failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            if used_tokens is not None:
+                with self._lock:
+                    entry[1] = used_tokens(result)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._delay(0, time.monotonic())
+            return {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "requests_in_window": len(self._window),
+                "tokens_in_window": sum(entry[1] for entry in self._window),
+                "waits": self.waits,
+                "retries": self.retries,
+            }
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.sandbox import Sandbox
+from services.state_backend import state_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds of the same environment are not serialized
+    fcntl = None
+
+# Written into a run directory when its tests run against a local checkout
+RUNTIME_FILE = ".veritas-runtime.json"
+
+# Files whose contents decide what an environment has installed
+DEPENDENCY_FILES = (
+    "pyproject.toml",
+    "setup.py",
+    "setup.cfg",
+    "requirements.txt",
+    "requirements-dev.txt",
+    "poetry.lock",
+    "uv.lock",
+)
+
+# Prepended to the run directory's conftest; loads your_module.py as a module of the
+# package it comes from, so its relative imports resolve against the checkout
+MODULE_SHIM = '''import importlib.util as _util
+import os as _os
+import sys as _sys
+
+_spec = _util.spec_from_file_location(
+    "your_module", _os.path.join(_os.path.dirname(__file__), "your_module.py")
+)
+_module = _util.module_from_spec(_spec)
+_module.__package__ = {package!r}
+_sys.modules["your_module"] = _module
+_spec.loader.exec_module(_module)
+'''
+
+
+def module_package(repo: str, module_path: str) -> Tuple[str, str]:
+    """(directory to import from, dotted package) of a module file in a checkout"""
+    directory = os.path.dirname(os.path.join(repo, module_path))
+    parts: List[str] = []
+    while os.path.exists(os.path.join(directory, "__init__.py")) and directory != repo:
+        parts.insert(0, os.path.basename(directory))
+        directory = os.path.dirname(directory)
+    return directory, ".".join(parts)
+
+
+def write_runtime(run_dir: str, environment: Dict[str, Any]) -> None:
+    """Point the tests of a run directory at an environment from RepoEnvironments.prepare"""
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, RUNTIME_FILE), "w") as f:
+        json.dump({key: environment[key] for key in ("python", "pythonpath", "package")}, f)
+
+
+def runtime(run_dir: str) -> Tuple[str, Dict[str, str]]:
+    """Interpreter and extra environment for running the tests of a run directory"""
+    path = os.path.join(run_dir, RUNTIME_FILE)
+    if not os.path.exists(path):
+        return sys.executable, {}
+    with open(path, "r") as f:
+        data = json.load(f)
+    return data["python"], {"PYTHONPATH": os.pathsep.join(data["pythonpath"])}
+
+
+def conftest_prelude(run_dir: str) -> str:
+    """The module shim for a run directory whose module belongs to a package, if any"""
+    path = os.path.join(run_dir, RUNTIME_FILE)
+    if not os.path.exists(path):
+        return ""
+    with open(path, "r") as f:
+        package = json.load(f).get("package")
+    return MODULE_SHIM.format(package=package) if package else ""
+
+
+class RepoEnvironments:
+    """Warm virtualenvs for running generated tests against local checkouts
+
+    One environment per checkout, keyed by its dependency files: the first
+    run installs the project and the test tools, later runs reuse it until
+    the dependencies change. Checkouts must live under LOCAL_REPO_ROOTS.
+    """
+
+    def __init__(self):
+        self.root = os.path.abspath(os.getenv("REPO_ENV_DIR", state_path("envs")))
+        self.allowed_roots = [
+            os.path.realpath(path)
+            for path in os.getenv("LOCAL_REPO_ROOTS", "").split(os.pathsep)
+            if path
+        ]
+        self.python = os.getenv("REPO_ENV_PYTHON", sys.executable)
+        self.test_packages = os.getenv("REPO_ENV_TEST_PACKAGES", "pytest pytest-cov hypothesis").split()
+        self.timeout = float(os.getenv("REPO_ENV_TIMEOUT_SECONDS", "900"))
+        # Installing runs the checkout's build code: keep secrets from it and cap
+        # its resources like a test run, but with the network pip needs
+        self.sandbox = Sandbox()
+        self.sandbox.allow_network = True
+        self.sandbox.cpu_seconds = int(os.getenv("REPO_ENV_CPU_SECONDS", "600"))
+        self.sandbox.memory_mb = int(os.getenv("REPO_ENV_MEMORY_MB", "4096"))
+        self.sandbox.file_size_mb = int(os.getenv("REPO_ENV_FILE_SIZE_MB", "1024"))
+
+    def resolve(self, local_repo: str) -> str:
+        """Real path of a checkout runs may use; raises ValueError otherwise"""
+        if not self.allowed_roots:
+            raise ValueError("Local repository mode is disabled; set LOCAL_REPO_ROOTS to enable it")
+        repo = os.path.realpath(local_repo)
+        if not any(repo == root or repo.startswith(root + os.sep) for root in self.allowed_roots):
+            raise ValueError(f"Local repository is outside LOCAL_REPO_ROOTS: {local_repo}")
+        if not os.path.isdir(repo):
+            raise ValueError(f"Local repository not found: {local_repo}")
+        return repo
+
+    def _names(self, repo: str) -> Tuple[str, str]:
+        """(prefix shared by every environment of the checkout, full environment name)"""
+        prefix = f"{os.path.basename(repo)}-{hashlib.sha256(repo.encode()).hexdigest()[:8]}"
+        digest = hashlib.sha256(f"{self.python}\0{' '.join(self.test_packages)}".encode())
+        for name in DEPENDENCY_FILES:
+            path = os.path.join(repo, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    digest.update(name.encode() + b"\0" + f.read())
+        return prefix, f"{prefix}-{digest.hexdigest()[:12]}"
+
+    def _run(self, args: List[str]) -> None:
+        result = self.sandbox.run(args, self.root, timeout=self.timeout)
+        if result["exit_code"] != 0:
+            output = (result["stderr"] or result["stdout"]).strip().splitlines()
+            raise RuntimeError(f"{' '.join(args[:4])} failed: {' '.join(output[-5:])}")
+
+    def prepare(self, local_repo: str, module_path: Optional[str] = None) -> Dict[str, Any]:
+        """Build or reuse the environment of a checkout
+
+        Returns the interpreter, the import path, whether a warm environment
+        was reused and the package of module_path for the module shim.
+        """
+        repo = self.resolve(local_repo)
+        prefix, name = self._names(repo)
+        env_dir = os.path.join(self.root, name)
+        python = os.path.join(env_dir, "Scripts" if os.name == "nt" else "bin", "python")
+        ready = os.path.join(env_dir, ".veritas-ready")
+        started = time.monotonic()
+
+        pythonpath = [repo]
+        if os.path.isdir(os.path.join(repo, "src")):
+            pythonpath.append(os.path.join(repo, "src"))
+        package = ""
+        if module_path:
+            import_root, package = module_package(repo, module_path)
+            if import_root not in pythonpath:
+                pythonpath.insert(0, import_root)
+
+        os.makedirs(self.root, exist_ok=True)
+        with open(f"{env_dir}.lock", "w") as lock:
+            if fcntl is not None:
+                # Another worker may be building the same environment
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            reused = os.path.exists(ready)
+            if not reused:
+                shutil.rmtree(env_dir, ignore_errors=True)
+                try:
+                    self._run([self.python, "-m", "venv", env_dir])
+                    pip = [python, "-m", "pip", "install", "--quiet", "--disable-pip-version-check"]
+                    if self.test_packages:
+                        self._run(pip + self.test_packages)
+                    if any(os.path.exists(os.path.join(repo, f)) for f in ("pyproject.toml", "setup.py")):
+                        self._run(pip + ["-e", repo])
+                    elif os.path.exists(os.path.join(repo, "requirements.txt")):
+                        self._run(pip + ["-r", os.path.join(repo, "requirements.txt")])
+                except (OSError, subprocess.SubprocessError, RuntimeError):
+                    shutil.rmtree(env_dir, ignore_errors=True)
+                    raise
+                open(ready, "w").close()
+                # Environments for older dependency sets of this checkout are dead weight
+                for entry in os.listdir(self.root):
+                    if entry.startswith(prefix + "-") and not entry.startswith(name):
+                        path = os.path.join(self.root, entry)
+                        if os.path.isdir(path):
+                            shutil.rmtree(path, ignore_errors=True)
+                        else:
+                            os.remove(path)
+
+        return {
+            "python": python,
+            "pythonpath": pythonpath,
+            "package": package,
+            "reused": reused,
+            "seconds": round(time.monotonic() - started, 3),
+        }
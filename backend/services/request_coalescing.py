@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+
+
+def request_key(*parts: Any) -> str:
+    """Stable key for a request built from JSON-serializable parts"""
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Nobody may be waiting on a failed call; don't log it as unretrieved
+    if not future.cancelled():
+        future.exception()
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared), where shared means another caller made the call"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shield so one waiter being cancelled does not cancel the shared call
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        self._inflight[key] = future
+        self.calls += 1
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
+
+
+class MicroBatcher:
+    """Group requests that arrive within a short window into one handler call
+
+    Requests with the same group key (e.g. the same module) share a batch.
+    A batch is flushed when its window closes or when it is full; the handler
+    receives the batch's items and returns one result per item.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        window_seconds: float,
+        max_size: int,
+    ):
+        self.handler = handler
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        self._pending: Dict[Hashable, Tuple[List[Any], List[asyncio.Future]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, group: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(group)
+        if batch is None:
+            batch = ([], [])
+            self._pending[group] = batch
+            loop.call_later(self.window_seconds, self._flush, group, batch)
+        batch[0].append(item)
+        batch[1].append(future)
+        if len(batch[0]) >= self.max_size:
+            self._flush(group, batch)
+        return await future
+
+    def _flush(self, group: Hashable, batch: Tuple[List[Any], List[asyncio.Future]]) -> None:
+        if self._pending.get(group) is not batch:
+            # Already flushed because it filled up
+            return
+        del self._pending[group]
+        self.batches += 1
+        self.items += len(batch[0])
+        task = asyncio.ensure_future(self._execute(group, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, group: Hashable, batch: Tuple[List[Any], List[asyncio.Future]]) -> None:
+        items, futures = batch
+        try:
+            results = await self.handler(group, items)
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Cancellation and other BaseExceptions still propagate, but no waiter is left
+            # on a future nobody resolves; cancel() does nothing to resolved futures
+            for future in futures:
+                future.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {"batches": self.batches, "items": self.items, "pending": len(self._pending)}
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from models import CoverageSummary, RunOptions
+from services.code_analysis import function_fingerprint
+
+# Options that do not change the cached suite: PR creation and profiling, which runs
+# again on a cache hit
+_NON_SEMANTIC_OPTIONS = {
+    "create_pr", "repo_url", "branch", "test_path", "profile_tests", "slow_test_seconds"
+}
+
+
+class CacheEntry:
+    """A passing test suite stored for a function fingerprint"""
+
+    __slots__ = (
+        "key",
+        "function_name",
+        "generated_tests",
+        "inferred_spec",
+        "edge_cases",
+        "coverage_summary",
+        "test_coverage",
+        "patch_diff",
+        "source_run_id",
+        "created_at",
+        "hits",
+    )
+
+    def __init__(
+        self,
+        key: str,
+        function_name: str,
+        generated_tests: str,
+        inferred_spec: str,
+        edge_cases: List[str],
+        coverage_summary: CoverageSummary,
+        patch_diff: str,
+        source_run_id: str,
+        test_coverage: Optional[Dict[str, Any]] = None,
+    ):
+        self.key = key
+        self.function_name = function_name
+        self.generated_tests = generated_tests
+        self.inferred_spec = inferred_spec
+        self.edge_cases = edge_cases
+        self.coverage_summary = coverage_summary
+        # Per-test coverage, which mutation testing and minimization need on a hit
+        self.test_coverage = test_coverage
+        self.patch_diff = patch_diff
+        self.source_run_id = source_run_id
+        self.created_at = time.time()
+        self.hits = 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "function_name": self.function_name,
+            "source_run_id": self.source_run_id,
+            "created_at": self.created_at,
+            "hits": self.hits,
+        }
+
+
+class ResultCache:
+    """LRU cache of passing suites keyed by AST fingerprint and run options"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries or int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, code: str, function_name: str, options: RunOptions) -> Optional[str]:
+        """Build the cache key, or None if the target cannot be fingerprinted"""
+        fingerprint = function_fingerprint(code, function_name)
+        if fingerprint is None:
+            return None
+        semantic_options = options.dict(exclude=_NON_SEMANTIC_OPTIONS)
+        options_blob = json.dumps(semantic_options, sort_keys=True)
+        return hashlib.sha256(
+            f"{function_name}\0{fingerprint}\0{options_blob}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[CacheEntry]:
+        """Look up an entry, dropping it if it has expired"""
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry.created_at > self.ttl_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.hits += 1
+        return entry
+
+    def put(self, entry: CacheEntry) -> None:
+        """Store an entry, evicting the least recently used ones over capacity"""
+        self._entries[entry.key] = entry
+        self._entries.move_to_end(entry.key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None, function_name: Optional[str] = None) -> int:
+        """Remove one entry, all entries for a function, or everything"""
+        if key is not None:
+            return 1 if self._entries.pop(key, None) is not None else 0
+        if function_name is not None:
+            stale = [k for k, e in self._entries.items() if e.function_name == function_name]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+        removed = len(self._entries)
+        self._entries.clear()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": [entry.summary() for entry in self._entries.values()],
+        }
@@ -0,0 +1,142 @@
+import base64
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Index entries sort by creation time, with the run id as a tie-breaker
+IndexKey = Tuple[str, str]
+
+_MAX_KEY = "\uffff"
+
+
+def encode_cursor(key: IndexKey) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]}|{key[1]}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> IndexKey:
+    """Decode a cursor, raising ValueError if it is malformed"""
+    try:
+        created_at, run_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, run_id
+
+
+class RunIndex:
+    """Sorted secondary indexes over runs for paginated history queries
+
+    Each index is a list of (created_at, run_id) kept in order, so a page is
+    a bisect plus a slice regardless of how many runs exist, and per-status
+    and per-function totals come from maintained counters.
+    """
+
+    def __init__(self):
+        self._all: List[IndexKey] = []
+        self._by_status: Dict[str, List[IndexKey]] = {}
+        self._by_function: Dict[str, List[IndexKey]] = {}
+        self._by_status_function: Dict[Tuple[str, str], List[IndexKey]] = {}
+        self._status: Dict[str, str] = {}
+        self._keys: Dict[str, IndexKey] = {}
+        self._function: Dict[str, str] = {}
+        self.status_counts: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    @staticmethod
+    def _insert(index: List[IndexKey], key: IndexKey) -> None:
+        # Runs are almost always created in time order, so appending is the fast path
+        if not index or index[-1] <= key:
+            index.append(key)
+        else:
+            insort(index, key)
+
+    @staticmethod
+    def _remove(index: List[IndexKey], key: IndexKey) -> None:
+        position = bisect_left(index, key)
+        if position < len(index) and index[position] == key:
+            del index[position]
+
+    def add(self, run_id: str, created_at: str, function_name: str, status: str) -> None:
+        if run_id in self._keys:
+            self.update_status(run_id, status)
+            return
+        key = (created_at, run_id)
+        self._keys[run_id] = key
+        self._function[run_id] = function_name
+        self._status[run_id] = status
+        self._insert(self._all, key)
+        self._insert(self._by_status.setdefault(status, []), key)
+        self._insert(self._by_function.setdefault(function_name, []), key)
+        self._insert(self._by_status_function.setdefault((status, function_name), []), key)
+        self.status_counts[status] += 1
+
+    def update_status(self, run_id: str, status: str) -> None:
+        old_status = self._status.get(run_id)
+        if old_status is None or old_status == status:
+            return
+        key = self._keys[run_id]
+        function_name = self._function[run_id]
+        self._remove(self._by_status[old_status], key)
+        self._remove(self._by_status_function[(old_status, function_name)], key)
+        self._insert(self._by_status.setdefault(status, []), key)
+        self._insert(self._by_status_function.setdefault((status, function_name), []), key)
+        self._status[run_id] = status
+        self.status_counts[old_status] -= 1
+        self.status_counts[status] += 1
+
+    def remove(self, run_id: str) -> None:
+        key = self._keys.pop(run_id, None)
+        if key is None:
+            return
+        status = self._status.pop(run_id)
+        function_name = self._function.pop(run_id)
+        self._remove(self._all, key)
+        self._remove(self._by_status[status], key)
+        self._remove(self._by_function[function_name], key)
+        self._remove(self._by_status_function[(status, function_name)], key)
+        self.status_counts[status] -= 1
+
+    def _select(self, status: Optional[str], function_name: Optional[str]) -> List[IndexKey]:
+        if status and function_name:
+            return self._by_status_function.get((status, function_name), [])
+        if status:
+            return self._by_status.get(status, [])
+        if function_name:
+            return self._by_function.get(function_name, [])
+        return self._all
+
+    def page(
+        self,
+        status: Optional[str] = None,
+        function_name: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[int, int, List[IndexKey]]:
+        """Return (lower, upper, index) bounds of matching runs, newest last
+
+        Callers walk index[lower:upper] backwards; the count of matches is
+        upper - lower without touching any run.
+        """
+        index = self._select(status, function_name)
+        lower = bisect_right(index, (created_after, _MAX_KEY)) if created_after else 0
+        upper = bisect_left(index, (created_before, "")) if created_before else len(index)
+        if cursor:
+            upper = min(upper, bisect_left(index, decode_cursor(cursor)))
+        return lower, max(upper, lower), index
+
+    def count(
+        self,
+        status: Optional[str] = None,
+        function_name: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+    ) -> int:
+        """Count matching runs from index bounds"""
+        if not created_after and not created_before:
+            if status and not function_name:
+                return self.status_counts[status]
+            return len(self._select(status, function_name))
+        lower, upper, _ = self.page(status, function_name, created_after, created_before)
+        return upper - lower
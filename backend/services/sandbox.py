@@ -0,0 +1,220 @@
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: run without limits
+    resource = None
+
+# Directory holding the sitecustomize that blocks sockets when no network
+# namespace can be created
+_GUARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_site")
+
+# Applies the limits in the child, see its docstring
+_EXEC_WRAPPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_exec.py")
+
+# Environment variables never passed to the code under test
+_SECRET_ENV = re.compile(r"KEY|TOKEN|SECRET|PASSWORD", re.IGNORECASE)
+
+_MB = 1024 * 1024
+
+
+def _wrap(args: List[str], namespace_flags: Optional[int], limits: List[List[int]]) -> List[str]:
+    """Command line that runs args through the wrapper with the given namespace and limits"""
+    spec = json.dumps({"unshare": namespace_flags, "limits": limits})
+    # -I -S keeps the wrapper's own startup short and free of the caller's PYTHON* settings
+    return [sys.executable, "-I", "-S", _EXEC_WRAPPER, spec, *args]
+
+
+def _network_namespace_flags() -> Optional[int]:
+    """unshare() flags that give a child an empty network namespace here, if any"""
+    if not hasattr(os, "unshare"):
+        return None
+    for flags in (os.CLONE_NEWNET, os.CLONE_NEWUSER | os.CLONE_NEWNET):
+        try:
+            result = subprocess.run(
+                _wrap([sys.executable, "-c", "pass"], flags, []),
+                capture_output=True,
+                timeout=10,
+            )
+        except (OSError, subprocess.SubprocessError):
+            continue
+        if result.returncode == 0:
+            return flags
+    return None
+
+
+class Sandbox:
+    """Runs generated tests in a child process with resource limits
+
+    Each execution gets its own session with setrlimit caps on CPU time,
+    address space, file size and process count, a wall-clock timeout and no
+    network. The caps are applied by a wrapper process that then execs the
+    command. Resource usage of the child is measured with wait4 and reported
+    with the result.
+    """
+
+    _namespace_flags: Optional[int] = None
+    _namespace_probed = False
+    _probe_lock = threading.Lock()
+
+    def __init__(self):
+        self.cpu_seconds = int(os.getenv("SANDBOX_CPU_SECONDS", "30"))
+        self.memory_mb = int(os.getenv("SANDBOX_MEMORY_MB", "1024"))
+        self.file_size_mb = int(os.getenv("SANDBOX_FILE_SIZE_MB", "64"))
+        # RLIMIT_NPROC counts every process of the user, the server's included, and
+        # root ignores it: it only stops fork bombs under a dedicated unprivileged user
+        self.max_processes = int(os.getenv("SANDBOX_MAX_PROCESSES", "512"))
+        self.wall_seconds = float(os.getenv("SANDBOX_WALL_SECONDS", "30"))
+        self.allow_network = os.getenv("SANDBOX_ALLOW_NETWORK", "false").lower() == "true"
+
+    @classmethod
+    def namespace_flags(cls) -> Optional[int]:
+        with cls._probe_lock:
+            if not cls._namespace_probed:
+                cls._namespace_flags = _network_namespace_flags()
+                cls._namespace_probed = True
+                if cls._namespace_flags is None:
+                    print("Network namespaces unavailable; sandbox blocks sockets in Python instead")
+            return cls._namespace_flags
+
+    def _environment(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        env = {name: value for name, value in os.environ.items() if not _SECRET_ENV.search(name)}
+        env.update(extra or {})
+        if not self.allow_network:
+            env["VERITAS_SANDBOX_NO_NETWORK"] = "1"
+            env["PYTHONPATH"] = os.pathsep.join(
+                path for path in (_GUARD_DIR, env.get("PYTHONPATH")) if path
+            )
+        return env
+
+    def _limits(self) -> List[List[int]]:
+        """setrlimit arguments for the child"""
+        limits = []
+        if self.cpu_seconds > 0:
+            # The soft limit sends SIGXCPU; the hard limit kills
+            limits.append([resource.RLIMIT_CPU, self.cpu_seconds, self.cpu_seconds + 1])
+        if self.memory_mb > 0:
+            # Linux does not enforce RLIMIT_RSS; capping address space is the closest
+            limits.append([resource.RLIMIT_AS, self.memory_mb * _MB, self.memory_mb * _MB])
+        if self.file_size_mb > 0:
+            limits.append([resource.RLIMIT_FSIZE, self.file_size_mb * _MB, self.file_size_mb * _MB])
+        if self.max_processes > 0 and hasattr(resource, "RLIMIT_NPROC"):
+            limits.append([resource.RLIMIT_NPROC, self.max_processes, self.max_processes])
+        limits.append([resource.RLIMIT_CORE, 0, 0])
+        return limits
+
+    def run(
+        self,
+        args: List[str],
+        cwd: str,
+        timeout: Optional[float] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Run a command to completion, returning its output, exit code and resource usage"""
+        timeout = timeout or self.wall_seconds
+        namespace_flags = None if self.allow_network else self.namespace_flags()
+        if resource is not None:
+            # Setting the limits in a preexec_fn is not safe in a process with threads
+            args = _wrap(args, namespace_flags, self._limits())
+        started = time.monotonic()
+        process = subprocess.Popen(
+            args,
+            cwd=cwd,
+            env=self._environment(env),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            start_new_session=True,
+        )
+
+        # Drain both pipes while waiting, so a chatty child cannot block on a full pipe
+        output: Dict[str, str] = {}
+        readers = [
+            threading.Thread(target=lambda name, stream: output.__setitem__(name, stream.read()), args=item)
+            for item in (("stdout", process.stdout), ("stderr", process.stderr))
+        ]
+        for reader in readers:
+            reader.start()
+
+        timed_out = False
+        rusage = None
+        if hasattr(os, "wait4"):
+            while True:
+                pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+                if pid:
+                    process.returncode = os.waitstatus_to_exitcode(status)
+                    break
+                if time.monotonic() - started > timeout and not timed_out:
+                    timed_out = True
+                    self._kill(process)
+                time.sleep(0.01)
+        else:
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                self._kill(process)
+                process.wait()
+        wall_seconds = time.monotonic() - started
+
+        # Kill anything the tests left running in the group, which would hold the pipes open
+        self._kill(process)
+        for reader in readers:
+            reader.join()
+        process.stdout.close()
+        process.stderr.close()
+
+        stdout, stderr = output.get("stdout", ""), output.get("stderr", "")
+        cpu_seconds = rusage.ru_utime + rusage.ru_stime if rusage else None
+        limit_exceeded = self._limit_exceeded(
+            process.returncode, stdout + stderr, timed_out, cpu_seconds
+        )
+        if limit_exceeded:
+            stderr += f"\nSandbox limit exceeded: {limit_exceeded}"
+        return {
+            "stdout": stdout,
+            "stderr": stderr,
+            "exit_code": process.returncode,
+            "resource_usage": {
+                "cpu_seconds": round(cpu_seconds, 3) if rusage else None,
+                # ru_maxrss is in kilobytes on Linux and bytes on macOS
+                "max_rss_mb": round(
+                    rusage.ru_maxrss / (_MB if sys.platform == "darwin" else 1024), 1
+                ) if rusage else None,
+                "wall_seconds": round(wall_seconds, 3),
+                "limit_exceeded": limit_exceeded,
+                "network_isolated": not self.allow_network,
+            },
+        }
+
+    @staticmethod
+    def _kill(process: subprocess.Popen):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (OSError, AttributeError):
+            pass
+
+    def _limit_exceeded(
+        self, returncode: int, output: str, timed_out: bool, cpu_seconds: Optional[float]
+    ) -> Optional[str]:
+        if timed_out:
+            return f"wall clock ({self.wall_seconds:g}s)"
+        if returncode == -signal.SIGXCPU or (
+            returncode == -signal.SIGKILL and cpu_seconds is not None
+            and self.cpu_seconds > 0 and cpu_seconds >= self.cpu_seconds
+        ):
+            return f"cpu time ({self.cpu_seconds}s)"
+        if returncode == -signal.SIGXFSZ or "File too large" in output:
+            return f"file size ({self.file_size_mb} MB)"
+        if "MemoryError" in output:
+            return f"memory ({self.memory_mb} MB)"
+        return None
@@ -0,0 +1,39 @@
+"""Applies the sandbox's namespace and resource limits to itself, then execs a command
+
+Sandbox starts commands through this script instead of a preexec_fn, which is
+not safe to run between fork and exec in a server with threads. It runs as its
+own single-threaded interpreter and keeps its pid across the exec, so the
+sandbox's wait4 still measures the command.
+
+Usage: python sandbox_exec.py SPEC COMMAND [ARG...]
+where SPEC is JSON: {"unshare": flags or null, "limits": [[resource, soft, hard], ...]}
+"""
+import json
+import os
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def main() -> None:
+    spec = json.loads(sys.argv[1])
+    if spec["unshare"] is not None:
+        os.unshare(spec["unshare"])
+    for kind, soft, hard in spec["limits"]:
+        current_soft, current_hard = resource.getrlimit(kind)
+        if current_hard != resource.RLIM_INFINITY:
+            # Limits can only be lowered
+            soft, hard = min(soft, current_hard), min(hard, current_hard)
+        resource.setrlimit(kind, (soft, hard))
+    try:
+        os.execvp(sys.argv[2], sys.argv[2:])
+    except OSError as e:
+        print(f"sandbox: cannot run {sys.argv[2]}: {e}", file=sys.stderr)
+        sys.exit(127)
+
+
+if __name__ == "__main__":
+    main()
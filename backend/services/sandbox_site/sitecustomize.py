@@ -0,0 +1,32 @@
+"""Loaded by every sandboxed test process; blocks network access when requested
+
+Used when the host cannot give test processes an empty network namespace.
+Unix domain sockets keep working, since pytest plugins may use them locally.
+"""
+import os
+import socket
+
+if os.environ.get("VERITAS_SANDBOX_NO_NETWORK") == "1":
+
+    def _blocked(*args, **kwargs):
+        raise OSError("network access is disabled in the test sandbox")
+
+    class _GuardedSocket(socket.socket):
+        def connect(self, address):
+            if self.family == getattr(socket, "AF_UNIX", None):
+                return super().connect(address)
+            _blocked()
+
+        def connect_ex(self, address):
+            if self.family == getattr(socket, "AF_UNIX", None):
+                return super().connect_ex(address)
+            _blocked()
+
+        def sendto(self, *args):
+            if self.family == getattr(socket, "AF_UNIX", None):
+                return super().sendto(*args)
+            _blocked()
+
+    socket.socket = _GuardedSocket
+    socket.getaddrinfo = _blocked
+    socket.create_connection = _blocked
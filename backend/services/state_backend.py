@@ -0,0 +1,688 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from models import RunResult
+from services.blob_store import MemoryBlobStore, SQLiteBlobStore
+from services.event_log import EventLog
+from services.run_index import RunIndex, decode_cursor, encode_cursor
+
+# Fields returned by run listings
+RUN_SUMMARY_FIELDS = {
+    "run_id",
+    "status",
+    "function_name",
+    "coverage_summary",
+    "iterations_used",
+    "cache_hit",
+    "created_at",
+    "updated_at",
+}
+
+# Large fields kept in the blob store rather than in run records
+BLOB_FIELDS = (
+    "code", "generated_tests", "test_run_output", "patch_diff", "profile_stats",
+    "test_coverage", "checkpoints",
+)
+_JSON_BLOB_FIELDS = {"test_run_output", "test_coverage", "checkpoints"}
+FINAL_STATUSES = {"success", "failed", "cancelled"}
+
+# Default home of the state files, independent of the directory the server starts in
+_DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "veritas_state")
+
+
+def state_path(*parts: str) -> str:
+    """Path under the state directory, VERITAS_STATE_DIR"""
+    return os.path.join(os.path.abspath(os.getenv("VERITAS_STATE_DIR", _DEFAULT_STATE_DIR)), *parts)
+
+
+class RunRecord:
+    """Compact form of a stored run
+
+    The fields listings and status checks read are slots, the other small
+    fields one JSON document, and the large fields digests into a blob
+    store that are only loaded when they are asked for.
+    """
+
+    __slots__ = (
+        "run_id", "status", "function_name", "coverage_lines", "created_at", "updated_at",
+        "meta", "blobs",
+    )
+
+    def __init__(
+        self,
+        run_id: str,
+        status: str,
+        function_name: str,
+        coverage_lines: int,
+        created_at: str,
+        updated_at: str,
+        meta: str,
+        blobs: Dict[str, str],
+    ):
+        self.run_id = run_id
+        self.status = status
+        self.function_name = function_name
+        self.coverage_lines = coverage_lines
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.meta = meta
+        self.blobs = blobs
+
+    @classmethod
+    def pack(cls, run: RunResult, blobs) -> "RunRecord":
+        data = run.dict()
+        refs: Dict[str, str] = {}
+        for name in BLOB_FIELDS:
+            value = data[name]
+            # Empty values are cheaper inline than as a reference
+            if value:
+                refs[name] = blobs.put(value if isinstance(value, str) else json.dumps(value))
+                del data[name]
+        return cls(
+            run.run_id,
+            run.status,
+            run.function_name,
+            run.coverage_summary.lines,
+            run.created_at,
+            run.updated_at,
+            json.dumps(data),
+            refs,
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> "RunRecord":
+        """Read the SQLite form; rows written before blobs existed have every field inline"""
+        data = json.loads(text)
+        refs = data.pop("_blobs", {})
+        return cls(
+            data["run_id"],
+            data["status"],
+            data["function_name"],
+            data["coverage_summary"]["lines"],
+            data["created_at"],
+            data["updated_at"],
+            json.dumps(data),
+            refs,
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({**json.loads(self.meta), "_blobs": self.blobs})
+
+    def load(self, blobs, include: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """The run's fields as a dict, reading only the blobs of the included fields"""
+        data = json.loads(self.meta)
+        for name, digest in self.blobs.items():
+            if include is None or name in include:
+                text = blobs.get(digest)
+                data[name] = json.loads(text) if name in _JSON_BLOB_FIELDS else text
+        if include is not None:
+            data = {name: value for name, value in data.items() if name in include}
+        return data
+
+    def to_run(self, blobs) -> RunResult:
+        return RunResult(**self.load(blobs))
+
+
+class MemoryRunStore:
+    """Run store for a single process
+
+    Runs in progress are working RunResult objects. A run saved with a final
+    status is packed into a RunRecord, with its large text deduplicated in
+    the blob store, and rebuilt only when it is read.
+    """
+
+    def __init__(self, blobs: Optional[MemoryBlobStore] = None):
+        self.blobs = blobs or MemoryBlobStore()
+        self._live: Dict[str, RunResult] = {}
+        self._records: Dict[str, RunRecord] = {}
+        self.index = RunIndex()
+
+    def __contains__(self, run_id: str) -> bool:
+        return run_id in self._live or run_id in self._records
+
+    def __getitem__(self, run_id: str) -> RunResult:
+        run = self.get(run_id)
+        if run is None:
+            raise KeyError(run_id)
+        return run
+
+    def get(self, run_id: str) -> Optional[RunResult]:
+        run = self._live.get(run_id)
+        if run is None and run_id in self._records:
+            run = self._records[run_id].to_run(self.blobs)
+        return run
+
+    def view(self, run_id: str, include: Set[str]) -> Optional[Dict[str, Any]]:
+        """Some fields of a run, without loading the blobs of the others"""
+        run = self._live.get(run_id)
+        if run is not None:
+            return run.dict(include=include)
+        record = self._records.get(run_id)
+        return record.load(self.blobs, include) if record is not None else None
+
+    def checkout(self, run_id: str) -> RunResult:
+        """Return the working copy of a run this process is about to execute"""
+        run = self[run_id]
+        self._live[run_id] = run
+        return run
+
+    def add(self, run: RunResult) -> None:
+        self._live[run.run_id] = run
+        self.index.add(run.run_id, run.created_at, run.function_name, run.status)
+
+    def save(self, run: RunResult) -> None:
+        self.index.update_status(run.run_id, run.status)
+        if run.status in FINAL_STATUSES:
+            self._records[run.run_id] = RunRecord.pack(run, self.blobs)
+            self._live.pop(run.run_id, None)
+        else:
+            self._live[run.run_id] = run
+            self._records.pop(run.run_id, None)
+
+    def reopen(self, run: RunResult) -> None:
+        """Save a run that is being retried, even if it was cancelled"""
+        self.save(run)
+
+    def release(self, run_id: str) -> None:
+        """Drop the working copy of a finished run, e.g. one checked out by a rejected retry"""
+        if run_id in self._records:
+            self._live.pop(run_id, None)
+
+    def is_cancelled(self, run_id: str) -> bool:
+        run = self._live.get(run_id) or self._records.get(run_id)
+        return run is not None and run.status == "cancelled"
+
+    def list_runs(
+        self,
+        status: Optional[str] = None,
+        function_name: Optional[str] = None,
+        min_coverage: Optional[int] = None,
+        max_coverage: Optional[int] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """Page through run summaries, newest first"""
+        lower, upper, index = self.index.page(
+            status, function_name, created_after, created_before, cursor
+        )
+        coverage_filtered = min_coverage is not None or max_coverage is not None
+        items = []
+        position = upper
+        while position > lower and len(items) < limit:
+            position -= 1
+            run_id = index[position][1]
+            run = self._live.get(run_id)
+            record = self._records.get(run_id) if run is None else None
+            if run is None and record is None:
+                continue
+            lines = run.coverage_summary.lines if run is not None else record.coverage_lines
+            if min_coverage is not None and lines < min_coverage:
+                continue
+            if max_coverage is not None and lines > max_coverage:
+                continue
+            items.append(self.view(run_id, RUN_SUMMARY_FIELDS))
+
+        has_more = position > lower
+        return {
+            "items": items,
+            "next_cursor": encode_cursor(index[position]) if has_more else None,
+            # Coverage is not indexed, so exact totals are only reported without it
+            "total": None if coverage_filtered else self.index.count(
+                status, function_name, created_after, created_before
+            ),
+            "status_counts": dict(self.index.status_counts),
+        }
+
+
+class MemoryEventBus:
+    """Per-process event fanout; each run's events go to an on-disk EventLog
+
+    Logs of runs that finished more than EVENT_LOG_RETENTION_DAYS ago are
+    deleted, checked at most hourly as runs are sealed.
+    """
+
+    PRUNE_INTERVAL = 3600.0
+
+    def __init__(self, log: Optional[EventLog] = None):
+        self.log = log or EventLog(os.getenv("VERITAS_EVENT_LOG_DIR", state_path("events")))
+        # 0 keeps every log
+        self.retention_seconds = float(os.getenv("EVENT_LOG_RETENTION_DAYS", "7")) * 86400
+        self._pruned_at: Optional[float] = None
+
+    def publish(self, run_id: str, event: Dict[str, Any]) -> None:
+        self.log.append(run_id, event)
+
+    def read(self, run_id: str, offset: int = 0) -> List[Dict[str, Any]]:
+        return list(self.log.read(run_id, offset))
+
+    def stream(self, run_id: str, offset: int = 0) -> Iterator[Dict[str, Any]]:
+        """Events from offset on, without loading the whole log"""
+        return self.log.read(run_id, offset)
+
+    def seal(self, run_id: str) -> None:
+        """Move a finished run's events out of memory and compact its log"""
+        self.log.seal(run_id)
+        now = time.monotonic()
+        if self.retention_seconds > 0 and (
+            self._pruned_at is None or now - self._pruned_at >= self.PRUNE_INTERVAL
+        ):
+            self._pruned_at = now
+            self.log.prune(self.retention_seconds)
+
+    async def wait(self, run_id: str, timeout: float) -> None:
+        await asyncio.sleep(timeout)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    function_name TEXT NOT NULL,
+    coverage_lines INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at, run_id);
+CREATE INDEX IF NOT EXISTS runs_status_created ON runs (status, created_at, run_id);
+CREATE INDEX IF NOT EXISTS runs_function_created ON runs (function_name, created_at, run_id);
+CREATE INDEX IF NOT EXISTS runs_status_function_created
+    ON runs (status, function_name, created_at, run_id);
+CREATE INDEX IF NOT EXISTS runs_coverage_created ON runs (coverage_lines, created_at, run_id);
+
+CREATE TABLE IF NOT EXISTS run_counts (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS run_counts_insert AFTER INSERT ON runs BEGIN
+    INSERT INTO run_counts (status, count) VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS run_counts_update AFTER UPDATE OF status ON runs
+WHEN OLD.status != NEW.status BEGIN
+    UPDATE run_counts SET count = count - 1 WHERE status = OLD.status;
+    INSERT INTO run_counts (status, count) VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS run_counts_delete AFTER DELETE ON runs BEGIN
+    UPDATE run_counts SET count = count - 1 WHERE status = OLD.status;
+END;
+
+-- Filled from the existing runs the first time, in the same transaction as its triggers
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS function_counts (
+    function_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (function_name, status)
+);
+INSERT INTO function_counts (function_name, status, count)
+    SELECT function_name, status, COUNT(*) FROM runs
+    WHERE NOT EXISTS (SELECT 1 FROM function_counts)
+    GROUP BY function_name, status;
+CREATE TRIGGER IF NOT EXISTS function_counts_insert AFTER INSERT ON runs BEGIN
+    INSERT INTO function_counts (function_name, status, count) VALUES (NEW.function_name, NEW.status, 1)
+        ON CONFLICT (function_name, status) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS function_counts_update AFTER UPDATE OF status, function_name ON runs
+WHEN OLD.status != NEW.status OR OLD.function_name != NEW.function_name BEGIN
+    UPDATE function_counts SET count = count - 1
+        WHERE function_name = OLD.function_name AND status = OLD.status;
+    INSERT INTO function_counts (function_name, status, count) VALUES (NEW.function_name, NEW.status, 1)
+        ON CONFLICT (function_name, status) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS function_counts_delete AFTER DELETE ON runs BEGIN
+    UPDATE function_counts SET count = count - 1
+        WHERE function_name = OLD.function_name AND status = OLD.status;
+END;
+COMMIT;
+
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    run_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (run_id, seq)
+);
+"""
+
+
+class SQLiteDatabase:
+    """Shared SQLite connection used by the run store and event bus
+
+    Every worker process opens the same file; WAL mode lets readers proceed
+    while one worker writes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.executescript(_SCHEMA)
+
+    def executescript(self, script: str) -> None:
+        with self._lock:
+            self._conn.executescript(script)
+
+    def execute(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def transaction(self, statements: List[Tuple[str, Tuple]]) -> List[sqlite3.Row]:
+        """Run statements under a write lock, returning the rows of the last one"""
+        rows: List[sqlite3.Row] = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    rows = self._conn.execute(sql, params).fetchall()
+                self._conn.execute("COMMIT")
+                return rows
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class SQLiteRunStore:
+    """Run store shared by every worker through a SQLite file
+
+    Runs executed by this worker are kept as local working copies and
+    written through on save; other runs are loaded from the database.
+    Runs in progress are stored inline, since their large fields change
+    with every step; a run saved with a final status becomes a RunRecord,
+    whose large text is in the shared blobs table.
+    """
+
+    def __init__(self, db: SQLiteDatabase, blobs: Optional[SQLiteBlobStore] = None):
+        self.db = db
+        self.blobs = blobs or SQLiteBlobStore(db)
+        self._local: Dict[str, RunResult] = {}
+
+    def __contains__(self, run_id: str) -> bool:
+        if run_id in self._local:
+            return True
+        return bool(self.db.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)))
+
+    def __getitem__(self, run_id: str) -> RunResult:
+        run = self.get(run_id)
+        if run is None:
+            raise KeyError(run_id)
+        return run
+
+    def get(self, run_id: str) -> Optional[RunResult]:
+        run = self._local.get(run_id)
+        if run is not None:
+            return run
+        rows = self.db.execute("SELECT data FROM runs WHERE run_id = ?", (run_id,))
+        return RunRecord.from_json(rows[0][0]).to_run(self.blobs) if rows else None
+
+    def view(self, run_id: str, include: Set[str]) -> Optional[Dict[str, Any]]:
+        """Some fields of a run, without loading the blobs of the others"""
+        run = self._local.get(run_id)
+        if run is not None:
+            return run.dict(include=include)
+        rows = self.db.execute("SELECT data FROM runs WHERE run_id = ?", (run_id,))
+        return RunRecord.from_json(rows[0][0]).load(self.blobs, include) if rows else None
+
+    def checkout(self, run_id: str) -> RunResult:
+        """Load a run as this worker's working copy, e.g. to resume it"""
+        run = self[run_id]
+        self._local[run_id] = run
+        return run
+
+    def add(self, run: RunResult) -> None:
+        self._local[run.run_id] = run
+        self.db.execute(
+            "INSERT OR REPLACE INTO runs "
+            "(run_id, status, function_name, coverage_lines, created_at, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self._row(run),
+        )
+
+    def save(self, run: RunResult) -> None:
+        """Write a run through, never overwriting a cancellation from another worker"""
+        row = self._row(run)
+        self.db.execute(
+            "UPDATE runs SET status = ?, function_name = ?, coverage_lines = ?, "
+            "created_at = ?, updated_at = ?, data = ? "
+            "WHERE run_id = ? AND (status != 'cancelled' OR ? = 'cancelled')",
+            row[1:] + (run.run_id, run.status),
+        )
+
+    def reopen(self, run: RunResult) -> None:
+        """Save a run that is being retried, even if it was cancelled"""
+        self.db.execute(
+            "UPDATE runs SET status = ?, function_name = ?, coverage_lines = ?, "
+            "created_at = ?, updated_at = ?, data = ? WHERE run_id = ?",
+            self._row(run)[1:] + (run.run_id,),
+        )
+
+    def release(self, run_id: str) -> None:
+        self._local.pop(run_id, None)
+
+    def is_cancelled(self, run_id: str) -> bool:
+        rows = self.db.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,))
+        return bool(rows) and rows[0][0] == "cancelled"
+
+    def _row(self, run: RunResult) -> Tuple:
+        # Packing every step would leave a trail of superseded blobs behind
+        data = RunRecord.pack(run, self.blobs).to_json() if run.status in FINAL_STATUSES else run.json()
+        return (
+            run.run_id,
+            run.status,
+            run.function_name,
+            run.coverage_summary.lines,
+            run.created_at,
+            run.updated_at,
+            data,
+        )
+
+    def list_runs(
+        self,
+        status: Optional[str] = None,
+        function_name: Optional[str] = None,
+        min_coverage: Optional[int] = None,
+        max_coverage: Optional[int] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """Page through run summaries, newest first, using keyset pagination"""
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column, value in (("status", status), ("function_name", function_name)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if created_after:
+            clauses.append("created_at > ?")
+            params.append(created_after)
+        if created_before:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+        count_where = " AND ".join(clauses) or "1"
+        count_params = tuple(params)
+
+        if min_coverage is not None:
+            clauses.append("coverage_lines >= ?")
+            params.append(min_coverage)
+        if max_coverage is not None:
+            clauses.append("coverage_lines <= ?")
+            params.append(max_coverage)
+        if cursor:
+            clauses.append("(created_at, run_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        where = " AND ".join(clauses) or "1"
+        rows = self.db.execute(
+            f"SELECT created_at, run_id, data FROM runs WHERE {where} "
+            "ORDER BY created_at DESC, run_id DESC LIMIT ?",
+            tuple(params) + (limit + 1,),
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [
+            RunRecord.from_json(data).load(self.blobs, RUN_SUMMARY_FIELDS)
+            for _, _, data in rows
+        ]
+
+        status_counts = {
+            row[0]: row[1] for row in self.db.execute("SELECT status, count FROM run_counts")
+        }
+        if min_coverage is not None or max_coverage is not None:
+            total = None
+        elif created_after or created_before:
+            # Counts a range of one of the created_at indexes rather than the table
+            total = self.db.execute(
+                f"SELECT COUNT(*) FROM runs WHERE {count_where}", count_params
+            )[0][0]
+        elif function_name:
+            # Maintained by triggers, so no scan is needed
+            total = self.db.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM function_counts WHERE function_name = ?"
+                + (" AND status = ?" if status else ""),
+                (function_name, status) if status else (function_name,),
+            )[0][0]
+        else:
+            total = status_counts.get(status, 0) if status else sum(status_counts.values())
+
+        return {
+            "items": items,
+            "next_cursor": encode_cursor((rows[-1][0], rows[-1][1])) if has_more else None,
+            "total": total,
+            "status_counts": {k: v for k, v in status_counts.items() if v},
+        }
+
+
+class SQLiteEventBus:
+    """Event log shared through SQLite with file-based wake-ups
+
+    Publishing touches a per-run notification file; waiting consumers stat
+    that file instead of querying the database on every tick. The file's
+    mtime is also when the run last published, so events of runs idle for
+    EVENT_LOG_RETENTION_DAYS are deleted, checked at most hourly as runs
+    are sealed.
+    """
+
+    POLL_INTERVAL = 0.05
+    PRUNE_INTERVAL = 3600.0
+
+    def __init__(self, db: SQLiteDatabase, notify_dir: str):
+        self.db = db
+        self.notify_dir = notify_dir
+        os.makedirs(notify_dir, exist_ok=True)
+        # 0 keeps every run's events
+        self.retention_seconds = float(os.getenv("EVENT_LOG_RETENTION_DAYS", "7")) * 86400
+        self._pruned_at: Optional[float] = None
+
+    def _notify_path(self, run_id: str) -> str:
+        return os.path.join(self.notify_dir, run_id)
+
+    def publish(self, run_id: str, event: Dict[str, Any]) -> None:
+        self.db.transaction([(
+            "INSERT INTO events (run_id, seq, payload) "
+            "SELECT ?, COALESCE(MAX(seq), -1) + 1, ? FROM events WHERE run_id = ?",
+            (run_id, json.dumps(event), run_id),
+        )])
+        with open(self._notify_path(run_id), "a"):
+            os.utime(self._notify_path(run_id))
+
+    def read(self, run_id: str, offset: int = 0) -> List[Dict[str, Any]]:
+        rows = self.db.execute(
+            "SELECT payload FROM events WHERE run_id = ? AND seq >= ? ORDER BY seq",
+            (run_id, offset),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def stream(self, run_id: str, offset: int = 0) -> Iterator[Dict[str, Any]]:
+        return iter(self.read(run_id, offset))
+
+    def seal(self, run_id: str) -> None:
+        """Compact a finished run's events like EventLog.seal and prune expired runs
+
+        Every event keeps its offset, but only the last one carrying a run
+        snapshot keeps its "data".
+        """
+        rows = self.db.execute(
+            "SELECT seq, payload FROM events WHERE run_id = ? ORDER BY seq", (run_id,)
+        )
+        # Only payloads mentioning "data" can hold a snapshot, so the rest are not parsed
+        snapshots = [(seq, json.loads(payload)) for seq, payload in rows if '"data"' in payload]
+        snapshots = [(seq, event) for seq, event in snapshots if "data" in event]
+        updates = []
+        for seq, event in snapshots[:-1]:
+            event.pop("data")
+            updates.append((
+                "UPDATE events SET payload = ? WHERE run_id = ? AND seq = ?",
+                (json.dumps(event), run_id, seq),
+            ))
+        if updates:
+            self.db.transaction(updates)
+        now = time.monotonic()
+        if self.retention_seconds > 0 and (
+            self._pruned_at is None or now - self._pruned_at >= self.PRUNE_INTERVAL
+        ):
+            self._pruned_at = now
+            self.prune(self.retention_seconds)
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete the events of runs with none published for max_age_seconds; returns how many"""
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for run_id in os.listdir(self.notify_dir):
+            path = self._notify_path(run_id)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.db.transaction([("DELETE FROM events WHERE run_id = ?", (run_id,))])
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed += 1
+        return removed
+
+    def _mtime(self, run_id: str) -> int:
+        try:
+            return os.stat(self._notify_path(run_id)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    async def wait(self, run_id: str, timeout: float) -> None:
+        """Return when a new event is published for the run or the timeout expires"""
+        start_mtime = self._mtime(run_id)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            if self._mtime(run_id) != start_mtime:
+                return
+
+
+def create_state_backend():
+    """Build the run store and event bus selected by VERITAS_STATE_BACKEND"""
+    backend = os.getenv("VERITAS_STATE_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryRunStore(), MemoryEventBus()
+    if backend == "sqlite":
+        db = SQLiteDatabase(os.getenv("VERITAS_STATE_DB", state_path("state.db")))
+        notify_dir = os.getenv("VERITAS_NOTIFY_DIR", state_path("notify"))
+        return SQLiteRunStore(db), SQLiteEventBus(db, notify_dir)
+    raise ValueError(f"Unknown VERITAS_STATE_BACKEND: {backend}")
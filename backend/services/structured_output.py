@@ -0,0 +1,133 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# JSON schemas sent as response_format to endpoints that support structured outputs
+
+_EDGE_CASES = {"type": "array", "items": {"type": "string"}}
+
+BEHAVIOR_SCHEMA: Dict[str, Any] = {
+    "name": "behavior",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {"behavior": {"type": "string"}, "edge_cases": _EDGE_CASES},
+        "required": ["behavior", "edge_cases"],
+        "additionalProperties": False,
+    },
+}
+
+MULTI_BEHAVIOR_SCHEMA: Dict[str, Any] = {
+    "name": "behaviors",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "targets": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "behavior": {"type": "string"},
+                        "edge_cases": _EDGE_CASES,
+                    },
+                    "required": ["name", "behavior", "edge_cases"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["targets"],
+        "additionalProperties": False,
+    },
+}
+
+TEST_CODE_SCHEMA: Dict[str, Any] = {
+    "name": "test_module",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {"test_code": {"type": "string"}},
+        "required": ["test_code"],
+        "additionalProperties": False,
+    },
+}
+
+
+def parse_json_object(content: str) -> Optional[Dict[str, Any]]:
+    """Decode a JSON object response, tolerating a surrounding code fence"""
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _edge_case_list(value: Any) -> List[str]:
+    if not isinstance(value, list):
+        return []
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def _parse_behavior_lines(content: str) -> Dict[str, Tuple[str, List[str]]]:
+    """Legacy BEHAVIOR/EDGE_CASES lines, grouped by TARGET when there are several"""
+    parsed: Dict[str, Tuple[str, List[str]]] = {}
+    target = ""
+    behavior = ""
+    edge_cases: List[str] = []
+    for line in content.split("\n"):
+        line = line.strip()
+        if line.startswith("TARGET:"):
+            if behavior or edge_cases:
+                parsed[target] = (behavior, edge_cases)
+            target = line.replace("TARGET:", "").strip()
+            behavior, edge_cases = "", []
+        elif line.startswith("BEHAVIOR:"):
+            behavior = line.replace("BEHAVIOR:", "").strip()
+        elif line.startswith("EDGE_CASES:"):
+            edge_cases_str = line.replace("EDGE_CASES:", "").strip()
+            edge_cases = [ec.strip() for ec in edge_cases_str.split(",")]
+    if behavior or edge_cases:
+        parsed[target] = (behavior, edge_cases)
+    return parsed
+
+
+def parse_behavior(content: str) -> Tuple[str, List[str]]:
+    """Behavior and edge cases for one target; empty values if nothing parses"""
+    data = parse_json_object(content)
+    if data is not None and isinstance(data.get("behavior"), str):
+        return data["behavior"].strip(), _edge_case_list(data.get("edge_cases"))
+    return next(iter(_parse_behavior_lines(content).values()), ("", []))
+
+
+def parse_behaviors(content: str) -> Dict[str, Tuple[str, List[str]]]:
+    """Behavior and edge cases keyed by target name"""
+    data = parse_json_object(content)
+    if data is not None and isinstance(data.get("targets"), list):
+        return {
+            target["name"]: (
+                str(target.get("behavior", "")).strip(),
+                _edge_case_list(target.get("edge_cases")),
+            )
+            for target in data["targets"]
+            if isinstance(target, dict) and isinstance(target.get("name"), str)
+        }
+    return _parse_behavior_lines(content)
+
+
+def parse_test_code(content: str) -> str:
+    """Test module source from a {"test_code": ...} object or a plain/fenced reply"""
+    data = parse_json_object(content)
+    if data is not None and isinstance(data.get("test_code"), str):
+        return data["test_code"].strip()
+
+    code = content.strip()
+    # Clean up markdown code blocks if present
+    if code.startswith("```python"):
+        code = code.replace("```python", "").replace("```", "").strip()
+    elif code.startswith("```"):
+        code = code.replace("```", "").strip()
+    return code
@@ -0,0 +1,230 @@
+import ast
+import asyncio
+import os
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from services.flaky_detector import junit_durations
+from services.hypothesis_profile import profile_env, pytest_plugin_args, uses_hypothesis
+from services.repo_env import runtime
+from services.sandbox import Sandbox
+
+# A line, an arc or a killed mutant one of the tests accounts for
+Requirement = Tuple[Any, ...]
+
+
+def _base_name(test: str) -> str:
+    """Test id without its parametrization, the unit that can be removed from source"""
+    return test.split("[")[0]
+
+
+def requirements(
+    test_coverage: Dict[str, Dict[str, List[Any]]],
+    mutation_report: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Set[Requirement]]:
+    """Lines, arcs and killed mutants each test function accounts for, keyed by test id"""
+    covered: Dict[str, Set[Requirement]] = {}
+    for test, maps in test_coverage.items():
+        entry = covered.setdefault(_base_name(test), set())
+        entry.update(("line", line) for line in maps["lines"])
+        entry.update(("arc", arc[0], arc[1]) for arc in maps["arcs"])
+    for mutant in (mutation_report or {}).get("mutants", []):
+        # Mutant runs stop at the first failure, so only one killer is known
+        if mutant["status"] == "killed" and mutant.get("killed_by"):
+            killer = _base_name(mutant["killed_by"])
+            covered.setdefault(killer, set()).add(("mutant", mutant["id"]))
+    return covered
+
+
+def select_tests(
+    covered: Dict[str, Set[Requirement]], durations: Dict[str, float]
+) -> List[str]:
+    """Cheapest subset of tests accounting for every requirement any test accounts for
+
+    Greedy weighted set cover: repeatedly keep the test with the most uncovered
+    requirements per second, then drop kept tests the others make redundant.
+    """
+    remaining: Set[Requirement] = set().union(*covered.values()) if covered else set()
+    candidates = sorted(test for test, reqs in covered.items() if reqs)
+    kept: List[str] = []
+    while remaining:
+        best = max(
+            candidates,
+            key=lambda test: (len(covered[test] & remaining) / max(durations.get(test, 0), 1e-3), test),
+        )
+        if not covered[best] & remaining:
+            break
+        kept.append(best)
+        remaining -= covered[best]
+        candidates.remove(best)
+
+    # Greedy picks can be subsumed by later ones; drop the slowest redundant first
+    for test in sorted(kept, key=lambda t: (-durations.get(t, 0), t)):
+        others = set().union(*(covered[t] for t in kept if t != test))
+        if covered[test] <= others:
+            kept.remove(test)
+    return sorted(kept)
+
+
+def remove_tests(test_code: str, tests: Set[str]) -> str:
+    """Delete the given test functions (ids like "test_x" or "TestX::test_x") from a module
+
+    Classes left without tests are deleted with their fixtures.
+    """
+    tree = ast.parse(test_code)
+    spans: List[Tuple[int, int]] = []
+    for stmt in tree.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)) and stmt.name in tests:
+            spans.append(_span(stmt))
+        elif isinstance(stmt, ast.ClassDef):
+            methods = [
+                m for m in stmt.body
+                if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef)) and m.name.startswith("test")
+            ]
+            doomed = [m for m in methods if f"{stmt.name}::{m.name}" in tests]
+            if methods and len(doomed) == len(methods):
+                spans.append(_span(stmt))
+            else:
+                spans.extend(_span(m) for m in doomed)
+
+    lines = test_code.splitlines()
+    for start, end in sorted(spans, reverse=True):
+        # Take the comments directly above the definition with it
+        while start > 1 and lines[start - 2].lstrip().startswith("#"):
+            start -= 1
+        del lines[start - 1:end]
+    # Collapse the blank lines left behind
+    compacted: List[str] = []
+    for line in lines:
+        if not line.strip() and len(compacted) >= 2 and not compacted[-1].strip() and not compacted[-2].strip():
+            continue
+        compacted.append(line)
+    return "\n".join(compacted).rstrip() + "\n"
+
+
+def _span(node: ast.AST) -> Tuple[int, int]:
+    start = min([d.lineno for d in getattr(node, "decorator_list", [])] + [node.lineno])
+    return start, node.end_lineno or node.lineno
+
+
+class SuiteMinimizer:
+    """Drops generated tests that cover nothing the rest of the suite does not
+
+    Works from the per-test line and arc maps of the coverage run, the
+    mutants each test killed and the duration of each test, and keeps the
+    rewritten suite only if it still passes.
+    """
+
+    def __init__(self):
+        self.temp_dir = os.path.join(os.getcwd(), "temp_runs")
+        self.sandbox = Sandbox()
+
+    async def minimize(
+        self,
+        test_code: str,
+        original_code: str,
+        function_name: str,
+        run_id: str,
+        test_coverage: Dict[str, Dict[str, List[Any]]],
+        mutation_report: Optional[Dict[str, Any]] = None,
+        usage: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Rewrite the suite in the run directory to a minimal subset and report the savings
+
+        Expects the run directory written by TestRunner for the same suite.
+        The report's generated_tests is the suite to keep, minimized or not.
+        """
+        run_dir = os.path.join(self.temp_dir, run_id)
+        test_filename = f"test_{function_name}.py"
+        test_path = os.path.join(run_dir, test_filename)
+        python, env = runtime(run_dir)
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        if uses_hypothesis(test_code):
+            env.update(profile_env(original_code, function_name, "fix"))
+
+        async def timed_run(code: str) -> Tuple[int, Dict[str, Tuple[bool, float]]]:
+            with open(test_path, "w") as f:
+                f.write(code)
+            report = os.path.join(run_dir, ".minimize.xml")
+            args = [python, "-m", "pytest", test_filename, "-q", f"--junitxml={report}"]
+            args += ["-p", "no:cacheprovider"] + pytest_plugin_args(code)
+            result = await asyncio.to_thread(self.sandbox.run, args, run_dir, env=env)
+            if usage is not None:
+                usage.append(
+                    {"command": "minimize", "exit_code": result["exit_code"], **result["resource_usage"]}
+                )
+            try:
+                return result["exit_code"], {
+                    f"{test_filename}::{key}": outcome for key, outcome in junit_durations(report).items()
+                }
+            except (OSError, ET.ParseError):
+                return result["exit_code"], {}
+            finally:
+                if os.path.exists(report):
+                    os.remove(report)
+
+        exit_code, original = await timed_run(test_code)
+        durations: Dict[str, float] = {}
+        for test, (passed, seconds) in original.items():
+            base = _base_name(test)
+            durations[base] = durations.get(base, 0.0) + seconds
+
+        covered = requirements(test_coverage, mutation_report)
+        # Only tests that ran and passed are candidates; skipped ones are left alone
+        candidates = {_base_name(test) for test, (passed, _) in original.items() if passed}
+        kept = set(select_tests({t: covered.get(t, set()) for t in candidates}, durations))
+        removed = sorted(candidates - kept)
+
+        report: Dict[str, Any] = {
+            "original_tests": len(original),
+            "minimized_tests": len(original),
+            "removed": [],
+            "original_seconds": round(sum(seconds for _, seconds in original.values()), 3),
+            "minimized_seconds": None,
+            "runtime_reduction": 0.0,
+            "original_lines": len(test_code.splitlines()),
+            "minimized_lines": len(test_code.splitlines()),
+            "size_reduction": 0.0,
+            "preserved": _preserved(covered, kept),
+            "applied": False,
+            "generated_tests": test_code,
+        }
+        if exit_code != 0 or not removed:
+            report["minimized_seconds"] = report["original_seconds"]
+            return report
+
+        prefix = f"{test_filename}::"
+        minimized = remove_tests(test_code, {test[len(prefix):] for test in removed})
+        exit_code, reduced = await timed_run(minimized)
+        if exit_code != 0:
+            # Removed tests set up state others relied on; keep the original suite
+            with open(test_path, "w") as f:
+                f.write(test_code)
+            report["minimized_seconds"] = report["original_seconds"]
+            return report
+
+        minimized_seconds = round(sum(seconds for _, seconds in reduced.values()), 3)
+        report.update({
+            "minimized_tests": len(reduced),
+            "removed": removed,
+            "minimized_seconds": minimized_seconds,
+            "runtime_reduction": _reduction(report["original_seconds"], minimized_seconds),
+            "minimized_lines": len(minimized.splitlines()),
+            "size_reduction": _reduction(report["original_lines"], len(minimized.splitlines())),
+            "applied": True,
+            "generated_tests": minimized,
+        })
+        return report
+
+
+def _preserved(covered: Dict[str, Set[Requirement]], kept: Set[str]) -> Dict[str, int]:
+    """Requirement counts of the kept tests, which equal those of the whole suite"""
+    union: FrozenSet[Requirement] = frozenset().union(*(covered.get(t, set()) for t in kept))
+    return {
+        f"{kind}s": sum(1 for req in union if req[0] == kind) for kind in ("line", "arc", "mutant")
+    }
+
+
+def _reduction(before: float, after: float) -> float:
+    """Percentage saved going from before to after"""
+    return round(100 * (before - after) / before, 1) if before else 0.0
@@ -0,0 +1,146 @@
+import asyncio
+import io
+import os
+import pstats
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.flaky_detector import junit_durations
+from services.hypothesis_profile import profile_env, pytest_plugin_args, uses_hypothesis
+from services.repo_env import runtime
+from services.sandbox import Sandbox
+
+PLUGIN_NAME = "veritas_profile"
+
+# pytest plugin written into the run directory; profiles only the test calls,
+# so collection, fixtures and pytest's own bookkeeping stay out of the stats
+PLUGIN = '''import cProfile
+import os
+
+import pytest
+
+_profiler = cProfile.Profile()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    _profiler.enable()
+    yield
+    _profiler.disable()
+
+
+def pytest_sessionfinish(session):
+    _profiler.dump_stats(os.environ["VERITAS_PROFILE_OUTPUT"])
+'''
+
+# Frames of the test runner itself rather than of the code under test
+_RUNNER_FRAMES = ("/_pytest/", "/pluggy/", f"{PLUGIN_NAME}.py", "_lsprof.Profiler")
+
+
+def hot_functions(stats: pstats.Stats, run_dir: str, limit: int) -> List[Dict[str, Any]]:
+    """The functions with the most time spent in their own body, slowest first"""
+    rows = []
+    for (filename, line, name), (_, calls, self_time, cumulative, _) in stats.stats.items():
+        if any(frame in f"{filename}{name}" for frame in _RUNNER_FRAMES):
+            continue
+        rows.append({
+            "function": name,
+            "file": os.path.relpath(filename, run_dir) if filename.startswith(run_dir) else filename,
+            "line": line,
+            "calls": calls,
+            "self_seconds": round(self_time, 6),
+            "cumulative_seconds": round(cumulative, 6),
+        })
+    rows.sort(key=lambda row: (-row["self_seconds"], -row["cumulative_seconds"]))
+    return rows[:limit]
+
+
+def target_stats(stats: pstats.Stats, run_dir: str, function_name: str) -> Optional[Dict[str, Any]]:
+    """Calls and time of the function under test across the suite"""
+    module = os.path.realpath(os.path.join(run_dir, "your_module.py"))
+    name = function_name.rsplit(".", 1)[-1]
+    for (filename, line, func), (_, calls, self_time, cumulative, _) in stats.stats.items():
+        if os.path.realpath(filename) == module and func == name:
+            return {
+                "calls": calls,
+                "self_seconds": round(self_time, 6),
+                "cumulative_seconds": round(cumulative, 6),
+            }
+    return None
+
+
+class SuiteProfiler:
+    """Profiles the generated suite with cProfile and times each test
+
+    Reports the hottest functions, the time spent in the function under
+    test and the per-test durations that pytest's --durations would show,
+    flagging the tests slower than a threshold.
+    """
+
+    def __init__(self):
+        self.temp_dir = os.path.join(os.getcwd(), "temp_runs")
+        self.sandbox = Sandbox()
+        self.top_functions = int(os.getenv("PROFILE_TOP_FUNCTIONS", "20"))
+
+    async def profile(
+        self,
+        test_code: str,
+        original_code: str,
+        function_name: str,
+        run_id: str,
+        slow_seconds: float,
+        usage: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """(report, pstats text listing) for one profiled run of the suite
+
+        Expects the run directory written by TestRunner for the same module.
+        """
+        run_dir = os.path.join(self.temp_dir, run_id)
+        test_filename = f"test_{function_name}.py"
+        with open(os.path.join(run_dir, test_filename), "w") as f:
+            f.write(test_code)
+        with open(os.path.join(run_dir, f"{PLUGIN_NAME}.py"), "w") as f:
+            f.write(PLUGIN)
+        stats_path = os.path.join(run_dir, ".profile.prof")
+        junit_path = os.path.join(run_dir, ".profile.xml")
+
+        python, env = runtime(run_dir)
+        env.update({"PYTHONDONTWRITEBYTECODE": "1", "VERITAS_PROFILE_OUTPUT": stats_path})
+        if uses_hypothesis(test_code):
+            env.update(profile_env(original_code, function_name, "full"))
+        args = [python, "-m", "pytest", test_filename, "-q", "-p", PLUGIN_NAME, f"--junitxml={junit_path}"]
+        args += ["-p", "no:cacheprovider"] + pytest_plugin_args(test_code)
+        try:
+            result = await asyncio.to_thread(self.sandbox.run, args, run_dir, env=env)
+            if usage is not None:
+                usage.append(
+                    {"command": "profile", "exit_code": result["exit_code"], **result["resource_usage"]}
+                )
+            try:
+                durations = junit_durations(junit_path)
+            except (OSError, ET.ParseError):
+                durations = {}
+            stats, stream = None, io.StringIO()
+            if os.path.exists(stats_path):
+                stats = pstats.Stats(stats_path, stream=stream)
+                stats.sort_stats("cumulative").print_stats()
+        finally:
+            for path in (stats_path, junit_path, os.path.join(run_dir, f"{PLUGIN_NAME}.py")):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        tests = [
+            {"test": test, "seconds": round(seconds, 4), "passed": passed}
+            for test, (passed, seconds) in durations.items()
+        ]
+        tests.sort(key=lambda entry: -entry["seconds"])
+        report = {
+            "exit_code": result["exit_code"],
+            "total_seconds": round(sum(entry["seconds"] for entry in tests), 4),
+            "durations": tests,
+            "slow_tests": [entry["test"] for entry in tests if entry["seconds"] >= slow_seconds],
+            "slow_threshold_seconds": slow_seconds,
+            "target": target_stats(stats, run_dir, function_name) if stats is not None else None,
+            "hot_functions": hot_functions(stats, run_dir, self.top_functions) if stats is not None else [],
+        }
+        return report, stream.getvalue()
@@ -1,34 +1,305 @@
+import ast
+import asyncio
 import os
+import time
 import openai
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 from models import RunOptions
+from services.token_budget import PromptBudgetExceeded, TokenBudget
+from services.module_parser import content_hash, find_definition, parse_module
+from services.request_coalescing import MicroBatcher, SingleFlight, request_key
+from services.rate_limiter import RetriesExhausted
+from services.llm_router import LLMEndpoint, LLMRouter
+from services.structured_output import (
+    BEHAVIOR_SCHEMA,
+    MULTI_BEHAVIOR_SCHEMA,
+    TEST_CODE_SCHEMA,
+    parse_behavior,
+    parse_behaviors,
+    parse_test_code,
+)
+
+# Reserved per call until the real completion size is known
+EXPECTED_COMPLETION_TOKENS = 1024
+# Least error output worth sending to the fixer
+MIN_ERROR_OUTPUT_TOKENS = 256
+
+
+def definition_source(code: str, name: str) -> Optional[str]:
+    """The module's imports and the source of one definition, or None if it is not found"""
+    try:
+        tree = parse_module(code).tree
+    except SyntaxError:
+        return None
+    node = find_definition(tree, name.rsplit(".", 1)[-1])
+    if node is None:
+        return None
+    lines = code.splitlines()
+    parts = [
+        "\n".join(lines[stmt.lineno - 1:stmt.end_lineno])
+        for stmt in tree.body if isinstance(stmt, (ast.Import, ast.ImportFrom))
+    ]
+    first = min([d.lineno for d in node.decorator_list] + [node.lineno])
+    parts.append("\n".join(lines[first - 1:node.end_lineno]))
+    return "\n\n".join(parts) + "\n"
+
+
+def rejects_structured_outputs(error: openai.BadRequestError) -> bool:
+    """Whether a 400 is about response_format rather than the rest of the request"""
+    reported = " ".join(
+        str(part) for part in (getattr(error, "code", None), getattr(error, "param", None), error.message) if part
+    ).lower()
+    return "response_format" in reported or "json_schema" in reported
 
 
 class TestGenerator:
     """Service for generating tests using LLM"""
     
     def __init__(self):
-        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.router = LLMRouter()
+        self.model = self.router.primary.model
+        # Overrides the routed clients when assigned, e.g. in tests
         self._client: Optional[openai.OpenAI] = None
+        self.token_budget = TokenBudget(self.model)
+        # Retries on the preferred endpoint before falling over to the other one
+        self.failover_retries = int(os.getenv("LLM_FAILOVER_RETRIES", "1"))
+        # Concurrent identical prompts share one call
+        self._single_flight = SingleFlight()
+        # Behavior inference for several functions of one module shares one prompt
+        self._behavior_batcher = MicroBatcher(
+            self._infer_behavior_batch,
+            window_seconds=float(os.getenv("LLM_BATCH_WINDOW_MS", "20")) / 1000,
+            max_size=int(os.getenv("LLM_BATCH_MAX_TARGETS", "8")),
+        )
     
     @property
     def client(self) -> openai.OpenAI:
-        """Lazy initialization of OpenAI client"""
-        if self._client is None:
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise ValueError(
-                    "OPENAI_API_KEY environment variable is not set. "
-                    "Please set it in your .env file or environment."
-                )
-            self._client = openai.OpenAI(api_key=api_key)
-        return self._client
+        """Client for the primary endpoint; assigning a client sends every step through it"""
+        client = self._client or self.router.primary.client
+        if client is None:
+            raise ValueError(
+                "OPENAI_API_KEY environment variable is not set. "
+                "Please set it in your .env file or environment."
+            )
+        return client
+    
+    @client.setter
+    def client(self, client: Optional[openai.OpenAI]):
+        self._client = client
+    
+    @client.deleter
+    def client(self):
+        self._client = None
+    
+    def _item_type(self, code: str, function_name: str) -> str:
+        """Detect whether the target is a class or a function from the shared parse"""
+        try:
+            item_type = parse_module(code).item_type(function_name)
+        except SyntaxError:
+            item_type = None
+        return item_type or "function"
+    
+    def _complete(
+        self,
+        step: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        usage: Optional[List[Dict[str, Any]]] = None,
+        endpoint: Optional[LLMEndpoint] = None,
+        model: Optional[str] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Send a chat completion and record its token usage
+
+        With a schema, endpoints that support structured outputs are asked for
+        JSON matching it; an endpoint that rejects response_format is switched
+        to plain responses, which callers parse with the legacy format. Other
+        bad requests are raised as they are.
+        """
+        endpoint = endpoint or self.router.primary
+        model = model or endpoint.model
+        client = self._client or endpoint.client
+        if client is None:
+            raise ValueError(
+                f"LLM endpoint '{endpoint.name}' is not configured. "
+                "Set OPENAI_API_KEY (or OPENAI_BASE_URL) in your .env file or environment."
+            )
+        prompt_tokens = sum(self.token_budget.count_tokens(m["content"]) for m in messages)
+        request = {"model": model, "messages": messages, "temperature": temperature}
+        if schema is not None and endpoint.structured_outputs:
+            request["response_format"] = {"type": "json_schema", "json_schema": schema}
+        started = time.monotonic()
+        try:
+            response = client.chat.completions.create(**request)
+        except openai.BadRequestError as e:
+            if "response_format" not in request or not rejects_structured_outputs(e):
+                raise
+            print(f"LLM endpoint {endpoint.name} rejected structured outputs, disabling them: {e}")
+            endpoint.structured_outputs = False
+            del request["response_format"]
+            response = client.chat.completions.create(**request)
+        finally:
+            endpoint.record_latency(time.monotonic() - started)
+        content = response.choices[0].message.content
+        
+        if usage is not None:
+            reported = getattr(response, "usage", None)
+            reported_prompt = getattr(reported, "prompt_tokens", None)
+            reported_completion = getattr(reported, "completion_tokens", None)
+            estimated = not isinstance(reported_prompt, int) or not isinstance(reported_completion, int)
+            if estimated:
+                reported_prompt = prompt_tokens
+                reported_completion = self.token_budget.count_tokens(content or "")
+            usage.append({
+                "step": step,
+                "model": model,
+                "endpoint": endpoint.name,
+                "prompt_tokens": reported_prompt,
+                "completion_tokens": reported_completion,
+                "total_tokens": reported_prompt + reported_completion,
+                "estimated": estimated,
+            })
+        return content
     
-    async def infer_behavior(self, code: str, function_name: str) -> Tuple[str, List[str]]:
-        """Infer function or class behavior and edge cases using LLM"""
+    async def _complete_shared(
+        self,
+        step: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        usage: Optional[List[Dict[str, Any]]] = None,
+        schema: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Complete a prompt off the event loop, sharing the call with identical requests
+
+        The router picks the endpoint and model for the step. Calls wait for
+        the endpoint's rate limit and retry transient API errors, falling over
+        to the secondary endpoint if one is configured; RetriesExhausted
+        propagates so a run fails instead of using a fallback.
+
+        Callers that joined another caller's request record its usage with
+        coalesced=True, so summing the other entries gives the billed tokens.
+        """
+        async def call():
+            call_usage: List[Dict[str, Any]] = []
+            prompt_tokens = sum(self.token_budget.count_tokens(m["content"]) for m in messages)
+            candidates = self.router.candidates(step)
+            for position, (endpoint, model) in enumerate(candidates):
+                last = position == len(candidates) - 1
+                try:
+                    content = await endpoint.rate_limiter.run(
+                        lambda: self._complete(
+                            step, messages, temperature, call_usage, endpoint, model, schema
+                        ),
+                        tokens=prompt_tokens + EXPECTED_COMPLETION_TOKENS,
+                        used_tokens=lambda _: sum(entry["total_tokens"] for entry in call_usage),
+                        max_retries=None if last else self.failover_retries,
+                    )
+                except RetriesExhausted as e:
+                    if last:
+                        raise
+                    print(f"LLM endpoint {endpoint.name} unavailable for {step}, failing over: {e}")
+                    continue
+                return content, call_usage
+        
+        preferred_endpoint, preferred_model = self.router.route(step)
+        key = request_key(preferred_endpoint.name, preferred_model, temperature, messages)
+        (content, call_usage), shared = await self._single_flight.run(key, call)
+        if usage is not None:
+            usage.extend(dict(entry, coalesced=shared) for entry in call_usage)
+        return content
+    
+    async def infer_behavior(
+        self, code: str, function_name: str, usage: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[str, List[str]]:
+        """Infer function or class behavior and edge cases using LLM
+
+        Requests for functions of the same module that arrive together are
+        answered by a single multi-target prompt.
+        """
+        behavior, edge_cases, call_usage = await self._behavior_batcher.submit(
+            content_hash(code), (code, function_name)
+        )
+        if usage is not None:
+            usage.extend(call_usage)
+        return behavior, edge_cases
+    
+    async def _infer_behavior_batch(
+        self, group: str, items: List[Tuple[str, str]]
+    ) -> List[Tuple[str, List[str], List[Dict[str, Any]]]]:
+        """Infer behavior for every function in a batch, one result per item"""
+        code = items[0][0]
+        names = list(dict.fromkeys(name for _, name in items))
+        usage: List[Dict[str, Any]] = []
+        if len(names) == 1:
+            results = {names[0]: await self._infer_single(code, names[0], usage)}
+        else:
+            results = await self._infer_multiple(code, names, usage)
+        
+        # The first request for the batch is charged; the others share its calls
+        outputs = []
+        for position, (_, name) in enumerate(items):
+            behavior, edge_cases = results[name]
+            entries = [
+                dict(entry, coalesced=entry["coalesced"] or position > 0, batch_size=len(names))
+                for entry in usage
+            ]
+            outputs.append((behavior, edge_cases, entries))
+        return outputs
+    
+    async def _infer_multiple(
+        self, code: str, names: List[str], usage: List[Dict[str, Any]]
+    ) -> Dict[str, Tuple[str, List[str]]]:
+        targets = ", ".join(f"{name} ({self._item_type(code, name)})" for name in names)
+        prompt = f"""Analyze these Python functions and classes from the same module and infer their behavior:
+
+```python
+{code}
+```
+
+Targets: {targets}
+
+For each target, provide:
+1. A clear description of what it does
+2. A list of potential edge cases to test
+
+Respond with a JSON object in this format:
+{{"targets": [{{"name": "<target name>", "behavior": "<description>", "edge_cases": ["<edge case>", ...]}}]}}
+"""
+        
+        results: Dict[str, Tuple[str, List[str]]] = {}
+        try:
+            content = await self._complete_shared(
+                "infer_behavior",
+                [
+                    {"role": "system", "content": "You are an expert Python code analyzer."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                usage=usage,
+                schema=MULTI_BEHAVIOR_SCHEMA,
+            )
+            for name, (behavior, edge_cases) in parse_behaviors(content).items():
+                if name in names:
+                    results[name] = (
+                        behavior or "Function behavior inferred", edge_cases or ["basic cases"]
+                    )
+        except RetriesExhausted:
+            raise
+        except Exception as e:
+            print(f"Error in batched infer_behavior: {e}")
+        
+        # Targets the batched answer left out are asked about one at a time
+        for name in names:
+            if name not in results:
+                results[name] = await self._infer_single(code, name, usage)
+        return results
+    
+    async def _infer_single(
+        self, code: str, function_name: str, usage: List[Dict[str, Any]]
+    ) -> Tuple[str, List[str]]:
+        """Infer the behavior of one function or class with its own prompt"""
         # Detect if it's a class or function
-        is_class = f"class {function_name}" in code or f"class {function_name}(" in code
-        item_type = "class" if is_class else "function"
+        item_type = self._item_type(code, function_name)
         
         prompt = f"""Analyze this Python {item_type} and infer its behavior:
 
@@ -42,36 +313,29 @@ Provide:
 1. A clear description of what this {item_type} does
 2. A list of potential edge cases to test
 
-Respond in this format:
-BEHAVIOR: [description]
-EDGE_CASES: [comma-separated list]
+Respond with a JSON object in this format:
+{{"behavior": "<description>", "edge_cases": ["<edge case>", ...]}}
 """
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            content = await self._complete_shared(
+                "infer_behavior",
+                [
                     {"role": "system", "content": "You are an expert Python code analyzer."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.3,
+                usage=usage,
+                schema=BEHAVIOR_SCHEMA,
             )
             
-            content = response.choices[0].message.content
-            
             # Parse response
-            behavior = ""
-            edge_cases = []
-            
-            for line in content.split("\n"):
-                if line.startswith("BEHAVIOR:"):
-                    behavior = line.replace("BEHAVIOR:", "").strip()
-                elif line.startswith("EDGE_CASES:"):
-                    edge_cases_str = line.replace("EDGE_CASES:", "").strip()
-                    edge_cases = [ec.strip() for ec in edge_cases_str.split(",")]
+            behavior, edge_cases = parse_behavior(content)
             
             return behavior or "Function behavior inferred", edge_cases or ["basic cases"]
             
+        except RetriesExhausted:
+            raise
         except Exception as e:
             print(f"Error in infer_behavior: {e}")
             return "Could not infer behavior", ["basic cases"]
@@ -83,12 +347,13 @@ EDGE_CASES: [comma-separated list]
         options: RunOptions,
         inferred_spec: str,
         edge_cases: List[str],
+        usage: Optional[List[Dict[str, Any]]] = None,
     ) -> str:
         """Generate pytest tests using LLM"""
         
         # Detect if it's a class or function
-        is_class = f"class {function_name}" in code or f"class {function_name}(" in code
-        item_type = "class" if is_class else "function"
+        item_type = self._item_type(code, function_name)
+        is_class = item_type == "class"
         
         # Build edge case requirements
         edge_case_reqs = []
@@ -135,7 +400,8 @@ Requirements:
 - Include docstrings for each test function
 - Ensure all tests are valid Python code
 
-Return ONLY the test code, no explanations or markdown formatting.
+Respond with a JSON object in this format, with no explanations:
+{{"test_code": "<the complete test module>"}}
 """
         else:
             prompt = f"""Generate comprehensive pytest tests for this Python function:
@@ -160,13 +426,14 @@ Requirements:
 - Include docstrings for each test function
 - Ensure all tests are valid Python code
 
-Return ONLY the test code, no explanations or markdown formatting.
+Respond with a JSON object in this format, with no explanations:
+{{"test_code": "<the complete test module>"}}
 """
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            generated_tests = parse_test_code(await self._complete_shared(
+                "generate_tests",
+                [
                     {
                         "role": "system",
                         "content": "You are an expert Python test developer. Generate high-quality pytest tests.",
@@ -174,27 +441,49 @@ Return ONLY the test code, no explanations or markdown formatting.
                     {"role": "user", "content": prompt},
                 ],
                 temperature=0.5,
-            )
-            
-            generated_tests = response.choices[0].message.content.strip()
-            
-            # Clean up markdown code blocks if present
-            if generated_tests.startswith("```python"):
-                generated_tests = generated_tests.replace("```python", "").replace("```", "").strip()
-            elif generated_tests.startswith("```"):
-                generated_tests = generated_tests.replace("```", "").strip()
+                usage=usage,
+                schema=TEST_CODE_SCHEMA,
+            ))
             
             return generated_tests
             
+        except RetriesExhausted:
+            raise
         except Exception as e:
             print(f"Error in generate_tests: {e}")
             # Fallback to basic template
             return self._generate_fallback_tests(function_name, options.test_style)
     
     async def fix_tests(
-        self, test_code: str, error_output: str, original_code: str, function_name: str
+        self,
+        test_code: str,
+        error_output: str,
+        original_code: str,
+        function_name: str,
+        usage: Optional[List[Dict[str, Any]]] = None,
     ) -> str:
         """Fix broken tests using LLM"""
+        system_prompt = "You are an expert at debugging and fixing Python tests."
+        budget = self.token_budget.max_prompt_tokens
+
+        def fixed_cost(code: str) -> int:
+            return self.token_budget.count_tokens(system_prompt + code + test_code) + 100
+
+        if budget - fixed_cost(original_code) < MIN_ERROR_OUTPUT_TOKENS:
+            # No room left for the errors: send only the code under test, not the whole module
+            original_code = definition_source(original_code, function_name) or original_code
+        available = budget - fixed_cost(original_code)
+        if available < MIN_ERROR_OUTPUT_TOKENS:
+            raise PromptBudgetExceeded(
+                f"Fixing the tests for {function_name} needs at least "
+                f"{budget - available + MIN_ERROR_OUTPUT_TOKENS} prompt tokens for the code, "
+                f"tests and errors, over the budget of {budget} (PROMPT_TOKEN_BUDGET)"
+            )
+        # Give the error output whatever the rest of the prompt leaves of the budget
+        error_output = self.token_budget.trim_error_output(
+            error_output, f"test_{function_name}.py", available
+        )
+        
         prompt = f"""The following pytest tests are failing. Fix them:
 
 Original function code:
@@ -212,32 +501,26 @@ Error output:
 {error_output}
 ```
 
-Generate the corrected test code that will pass. Return ONLY the fixed test code, no explanations.
+Generate the corrected test code that will pass. Respond with a JSON object in this format, with no explanations:
+{{"test_code": "<the complete fixed test module>"}}
 """
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert at debugging and fixing Python tests.",
-                    },
+            fixed_tests = parse_test_code(await self._complete_shared(
+                "fix_tests",
+                [
+                    {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt},
                 ],
                 temperature=0.3,
-            )
-            
-            fixed_tests = response.choices[0].message.content.strip()
-            
-            # Clean up markdown code blocks if present
-            if fixed_tests.startswith("```python"):
-                fixed_tests = fixed_tests.replace("```python", "").replace("```", "").strip()
-            elif fixed_tests.startswith("```"):
-                fixed_tests = fixed_tests.replace("```", "").strip()
+                usage=usage,
+                schema=TEST_CODE_SCHEMA,
+            ))
             
             return fixed_tests
             
+        except RetriesExhausted:
+            raise
         except Exception as e:
             print(f"Error in fix_tests: {e}")
             return test_code  # Return original if fix fails
@@ -1,7 +1,16 @@
+import asyncio
 import os
-import subprocess
-import tempfile
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+from services.hypothesis_profile import (
+    profile_env,
+    pytest_plugin_args,
+    uses_hypothesis,
+    write_conftest,
+)
+from services.repo_env import RUNTIME_FILE, conftest_prelude, runtime
+from services.sandbox import Sandbox
+from services.test_validator import TestValidator
 
 
 class TestRunner:
@@ -10,11 +19,15 @@ class TestRunner:
     def __init__(self):
         self.temp_dir = os.path.join(os.getcwd(), "temp_runs")
         os.makedirs(self.temp_dir, exist_ok=True)
+        self.sandbox = Sandbox()
+        self.validator = TestValidator()
+        # Static checks before pytest; disable if they ever reject a valid suite
+        self.prevalidate = os.getenv("TEST_PREVALIDATION", "true").lower() != "false"
     
-    async def run_tests(
+    def prepare_run_dir(
         self, test_code: str, original_code: str, function_name: str, run_id: str
-    ) -> Dict[str, Any]:
-        """Run pytest tests and return output"""
+    ) -> str:
+        """Write the module and test file for a run, returning the test path"""
         
         # Create temporary directory for this run
         run_dir = os.path.join(self.temp_dir, run_id)
@@ -35,27 +48,62 @@ class TestRunner:
         with open(init_path, "w") as f:
             f.write("")
         
+        # Hypothesis suites get a conftest selecting the phase's settings, and
+        # modules from a local checkout one importing them into their package
+        write_conftest(run_dir, test_code, conftest_prelude(run_dir))
+        
+        return test_path
+    
+    async def run_tests(
+        self,
+        test_code: str,
+        original_code: str,
+        function_name: str,
+        run_id: str,
+        usage: Optional[List[Dict[str, Any]]] = None,
+        phase: str = "full",
+    ) -> Dict[str, Any]:
+        """Run pytest tests in the sandbox and return output and resource usage
+
+        phase picks the Hypothesis profile: "fix" runs fewer examples for quick
+        iterations, "full" the complete search. Both share an example database
+        per function fingerprint, so known failures are replayed first.
+        """
+        
+        test_path = self.prepare_run_dir(test_code, original_code, function_name, run_id)
+        run_dir = os.path.dirname(test_path)
+        
+        # Report defects the fixer can act on without starting pytest
+        if self.prevalidate:
+            # A local checkout's environment may bring plugins with fixtures of their own
+            local_repo = os.path.exists(os.path.join(run_dir, RUNTIME_FILE))
+            diagnostics = self.validator.validate(test_code, original_code, check_fixtures=not local_repo)
+            if diagnostics:
+                return {
+                    "stdout": "",
+                    "stderr": "Static validation failed before running pytest:\n"
+                    + "\n".join(f"{os.path.basename(test_path)}: {d}" for d in diagnostics),
+                    "exit_code": 1,
+                    "validation_errors": diagnostics,
+                }
+        
         # Run pytest
         try:
-            result = subprocess.run(
-                ["pytest", test_path, "-v", "--tb=short"],
-                capture_output=True,
-                text=True,
-                cwd=run_dir,
-                timeout=30,
+            python, env = runtime(run_dir)
+            if uses_hypothesis(test_code):
+                env.update(profile_env(original_code, function_name, phase))
+            result = await asyncio.to_thread(
+                self.sandbox.run,
+                [python, "-m", "pytest", test_path, "-v", "--tb=short"]
+                + pytest_plugin_args(test_code),
+                run_dir,
+                env=env,
             )
-            
-            return {
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "exit_code": result.returncode,
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                "stdout": "",
-                "stderr": "Test execution timed out",
-                "exit_code": 1,
-            }
+            if usage is not None:
+                usage.append(
+                    {"command": "pytest", "exit_code": result["exit_code"], **result["resource_usage"]}
+                )
+            return result
         except Exception as e:
             return {
                 "stdout": "",
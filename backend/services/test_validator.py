@@ -0,0 +1,251 @@
+import ast
+from typing import List, Optional, Set
+
+from services.module_parser import parse_module
+
+MODULE_NAME = "your_module"
+
+# Attributes every module has without defining them
+MODULE_DUNDERS = {
+    "__builtins__", "__cached__", "__dict__", "__doc__", "__file__", "__loader__",
+    "__name__", "__package__", "__spec__",
+}
+
+# Module-level blocks whose bodies still bind module globals
+_BLOCKS = tuple(
+    getattr(ast, name) for name in ("If", "Try", "TryStar", "With", "AsyncWith", "For", "AsyncFor", "While")
+    if hasattr(ast, name)
+)
+
+# Fixtures pytest and the plugins installed with it (pytest-asyncio, pytest-cov)
+# provide without a conftest
+BUILTIN_FIXTURES = {
+    "cache",
+    "capfd",
+    "capfdbinary",
+    "caplog",
+    "capsys",
+    "capsysbinary",
+    "cov",
+    "doctest_namespace",
+    "event_loop",
+    "monkeypatch",
+    "no_cover",
+    "pytestconfig",
+    "record_property",
+    "record_testsuite_property",
+    "record_xml_attribute",
+    "recwarn",
+    "request",
+    "tmp_path",
+    "tmp_path_factory",
+    "tmpdir",
+    "tmpdir_factory",
+}
+
+
+def module_bindings(statements: List[ast.stmt]) -> Set[str]:
+    """Every global a module can bind, including inside if/try/with/for blocks"""
+    names: Set[str] = set()
+    for stmt in statements:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(stmt.name)
+        elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            names.update(alias.asname or alias.name.split(".")[0] for alias in stmt.names)
+        elif isinstance(stmt, _BLOCKS):
+            targets = [getattr(stmt, "target", None)]
+            targets += [item.optional_vars for item in getattr(stmt, "items", [])]
+            for target in filter(None, targets):
+                names.update(n.id for n in ast.walk(target) if isinstance(n, ast.Name))
+            for field in ("body", "orelse", "finalbody"):
+                names |= module_bindings(getattr(stmt, field, []))
+            for handler in getattr(stmt, "handlers", []):
+                if handler.name:
+                    names.add(handler.name)
+                names |= module_bindings(handler.body)
+        else:
+            # Assignments, including walrus targets inside other statements
+            names.update(
+                node.id for node in ast.walk(stmt)
+                if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)
+            )
+    return names
+
+
+def _decorator_name(decorator: ast.expr) -> str:
+    """Dotted name of a decorator, without its call arguments"""
+    if isinstance(decorator, ast.Call):
+        decorator = decorator.func
+    try:
+        return ast.unparse(decorator)
+    except Exception:
+        return ""
+
+
+def _is_fixture(node: ast.AST) -> bool:
+    return isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and any(
+        _decorator_name(d).split(".")[-1] == "fixture" for d in node.decorator_list
+    )
+
+
+def _fixture_names(node: ast.AST) -> Set[str]:
+    """Name(s) a fixture is requested by, honouring @pytest.fixture(name=...)"""
+    names = {node.name}
+    for decorator in node.decorator_list:
+        if isinstance(decorator, ast.Call):
+            for keyword in decorator.keywords:
+                if keyword.arg == "name" and isinstance(keyword.value, ast.Constant):
+                    names = {str(keyword.value.value)}
+    return names
+
+
+def _parametrized_names(node: ast.AST) -> Optional[Set[str]]:
+    """Argument names supplied by decorators, or None if a decorator may inject unknown ones"""
+    names: Set[str] = set()
+    for decorator in node.decorator_list:
+        name = _decorator_name(decorator)
+        if name.endswith("mark.parametrize"):
+            if not (isinstance(decorator, ast.Call) and decorator.args):
+                return None
+            argnames = decorator.args[0]
+            if isinstance(argnames, ast.Constant) and isinstance(argnames.value, str):
+                names.update(n.strip() for n in argnames.value.split(","))
+            elif isinstance(argnames, (ast.List, ast.Tuple)):
+                names.update(
+                    e.value for e in argnames.elts
+                    if isinstance(e, ast.Constant) and isinstance(e.value, str)
+                )
+            else:
+                return None
+        elif ".mark." not in name and not name.startswith("mark."):
+            # e.g. @given or @patch fill arguments we cannot see statically
+            return None
+    return names
+
+
+class TestValidator:
+    """Static checks on a generated test module, run before paying for pytest
+
+    Catches the mistakes LLMs make most often: leftover markdown, syntax
+    errors, imports of names the module under test does not define, tests
+    pytest would not collect and fixtures that do not exist.
+    """
+
+    def validate(self, test_code: str, original_code: str, check_fixtures: bool = True) -> List[str]:
+        """Return diagnostics for the test module; an empty list means it looks runnable
+
+        Pass check_fixtures=False when the suite runs with fixtures this module
+        cannot see, e.g. from a checkout's own plugins.
+        """
+        diagnostics: List[str] = []
+        lines = test_code.splitlines()
+        for lineno, line in enumerate(lines, start=1):
+            if line.strip().startswith("```"):
+                diagnostics.append(
+                    f"line {lineno}: leftover markdown code fence; return only Python source"
+                )
+
+        try:
+            tree = ast.parse(test_code)
+        except SyntaxError as e:
+            location = f"line {e.lineno}" if e.lineno else "module"
+            if e.lineno and e.lineno <= len(lines):
+                diagnostics.append(f"{location}: SyntaxError: {e.msg}: {lines[e.lineno - 1].strip()}")
+            else:
+                diagnostics.append(f"{location}: SyntaxError: {e.msg}")
+            return diagnostics
+
+        diagnostics.extend(self._check_imports(tree, original_code))
+        diagnostics.extend(self._check_tests(tree, check_fixtures))
+        return diagnostics
+
+    def _check_imports(self, tree: ast.Module, original_code: str) -> List[str]:
+        try:
+            module_tree = parse_module(original_code).tree
+        except SyntaxError:
+            # pytest will report the module's own error
+            return []
+        symbols = module_bindings(module_tree.body)
+        if "__getattr__" in symbols or any(
+            isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names)
+            for node in ast.walk(module_tree)
+        ):
+            # Star imports and module __getattr__ hide the symbol table
+            return []
+        defined = ", ".join(sorted(symbols)) or "nothing"
+        symbols |= MODULE_DUNDERS
+
+        diagnostics = []
+        module_aliases = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.module == MODULE_NAME and not node.level:
+                for alias in node.names:
+                    if alias.name != "*" and alias.name not in symbols:
+                        diagnostics.append(
+                            f"line {node.lineno}: cannot import name '{alias.name}' from "
+                            f"'{MODULE_NAME}'; it defines: {defined}"
+                        )
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name == MODULE_NAME:
+                        module_aliases.add(alias.asname or alias.name)
+
+        for node in ast.walk(tree):
+            if (
+                isinstance(node, ast.Attribute)
+                and isinstance(node.value, ast.Name)
+                and node.value.id in module_aliases
+                and isinstance(node.ctx, ast.Load)
+                and node.attr not in symbols
+            ):
+                diagnostics.append(
+                    f"line {node.lineno}: module '{MODULE_NAME}' has no attribute '{node.attr}'"
+                )
+        return diagnostics
+
+    def _check_tests(self, tree: ast.Module, check_fixtures: bool) -> List[str]:
+        diagnostics = []
+        fixtures = set(BUILTIN_FIXTURES)
+        tests = []
+        for stmt in tree.body:
+            if _is_fixture(stmt):
+                fixtures |= _fixture_names(stmt)
+            elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)) and stmt.name.startswith("test"):
+                tests.append((stmt, False))
+            elif isinstance(stmt, ast.ClassDef) and stmt.name.startswith("Test"):
+                methods = [m for m in stmt.body if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef))]
+                if any(m.name == "__init__" for m in methods):
+                    diagnostics.append(
+                        f"line {stmt.lineno}: class '{stmt.name}' defines __init__, "
+                        "so pytest will not collect its tests"
+                    )
+                    continue
+                for method in methods:
+                    if _is_fixture(method):
+                        fixtures |= _fixture_names(method)
+                    elif method.name.startswith("test"):
+                        tests.append((method, True))
+
+        if not tests:
+            diagnostics.append(
+                "no tests found; test functions must be named test_* "
+                "(or be methods of a Test* class without __init__)"
+            )
+
+        for node, is_method in tests:
+            supplied = _parametrized_names(node)
+            if supplied is None or not check_fixtures:
+                continue
+            args = node.args.posonlyargs + node.args.args
+            # Arguments with defaults are not requested as fixtures
+            if node.args.defaults:
+                args = args[: len(args) - len(node.args.defaults)]
+            if is_method and args:
+                args = args[1:]
+            for arg in args:
+                if arg.arg not in fixtures and arg.arg not in supplied:
+                    diagnostics.append(
+                        f"line {node.lineno}: fixture '{arg.arg}' requested by "
+                        f"'{node.name}' is not defined"
+                    )
+        return diagnostics
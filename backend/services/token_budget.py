@@ -0,0 +1,188 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+# Section headers pytest prints for each failure, e.g. "____ test_add ____"
+_SECTION_HEADER = re.compile(r"^_{3,} (.+?) _{3,}$")
+# Banner lines such as "=== FAILURES ===" or "=== short test summary info ==="
+_BANNER = re.compile(r"^={3,} (.+?) ={3,}$")
+# Traceback frame locations in --tb=short/long output, e.g. "test_add.py:5: in test_add"
+_FRAME = re.compile(r"^(\S+\.py):(\d+)(?::|\s)")
+# Final "=== 2 failed, 1 passed in 0.1s ===" line
+_RESULT_COUNTS = re.compile(r"\d+ (failed|passed|error)")
+# Volatile details that make otherwise identical failures look different
+_VOLATILE = re.compile(r"0x[0-9a-fA-F]+|\d+(\.\d+)?")
+
+MAX_LINE_CHARS = 400
+MAX_CAPTURED_LINES = 20
+
+
+class PromptBudgetExceeded(Exception):
+    """Raised when the parts of a prompt that cannot be trimmed exceed the budget"""
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(model: str):
+    """Load the tokenizer once per model, or None if it is unavailable"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use; fall back when offline
+        print(f"Tokenizer unavailable, estimating tokens: {e}")
+        return None
+
+
+class TokenBudget:
+    """Counts prompt tokens and trims pytest output to fit a budget"""
+
+    def __init__(self, model: Optional[str] = None, max_prompt_tokens: Optional[int] = None):
+        self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.max_prompt_tokens = max_prompt_tokens or int(
+            os.getenv("PROMPT_TOKEN_BUDGET", "12000")
+        )
+        self._encoding = _load_encoding(self.model)
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the model tokenizer, or estimate ~4 chars per token"""
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Keep the head and tail of text within max_tokens"""
+        if self.count_tokens(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        # Work in characters using the observed chars-per-token ratio
+        ratio = len(text) / max(self.count_tokens(text), 1)
+        keep = int(max_tokens * ratio) - 40
+        if keep <= 0:
+            return ""
+        head = text[: keep // 2]
+        tail = text[-(keep - keep // 2):]
+        omitted = len(text) - len(head) - len(tail)
+        return f"{head}\n... [{omitted} characters truncated] ...\n{tail}"
+
+    def trim_error_output(self, error_output: str, test_filename: str, max_tokens: int) -> str:
+        """Reduce pytest output to relevant frames and unique failures within max_tokens"""
+        if self.count_tokens(error_output) <= max_tokens:
+            return error_output
+
+        sections, summary = _split_failures(error_output)
+        relevant = ("your_module", test_filename)
+        unique: Dict[str, Tuple[str, List[str]]] = {}
+        for title, body in sections:
+            trimmed = _trim_section(body, relevant)
+            signature = _VOLATILE.sub("#", "\n".join(
+                line for line in trimmed if line.startswith("E ")
+            ))
+            if signature in unique:
+                unique[signature][1].append(title)
+            else:
+                unique[signature] = ("\n".join([f"___ {title} ___"] + trimmed), [])
+
+        blocks = []
+        for text, duplicates in unique.values():
+            if duplicates:
+                text += f"\n(same failure also in: {', '.join(duplicates)})"
+            blocks.append(text)
+
+        summary_text = "\n".join(_clip_line(line) for line in summary)
+        remaining = max_tokens - self.count_tokens(summary_text)
+        kept = []
+        for block in blocks:
+            cost = self.count_tokens(block)
+            if cost > remaining:
+                break
+            kept.append(block)
+            remaining -= cost
+        if len(kept) < len(blocks):
+            omitted = len(blocks) - len(kept)
+            if not kept and blocks:
+                # Always show at least part of the first failure
+                kept.append(self.truncate(blocks[0], max(remaining, 0)))
+                omitted -= 1
+            if omitted:
+                kept.append(f"... {omitted} more distinct failure(s) omitted ...")
+
+        return self.truncate("\n\n".join(kept + [summary_text]).strip(), max_tokens)
+
+
+def _clip_line(line: str) -> str:
+    if len(line) <= MAX_LINE_CHARS:
+        return line
+    return line[:MAX_LINE_CHARS] + f"... [{len(line) - MAX_LINE_CHARS} chars]"
+
+
+def _split_failures(output: str) -> Tuple[List[Tuple[str, List[str]]], List[str]]:
+    """Split pytest output into (title, lines) failure sections and the summary"""
+    sections: List[Tuple[str, List[str]]] = []
+    summary: List[str] = []
+    current: Optional[Tuple[str, List[str]]] = None
+    in_summary = False
+
+    for line in output.splitlines():
+        banner = _BANNER.match(line)
+        if banner:
+            in_summary = "short test summary" in banner.group(1)
+            current = None
+            if in_summary or _RESULT_COUNTS.search(banner.group(1)):
+                summary.append(line)
+            continue
+        header = _SECTION_HEADER.match(line)
+        if header and not in_summary:
+            current = (header.group(1), [])
+            sections.append(current)
+            continue
+        if in_summary:
+            summary.append(line)
+        elif current is not None:
+            current[1].append(line)
+
+    if not sections and not summary:
+        # Not pytest-formatted (e.g. a collection crash); treat as one failure
+        sections.append(("output", output.splitlines()))
+    return sections, summary
+
+
+def _trim_section(lines: List[str], relevant: Tuple[str, ...]) -> List[str]:
+    """Drop frames outside the module and test file, and clip captured output"""
+    kept: List[str] = []
+    keep_frame = True
+    captured = 0
+    in_captured = False
+
+    for line in lines:
+        if line.startswith("---") and "Captured" in line:
+            in_captured = True
+            captured = 0
+            kept.append(line)
+            continue
+        if in_captured:
+            captured += 1
+            if captured <= MAX_CAPTURED_LINES:
+                kept.append(_clip_line(line))
+            elif captured == MAX_CAPTURED_LINES + 1:
+                kept.append("... [captured output truncated] ...")
+            continue
+
+        frame = _FRAME.match(line)
+        if frame:
+            keep_frame = any(name in frame.group(1) for name in relevant)
+        if line.startswith("E ") or keep_frame:
+            kept.append(_clip_line(line))
+    return kept
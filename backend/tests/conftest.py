@@ -8,8 +8,21 @@ from unittest.mock import Mock, patch, AsyncMock
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from fastapi.testclient import TestClient
+import main
 from main import app
 from models import RunOptions, EdgeCaseCategory, StartRunPayload
+from services.event_log import EventLog
+from services.state_backend import MemoryEventBus
+
+
+@pytest.fixture(autouse=True)
+def event_log_dir(tmp_path, monkeypatch):
+    """Write the event logs of each test under its tmp_path, not the state directory"""
+    events = str(tmp_path / "events")
+    monkeypatch.setenv("VERITAS_EVENT_LOG_DIR", events)
+    if isinstance(main.event_bus, MemoryEventBus):
+        monkeypatch.setattr(main.event_bus, "log", EventLog(events))
+    return events
 
 
 @pytest.fixture
@@ -8,7 +8,7 @@ from unittest.mock import patch, AsyncMock
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from conftest import client, sample_payload
+from conftest import client, sample_payload, sample_code
 
 
 class TestStartRun:
@@ -78,6 +78,99 @@ class TestGetRun:
         assert "not found" in response.json()["detail"].lower()
 
 
+class TestListRuns:
+    """Tests for GET /api/runs endpoint"""
+    
+    def test_list_runs_pagination(self, client, sample_payload):
+        """Runs are listed newest first across cursor pages"""
+        payload = sample_payload.dict()
+        payload["function_name"] = "paged_fn"
+        run_ids = [client.post("/api/runs", json=payload).json()["runId"] for _ in range(3)]
+        
+        first = client.get("/api/runs", params={"function_name": "paged_fn", "limit": 2}).json()
+        assert [item["run_id"] for item in first["items"]] == run_ids[:0:-1]
+        assert first["total"] == 3
+        assert "code" not in first["items"][0]
+        
+        second = client.get(
+            "/api/runs",
+            params={"function_name": "paged_fn", "limit": 2, "cursor": first["next_cursor"]},
+        ).json()
+        assert [item["run_id"] for item in second["items"]] == run_ids[:1]
+        assert second["next_cursor"] is None
+    
+    def test_list_runs_invalid_cursor(self, client):
+        """Malformed cursors are rejected"""
+        response = client.get("/api/runs", params={"cursor": "!!!"})
+        assert response.status_code == 400
+
+
+class TestRunProjections:
+    """Tests for sparse fieldsets and artifact endpoints"""
+    
+    @pytest.fixture
+    def run_id(self, client, sample_payload):
+        create_response = client.post("/api/runs", json=sample_payload.dict())
+        return create_response.json()["runId"]
+    
+    def test_get_run_fields(self, client, run_id):
+        """Only the requested fields are returned"""
+        response = client.get(f"/api/runs/{run_id}", params={"fields": "status,steps"})
+        assert response.status_code == 200
+        assert set(response.json()) == {"run_id", "status", "steps"}
+    
+    def test_get_run_summary_view(self, client, run_id):
+        """The summary view omits large text fields"""
+        response = client.get(f"/api/runs/{run_id}", params={"view": "summary"})
+        assert response.status_code == 200
+        data = response.json()
+        assert "code" not in data
+        assert "patch_diff" not in data
+        assert data["function_name"] == "add"
+    
+    def test_get_run_unknown_field(self, client, run_id):
+        """Unknown fields are rejected"""
+        response = client.get(f"/api/runs/{run_id}", params={"fields": "nope"})
+        assert response.status_code == 400
+    
+    def test_artifact_etag_and_range(self, client, run_id, sample_payload):
+        """Artifacts support conditional requests and byte ranges"""
+        response = client.get(f"/api/runs/{run_id}/artifacts/code")
+        assert response.status_code == 200
+        assert response.text == sample_payload.code
+        etag = response.headers["etag"]
+        
+        cached = client.get(
+            f"/api/runs/{run_id}/artifacts/code", headers={"If-None-Match": etag}
+        )
+        assert cached.status_code == 304
+        
+        partial = client.get(
+            f"/api/runs/{run_id}/artifacts/code", headers={"Range": "bytes=0-2"}
+        )
+        assert partial.status_code == 206
+        assert partial.text == sample_payload.code[:3]
+        assert partial.headers["content-range"] == f"bytes 0-2/{len(sample_payload.code)}"
+    
+    def test_artifact_gzip(self, client, run_id):
+        """Large artifacts are compressed when the client accepts it"""
+        from main import runs
+        runs[run_id].generated_tests = "def test_x():\n    assert True\n" * 200
+        
+        response = client.get(
+            f"/api/runs/{run_id}/artifacts/generated_tests",
+            headers={"Accept-Encoding": "gzip"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text == runs[run_id].generated_tests
+    
+    def test_artifact_unknown(self, client, run_id):
+        """Unknown artifacts return 404"""
+        response = client.get(f"/api/runs/{run_id}/artifacts/secrets")
+        assert response.status_code == 404
+
+
 class TestCancelRun:
     """Tests for POST /api/runs/{run_id}/cancel endpoint"""
     
@@ -115,12 +208,647 @@ class TestStreamRunEvents:
         assert response.status_code == 200
         assert response.headers["content-type"] == "text/event-stream"
     
+    def test_replay_finished_run(self, client, sample_payload):
+        """A finished run's events are replayed from its compacted log"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=sample_payload.dict()).json()["runId"]
+        main.runs[run_id].checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+            "generate_tests": {
+                "generated_tests": "from your_module import add\n\ndef test_add():\n    assert add(2, 3) == 5\n"
+            },
+        }
+        with patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, sample_payload))
+        assert run_id not in main.event_bus.log._tails
+        
+        response = client.get(f"/api/runs/{run_id}/stream")
+        events = [
+            json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")
+        ]
+        assert events[0]["type"] == "step_start"
+        assert sum(1 for event in events if event["type"] == "step_complete") >= 4
+        assert sum(1 for event in events if "data" in event and event["type"] == "step_complete") == 1
+        assert events[-1]["type"] == "run_complete"
+        assert events[-1]["data"]["status"] == "success"
+        assert "generated_tests" not in events[-1]["data"]
+    
     def test_stream_run_events_not_found(self, client):
         """Test streaming events for non-existent run"""
         response = client.get("/api/runs/nonexistent_run_id/stream")
         assert response.status_code == 404
 
 
+class TestIncrementalRun:
+    """Tests for POST /api/runs/incremental endpoint"""
+    
+    def test_incremental_run_regenerates_changed_and_new(self, client, sample_payload):
+        """Changed and new functions get fresh runs"""
+        create_response = client.post("/api/runs", json=sample_payload.dict())
+        run_id = create_response.json()["runId"]
+        new_code = "def add(a, b):\n    return b + a\n\ndef sub(a, b):\n    return a - b\n"
+        
+        response = client.post(
+            "/api/runs/incremental",
+            json={"code": new_code, "previous_run_ids": [run_id]},
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["diff"]["changed"] == ["add"]
+        assert data["diff"]["added"] == ["sub"]
+        actions = {r["function_name"]: r["action"] for r in data["runs"]}
+        assert actions == {"add": "regenerated", "sub": "added"}
+        assert all(r["run_id"] for r in data["runs"])
+    
+    def test_incremental_run_reverifies_unchanged(self, client, sample_payload):
+        """Unchanged functions rerun their previous passing suite instead of regenerating"""
+        from main import runs
+        create_response = client.post("/api/runs", json=sample_payload.dict())
+        run_id = create_response.json()["runId"]
+        runs[run_id].status = "success"
+        runs[run_id].generated_tests = (
+            "from your_module import add\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+        )
+        
+        response = client.post(
+            "/api/runs/incremental",
+            json={
+                "code": "# reformatted\ndef add(a, b):\n    return a + b\n",
+                "previous_run_ids": [run_id],
+            },
+        )
+        assert response.status_code == 200
+        [result] = response.json()["runs"]
+        assert result["action"] == "reverified"
+        assert result["run_id"] is None
+        # The scratch directory of the rerun is removed
+        from main import test_runner
+        import os
+        assert not any(
+            entry.startswith(f"{run_id}_verify_") for entry in os.listdir(test_runner.temp_dir)
+        )
+    
+    def test_incremental_run_not_found(self, client):
+        """Test incremental run with an unknown previous run"""
+        response = client.post(
+            "/api/runs/incremental",
+            json={"code": "def f():\n    pass\n", "previous_run_ids": ["missing"]},
+        )
+        assert response.status_code == 404
+
+
+class TestCheckpointResume:
+    """Tests for queued execution and resuming runs from checkpoints"""
+    
+    def test_queued_run_resumes_from_checkpoints(self, client, sample_payload):
+        """A worker resuming a run skips every step that already has a checkpoint"""
+        import asyncio
+        import main
+        with patch("main.job_queue") as job_queue:
+            run_id = client.post("/api/runs", json=sample_payload.dict()).json()["runId"]
+        job_queue.enqueue.assert_called_once_with(run_id, sample_payload.dict())
+        
+        # Simulate a worker that crashed after generating the suite
+        suite = "from your_module import add\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+        run = main.runs[run_id]
+        run.checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": ["zero"]},
+            "generate_tests": {"generated_tests": suite},
+        }
+        for step in run.steps:
+            if step["name"] in run.checkpoints:
+                step["status"] = "success"
+        
+        from services.result_cache import ResultCache
+        with patch.object(main.test_generator, "infer_behavior", new=AsyncMock()) as infer, \
+                patch.object(main.test_generator, "generate_tests", new=AsyncMock()) as generate, \
+                patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, sample_payload))
+        
+        infer.assert_not_awaited()
+        generate.assert_not_awaited()
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.test_run_output["exit_code"] == 0
+        assert {step["name"]: step["status"] for step in run.steps}["run_tests"] == "success"
+        assert set(run.checkpoints) >= {"run_tests", "fix_tests", "coverage_report", "pr_ready_output"}
+    
+    def test_lost_lease_stops_pipeline(self, sample_payload):
+        """A worker whose lease was taken over stops the pipeline and leaves the job alone"""
+        import asyncio
+        from unittest.mock import Mock
+        import worker
+        stopped = []
+        
+        async def slow_pipeline(run_id, payload):
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                stopped.append(run_id)
+                raise
+        
+        job_queue = Mock(lease_seconds=0.03, max_attempts=3)
+        job_queue.heartbeat.return_value = False
+        with patch("worker.job_queue", job_queue), patch("worker.execute_pipeline", slow_pipeline):
+            asyncio.run(asyncio.wait_for(
+                worker.process_job("worker_a", "run_1", sample_payload.dict(), 1), timeout=5
+            ))
+        
+        assert stopped == ["run_1"]
+        job_queue.complete.assert_not_called()
+
+
+class TestFlakyVerification:
+    """Tests for the randomized rerun stage after the fix loop"""
+    
+    def test_flaky_tests_are_quarantined(self, client, sample_payload):
+        """Flaky tests found by the reruns are skipped in the final suite"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        payload = sample_payload.copy(deep=True)
+        payload.options.flaky_reruns = 4
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=payload.dict()).json()["runId"]
+        
+        suite = (
+            "from your_module import add\n\n"
+            "def test_add():\n    assert add(1, 2) == 3\n\n"
+            "def test_timing():\n    assert True\n"
+        )
+        run = main.runs[run_id]
+        run.checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+            "generate_tests": {"generated_tests": suite},
+            "run_tests": {"test_output": {"stdout": "", "stderr": "", "exit_code": 0}},
+        }
+        report = {
+            "reruns": 4,
+            "seeds": [1, 2, 3, 4],
+            "tests": {
+                "test_add": {"passed": 4, "failed": 0, "failure": "", "status": "stable"},
+                "test_timing": {"passed": 2, "failed": 2, "failure": "E assert", "status": "flaky"},
+            },
+            "flaky": ["test_timing"],
+            "failing": [],
+            "action": None,
+            "wall_seconds": 1.0,
+        }
+        
+        with patch.object(main.flaky_detector, "detect", new=AsyncMock(return_value=report)) as detect, \
+                patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, payload))
+        
+        detect.assert_awaited_once()
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.flaky_report["action"] == "quarantined"
+        assert "@pytest.mark.skip" in run.generated_tests
+        assert "1 passed, 1 skipped" in run.test_run_output["stdout"]
+        assert run.checkpoints["fix_tests"]["generated_tests"] == run.generated_tests
+    
+    def _order_dependent_run(self, client, sample_payload, flaky_action):
+        """Create a run whose suite passed the fix loop, with one order-dependent test"""
+        import main
+        payload = sample_payload.copy(deep=True)
+        payload.options.flaky_reruns = 3
+        payload.options.flaky_action = flaky_action
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=payload.dict()).json()["runId"]
+        
+        suite = (
+            "from your_module import add\n\n"
+            "def test_add():\n    assert add(1, 2) == 3\n\n"
+            "def test_after_add():\n    assert True\n"
+        )
+        main.runs[run_id].checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+            "generate_tests": {"generated_tests": suite},
+            "run_tests": {"test_output": {"stdout": "", "stderr": "", "exit_code": 0}},
+        }
+        report = {
+            "reruns": 3,
+            "seeds": [1, 2, 3],
+            "tests": {
+                "test_add": {"passed": 3, "failed": 0, "failure": "", "status": "stable"},
+                "test_after_add": {"passed": 0, "failed": 3, "failure": "E order", "status": "failing"},
+            },
+            "flaky": [],
+            "failing": ["test_after_add"],
+            "action": None,
+            "wall_seconds": 1.0,
+        }
+        return run_id, payload, suite, report
+    
+    def test_order_dependent_tests_are_quarantined(self, client, sample_payload):
+        """Tests that fail in every shuffled rerun are quarantined like flaky ones"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        run_id, payload, _, report = self._order_dependent_run(client, sample_payload, "quarantine")
+        
+        with patch.object(main.flaky_detector, "detect", new=AsyncMock(return_value=report)), \
+                patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, payload))
+        
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.flaky_report["action"] == "quarantined"
+        assert "@pytest.mark.skip" in run.generated_tests
+        assert "1 passed, 1 skipped" in run.test_run_output["stdout"]
+    
+    def test_fixed_suite_is_rechecked(self, client, sample_payload):
+        """A fix that passes once but is still unstable in random order gets quarantined"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        run_id, payload, suite, report = self._order_dependent_run(client, sample_payload, "fix")
+        recheck = dict(report)
+        
+        with patch.object(main.flaky_detector, "detect", new=AsyncMock(side_effect=[report, recheck])) as detect, \
+                patch.object(main.test_generator, "fix_tests", new=AsyncMock(return_value=suite)) as fix_tests, \
+                patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, payload))
+        
+        assert "ORDER-DEPENDENT" in fix_tests.await_args.args[1]
+        assert detect.await_count == 2
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.flaky_report["action"] == "quarantined"
+        assert "@pytest.mark.skip" in run.generated_tests
+    
+    def test_fix_accepted_when_recheck_is_stable(self, client, sample_payload):
+        """A fixed suite is accepted once its reruns find no unstable tests"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        run_id, payload, suite, report = self._order_dependent_run(client, sample_payload, "fix")
+        stable = {**report, "failing": [], "tests": {
+            key: {**entry, "passed": 3, "failed": 0, "status": "stable"}
+            for key, entry in report["tests"].items()
+        }}
+        
+        with patch.object(main.flaky_detector, "detect", new=AsyncMock(side_effect=[report, stable])), \
+                patch.object(main.test_generator, "fix_tests", new=AsyncMock(return_value=suite)), \
+                patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, payload))
+        
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.flaky_report["action"] == "fixed"
+        assert run.flaky_report["failing"] == ["test_after_add"]
+        assert "@pytest.mark.skip" not in run.generated_tests
+
+
+class TestMutationTesting:
+    """Tests for the optional mutation-testing step"""
+    
+    def test_mutation_step(self, client, sample_payload):
+        """Runs with mutation testing get the step and a mutation score"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        payload = sample_payload.copy(deep=True)
+        payload.options.mutation_testing = True
+        payload.options.mutation_threshold = 101
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=payload.dict()).json()["runId"]
+        run = main.runs[run_id]
+        names = [step["name"] for step in run.steps]
+        assert names.index("mutation_testing") == names.index("coverage_report") + 1
+        
+        suite = "from your_module import add\n\ndef test_add():\n    assert add(2, 3) == 5\n"
+        run.checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+            "generate_tests": {"generated_tests": suite},
+        }
+        with patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, payload))
+        
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.mutation_score == 100.0
+        assert run.mutation_report["killed"] == run.mutation_report["total"] > 0
+        # Below the threshold the step fails, but the run still completes
+        assert {step["name"]: step["status"] for step in run.steps}["mutation_testing"] == "fail"
+        assert run.test_coverage["test_add.py::test_add"]["lines"] == [2]
+    
+    def test_mutation_step_on_cache_hit(self, client, sample_payload):
+        """A cached suite brings its per-test coverage, so mutants still run its tests"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        payload = sample_payload.copy(deep=True)
+        payload.options.mutation_testing = True
+        suite = "from your_module import add\n\ndef test_add():\n    assert add(2, 3) == 5\n"
+        run_ids = []
+        with patch("main.result_cache", ResultCache()):
+            for _ in range(2):
+                with patch("main.schedule_pipeline"):
+                    run_id = client.post("/api/runs", json=payload.dict()).json()["runId"]
+                if not run_ids:
+                    # Only a run without checkpoints looks up the cache
+                    main.runs[run_id].checkpoints = {
+                        "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+                        "generate_tests": {"generated_tests": suite},
+                    }
+                asyncio.run(main.execute_pipeline(run_id, payload))
+                run_ids.append(run_id)
+        
+        first, cached = main.runs[run_ids[0]], main.runs[run_ids[1]]
+        assert cached.cache_hit and not first.cache_hit
+        assert cached.test_coverage == first.test_coverage
+        assert cached.mutation_score == first.mutation_score == 100.0
+
+
+class TestSuiteMinimization:
+    """Tests for the optional minimize_suite step"""
+    
+    def test_minimize_step(self, client, sample_payload):
+        """Duplicate tests are dropped from the final suite and the patch"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        payload = sample_payload.copy(deep=True)
+        payload.options.minimize_suite = True
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=payload.dict()).json()["runId"]
+        run = main.runs[run_id]
+        names = [step["name"] for step in run.steps]
+        assert names.index("minimize_suite") == names.index("pr_ready_output") - 1
+        
+        suite = (
+            "from your_module import add\n\n\n"
+            "def test_add():\n    assert add(2, 3) == 5\n\n\n"
+            "def test_add_again():\n    assert add(1, 1) == 2\n"
+        )
+        run.checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+            "generate_tests": {"generated_tests": suite},
+        }
+        with patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, payload))
+        
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.minimization["applied"]
+        assert run.minimization["original_tests"] == 2
+        assert run.minimization["minimized_tests"] == 1
+        assert run.generated_tests.count("def test_") == 1
+        assert run.patch_diff.count("+def test_") == 1
+        assert len(run.test_coverage) == 1
+
+
+class TestProfiling:
+    """Tests for the optional profile_tests step"""
+    
+    def test_profile_step(self, client, sample_payload):
+        """The profile is attached to the run and its listing served as an artifact"""
+        import asyncio
+        import main
+        from services.result_cache import ResultCache
+        payload = sample_payload.copy(deep=True)
+        payload.options.profile_tests = True
+        payload.options.slow_test_seconds = 0.05
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=payload.dict()).json()["runId"]
+        run = main.runs[run_id]
+        names = [step["name"] for step in run.steps]
+        assert names.index("profile_tests") == names.index("pr_ready_output") - 1
+        
+        run.checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+            "generate_tests": {"generated_tests": (
+                "import time\nfrom your_module import add\n\n\n"
+                "def test_add():\n    assert add(2, 3) == 5\n\n\n"
+                "def test_slow_add():\n    time.sleep(0.1)\n    assert add(1, 1) == 2\n"
+            )},
+        }
+        with patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, payload))
+        
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.profile["slow_tests"] == ["test_slow_add"]
+        assert run.profile["target"]["calls"] == 2
+        
+        response = client.get(f"/api/runs/{run_id}/artifacts/profile")
+        assert response.status_code == 200
+        assert "function calls" in response.text
+        summary = client.get(f"/api/runs/{run_id}", params={"view": "summary"}).json()
+        assert "profile_stats" not in summary and summary["profile"]
+
+
+class TestPatchOutput:
+    """Tests for the pr_ready_output patch against the target repository"""
+    
+    def test_patch_against_repo(self, client, sample_payload, tmp_path):
+        """A suite for an existing test file is diffed against the branch's version"""
+        import asyncio
+        import subprocess
+        import main
+        from services.result_cache import ResultCache
+        repo = tmp_path / "repo"
+        (repo / "tests").mkdir(parents=True)
+        (repo / "tests" / "test_add.py").write_text(
+            "from your_module import add\n\n\ndef test_old():\n    assert add(0, 0) == 0\n"
+        )
+        for args in (["init", "-q", "-b", "main"], ["add", "."], ["commit", "-q", "-m", "init"]):
+            subprocess.run(
+                ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+                cwd=repo, check=True, capture_output=True,
+            )
+        payload = sample_payload.copy(deep=True)
+        payload.options.repo_url = str(repo)
+        payload.options.test_path = "tests/test_add.py"
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=payload.dict()).json()["runId"]
+        main.runs[run_id].checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+            "generate_tests": {
+                "generated_tests": "from your_module import add\n\ndef test_add():\n    assert add(2, 3) == 5\n"
+            },
+        }
+        with patch("main.result_cache", ResultCache()), \
+                patch.object(main.diff_engine, "mirror_dir", str(tmp_path / "mirrors")), \
+                patch.object(main.diff_engine.local_repos, "allowed_roots", [str(tmp_path.resolve())]):
+            asyncio.run(main.execute_pipeline(run_id, payload))
+        
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.patch_diff.startswith("diff --git a/tests/test_add.py b/tests/test_add.py\nindex ")
+        added = [line for line in run.patch_diff.splitlines() if line.startswith("+")]
+        assert "+def test_add():" in added
+        assert not any(line.startswith("-") and not line.startswith("---") for line in run.patch_diff.splitlines())
+        saved = run.checkpoints["pr_ready_output"]
+        assert saved["test_path"] == "tests/test_add.py"
+        assert "def test_old" in saved["test_content"]
+
+
+class TestTestCoverage:
+    """Tests for GET /api/runs/{run_id}/test-coverage endpoint"""
+    
+    @pytest.fixture
+    def run_id(self, client, sample_payload):
+        import main
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=sample_payload.dict()).json()["runId"]
+        main.runs[run_id].test_coverage = {
+            "test_m.py::test_low": {"lines": [2, 3], "arcs": [[-1, 2], [2, 3], [3, -1]]},
+            "test_m.py::test_mid": {"lines": [2, 4, 6], "arcs": [[-1, 2], [2, 4], [4, 6], [6, -1]]},
+        }
+        return run_id
+    
+    def test_per_test_maps(self, client, run_id):
+        """Every test's lines and arcs are returned with the line-to-tests index"""
+        data = client.get(f"/api/runs/{run_id}/test-coverage").json()
+        
+        assert data["tests"]["test_m.py::test_low"]["arcs"] == [[-1, 2], [2, 3], [3, -1]]
+        assert data["lines"]["2"] == ["test_m.py::test_low", "test_m.py::test_mid"]
+        assert data["lines"]["3"] == ["test_m.py::test_low"]
+    
+    def test_filter_by_line_and_test(self, client, run_id):
+        """line keeps the tests covering it; test selects a single test"""
+        by_line = client.get(f"/api/runs/{run_id}/test-coverage?line=4").json()
+        assert list(by_line["tests"]) == ["test_m.py::test_mid"]
+        
+        by_test = client.get(
+            f"/api/runs/{run_id}/test-coverage", params={"test": "test_m.py::test_low"}
+        ).json()
+        assert list(by_test["lines"]) == ["2", "3"]
+        
+        response = client.get(f"/api/runs/{run_id}/test-coverage", params={"test": "nope"})
+        assert response.status_code == 404
+    
+    def test_not_recorded(self, client, sample_payload):
+        """Runs without a coverage step have no per-test coverage"""
+        with patch("main.schedule_pipeline"):
+            run_id = client.post("/api/runs", json=sample_payload.dict()).json()["runId"]
+        
+        response = client.get(f"/api/runs/{run_id}/test-coverage")
+        assert response.status_code == 404
+        assert client.get("/api/runs/missing/test-coverage").status_code == 404
+
+
+class TestRetryRun:
+    """Tests for POST /api/runs/{run_id}/retry endpoint"""
+    
+    SUITE = "from your_module import add\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+    
+    def _failed_run(self, client, sample_payload):
+        import main
+        with patch("main.job_queue"):
+            run_id = client.post("/api/runs", json=sample_payload.dict()).json()["runId"]
+        run = main.runs[run_id]
+        run.checkpoints = {
+            "infer_behavior": {"inferred_spec": "Adds two numbers", "edge_cases": []},
+            "generate_tests": {"generated_tests": self.SUITE},
+            "run_tests": {"test_output": {"stdout": "", "stderr": "", "exit_code": 0}},
+            "fix_tests": {
+                "generated_tests": self.SUITE,
+                "test_output": {"stdout": "", "stderr": "", "exit_code": 0},
+                "iterations": 1,
+            },
+        }
+        for step in run.steps:
+            if step["name"] in run.checkpoints or step["name"] == "read_code":
+                step["status"] = "success"
+            elif step["name"] == "coverage_report":
+                step["status"] = "fail"
+                step["error"] = "coverage crashed"
+        run.status = "failed"
+        return run_id
+    
+    def test_retry_from_failed_step(self, client, sample_payload):
+        """Retrying re-runs the failed step onward without calling the LLM again"""
+        import asyncio
+        import main
+        run_id = self._failed_run(client, sample_payload)
+        
+        with patch("main.job_queue") as job_queue:
+            response = client.post(f"/api/runs/{run_id}/retry")
+        assert response.status_code == 200
+        assert response.json() == {"runId": run_id, "from_step": "coverage_report"}
+        job_queue.enqueue.assert_called_once()
+        steps = {step["name"]: step for step in main.runs[run_id].steps}
+        assert steps["coverage_report"]["status"] == "queued"
+        assert "error" not in steps["coverage_report"]
+        assert steps["fix_tests"]["status"] == "success"
+        
+        from services.result_cache import ResultCache
+        with patch.object(main.test_generator, "infer_behavior", new=AsyncMock()) as infer, \
+                patch.object(main.test_generator, "fix_tests", new=AsyncMock()) as fix, \
+                patch("main.result_cache", ResultCache()):
+            asyncio.run(main.execute_pipeline(run_id, sample_payload))
+        infer.assert_not_awaited()
+        fix.assert_not_awaited()
+        run = main.runs[run_id]
+        assert run.status == "success"
+        assert run.coverage_summary.lines == 100
+        assert run.patch_diff.startswith("diff --git")
+    
+    def test_retry_from_explicit_step(self, client, sample_payload):
+        """from_step drops the checkpoints of that step and every later one"""
+        import main
+        run_id = self._failed_run(client, sample_payload)
+        with patch("main.job_queue"):
+            response = client.post(f"/api/runs/{run_id}/retry", params={"from_step": "run_tests"})
+        assert response.status_code == 200
+        assert set(main.runs[run_id].checkpoints) == {"infer_behavior", "generate_tests"}
+    
+    def test_retry_rejected(self, client, sample_payload):
+        """Runs in progress and steps the run does not have cannot be retried"""
+        import main
+        run_id = self._failed_run(client, sample_payload)
+        response = client.post(f"/api/runs/{run_id}/retry", params={"from_step": "open_pr"})
+        assert response.status_code == 400
+        
+        main.runs[run_id].status = "running"
+        response = client.post(f"/api/runs/{run_id}/retry")
+        assert response.status_code == 400
+        
+        response = client.post("/api/runs/missing/retry")
+        assert response.status_code == 404
+
+
+class TestParse:
+    """Tests for POST /api/parse endpoint"""
+    
+    def test_parse_success(self, client, sample_code):
+        """Test listing symbols in a module"""
+        response = client.post("/api/parse", json={"code": sample_code})
+        assert response.status_code == 200
+        [symbol] = response.json()["symbols"]
+        assert symbol["name"] == "add"
+        assert symbol["signature"] == "def add(a, b)"
+        assert symbol["complexity"] == 1
+    
+    def test_parse_syntax_error(self, client):
+        """Test parsing invalid code"""
+        response = client.post("/api/parse", json={"code": "def broken(:"})
+        assert response.status_code == 400
+        assert "line 1" in response.json()["detail"]
+
+
+class TestResultCacheApi:
+    """Tests for /api/cache endpoints"""
+    
+    def test_cache_stats(self, client):
+        """Test reading cache statistics"""
+        response = client.get("/api/cache")
+        assert response.status_code == 200
+        assert "entries" in response.json()
+    
+    def test_cache_invalidate(self, client):
+        """Test invalidating the cache"""
+        response = client.delete("/api/cache", params={"function_name": "add"})
+        assert response.status_code == 200
+        assert response.json()["removed"] == 0
+
+
 class TestRunOptions:
     """Tests for run options validation"""
     
@@ -133,6 +861,22 @@ class TestRunOptions:
         response = client.post("/api/runs", json=payload)
         assert response.status_code == 200
     
+    def test_local_repo_requires_allowed_root(self, client, sample_payload, tmp_path):
+        """Runs against a local checkout are rejected unless LOCAL_REPO_ROOTS allows it"""
+        import main
+        
+        payload = sample_payload.dict()
+        payload["options"]["local_repo"] = str(tmp_path)
+        
+        with patch.object(main.repo_environments, "allowed_roots", []):
+            response = client.post("/api/runs", json=payload)
+        assert response.status_code == 400
+        assert "LOCAL_REPO_ROOTS" in response.json()["detail"]
+        
+        with patch.object(main.repo_environments, "allowed_roots", [str(tmp_path / "other")]):
+            response = client.post("/api/runs", json=payload)
+        assert response.status_code == 400
+    
     def test_run_options_edge_cases(self, client, sample_payload):
         """Test edge case category options"""
         payload = sample_payload.dict()
@@ -1,6 +1,9 @@
 import pytest
+import asyncio
 import os
+import subprocess
 import sys
+import time
 from pathlib import Path
 from unittest.mock import Mock, patch, AsyncMock
 
@@ -9,9 +12,34 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from services.test_generator import TestGenerator
 from services.test_runner import TestRunner
-from services.coverage_reporter import CoverageReporter
+from services.test_validator import TestValidator
+from services.sandbox import Sandbox
+from services.flaky_detector import FlakyDetector, quarantine
+from services.mutation_tester import MutationTester, generate_mutants
+from services.suite_minimizer import SuiteMinimizer, remove_tests, requirements, select_tests
+from services.suite_profiler import SuiteProfiler
+from services.coverage_reporter import CoverageReporter, lines_to_tests
+from services.diff_engine import DiffEngine, merge_test_module, unified_diff
+from services.repo_env import RepoEnvironments, module_package, write_runtime
 from services.pr_creator import PRCreator
-from models import RunOptions, EdgeCaseCategory
+from services.result_cache import ResultCache, CacheEntry
+from services.code_analysis import function_fingerprint, diff_functions
+from services.token_budget import TokenBudget
+from services.run_index import RunIndex, encode_cursor
+from services.module_parser import ModuleParser
+from services.state_backend import MemoryRunStore, SQLiteDatabase, SQLiteRunStore, SQLiteEventBus
+from services.event_log import EventLog
+from services.job_queue import JobQueue
+from services.rate_limiter import RateLimiter, RetriesExhausted, parse_reset_duration
+from services.llm_router import LLMRouter
+from services.structured_output import (
+    BEHAVIOR_SCHEMA,
+    TEST_CODE_SCHEMA,
+    parse_behavior,
+    parse_behaviors,
+    parse_test_code,
+)
+from models import RunOptions, EdgeCaseCategory, CoverageSummary
 
 
 class TestTestGenerator:
@@ -224,6 +252,71 @@ def test_basic():
             # Should return original tests on error
             assert fixed_tests == broken_tests
     
+    @pytest.mark.asyncio
+    async def test_fix_tests_trims_output_and_records_usage(self, test_generator, sample_code):
+        """Huge error output is trimmed to the budget and token usage is recorded"""
+        test_generator.token_budget = TokenBudget(max_prompt_tokens=2000)
+        failure = (
+            "____ test_case_{i} ____\n"
+            "test_calculate_discount.py:4: in test_case_{i}\n"
+            "    assert calculate_discount(100, 10) == 100\n"
+            "E   assert 90.0 == 100\n"
+            "----- Captured stdout call -----\n" + "noise\n" * 5000
+        )
+        error_output = "\n".join(failure.format(i=i) for i in range(50))
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message = Mock()
+        mock_response.choices[0].message.content = "def test_basic(): pass"
+        mock_client.chat.completions.create.return_value = mock_response
+        test_generator._client = mock_client
+        usage = []
+        
+        await test_generator.fix_tests(
+            "def test_basic(): assert False", error_output, sample_code,
+            "calculate_discount", usage=usage,
+        )
+        
+        prompt = mock_client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        assert test_generator.token_budget.count_tokens(prompt) <= 2000
+        assert "same failure also in" in prompt
+        assert usage[0]["step"] == "fix_tests"
+        assert usage[0]["total_tokens"] > 0
+    
+    @pytest.mark.asyncio
+    async def test_fix_tests_narrows_code_to_budget(self, test_generator):
+        """A module too large for the budget is cut down to the function under test"""
+        test_generator.token_budget = TokenBudget(max_prompt_tokens=1500)
+        helpers = "".join(f"def helper_{i}(x):\n    return x + {i}\n\n\n" for i in range(200))
+        code = "import math\n\n\n" + helpers + "def area(r):\n    return math.pi * r * r\n"
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message = Mock()
+        mock_response.choices[0].message.content = "def test_area(): pass"
+        mock_client.chat.completions.create.return_value = mock_response
+        test_generator._client = mock_client
+        
+        await test_generator.fix_tests("def test_area(): assert False", "E   assert False", code, "area")
+        
+        prompt = mock_client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        assert "import math" in prompt and "def area(r):" in prompt
+        assert "helper_" not in prompt
+        assert test_generator.token_budget.count_tokens(prompt) <= 1500
+    
+    @pytest.mark.asyncio
+    async def test_fix_tests_over_budget_fails(self, test_generator, sample_code):
+        """Tests too large to fit the budget fail explicitly instead of exceeding it"""
+        from services.token_budget import PromptBudgetExceeded
+        test_generator.token_budget = TokenBudget(max_prompt_tokens=500)
+        test_generator._client = Mock()
+        huge_tests = "def test_x():\n    assert True\n" * 500
+        
+        with pytest.raises(PromptBudgetExceeded, match="PROMPT_TOKEN_BUDGET"):
+            await test_generator.fix_tests(huge_tests, "E   assert False", sample_code, "calculate_discount")
+        test_generator._client.chat.completions.create.assert_not_called()
+    
     def test_client_initialization_no_key(self):
         """Test that client initialization fails without API key"""
         with patch.dict(os.environ, {}, clear=True):
@@ -232,6 +325,351 @@ def test_basic():
                 _ = generator.client
 
 
+class TestRequestCoalescing:
+    """Tests for single-flight and micro-batched LLM requests"""
+    
+    @staticmethod
+    def _client(content):
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message = Mock()
+        mock_response.choices[0].message.content = content
+        mock_response.usage = Mock(prompt_tokens=100, completion_tokens=20)
+        mock_client.chat.completions.create.return_value = mock_response
+        return mock_client
+    
+    @pytest.mark.asyncio
+    async def test_identical_requests_share_one_call(self, sample_code, sample_run_options):
+        """Concurrent identical prompts are sent once and billed once"""
+        generator = TestGenerator()
+        generator._client = self._client("def test_ok():\n    assert True")
+        usages = [[], []]
+        
+        results = await asyncio.gather(*(
+            generator.generate_tests(
+                sample_code, "add", sample_run_options, "Adds", ["zero"], usage=usage
+            )
+            for usage in usages
+        ))
+        
+        assert results[0] == results[1]
+        assert generator._client.chat.completions.create.call_count == 1
+        assert sorted(usage[0]["coalesced"] for usage in usages) == [False, True]
+    
+    @pytest.mark.asyncio
+    async def test_behavior_requests_are_batched_per_module(self):
+        """Functions of one module inferred together use a single multi-target prompt"""
+        code = "def add(a, b):\n    return a + b\n\ndef sub(a, b):\n    return a - b\n"
+        generator = TestGenerator()
+        generator._client = self._client(
+            "TARGET: add\nBEHAVIOR: Adds\nEDGE_CASES: zero, negative\n\n"
+            "TARGET: sub\nBEHAVIOR: Subtracts\nEDGE_CASES: equal values"
+        )
+        usages = [[], [], []]
+        
+        results = await asyncio.gather(
+            generator.infer_behavior(code, "add", usage=usages[0]),
+            generator.infer_behavior(code, "sub", usage=usages[1]),
+            generator.infer_behavior(code, "add", usage=usages[2]),
+        )
+        
+        assert results == [
+            ("Adds", ["zero", "negative"]),
+            ("Subtracts", ["equal values"]),
+            ("Adds", ["zero", "negative"]),
+        ]
+        [call] = generator._client.chat.completions.create.call_args_list
+        assert "Targets: add (function), sub (function)" in call.kwargs["messages"][1]["content"]
+        assert [usage[0]["coalesced"] for usage in usages] == [False, True, True]
+        assert usages[0][0]["batch_size"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_batched_answer_missing_target(self):
+        """Targets left out of a batched answer are inferred individually"""
+        code = "def add(a, b):\n    return a + b\n\ndef sub(a, b):\n    return a - b\n"
+        generator = TestGenerator()
+        generator._client = self._client("TARGET: add\nBEHAVIOR: Adds\nEDGE_CASES: zero")
+        
+        results = await asyncio.gather(
+            generator.infer_behavior(code, "add"),
+            generator.infer_behavior(code, "sub"),
+        )
+        
+        assert results[0] == ("Adds", ["zero"])
+        assert generator._client.chat.completions.create.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_batch_releases_waiters(self):
+        """Waiters of a batch whose handler is cancelled do not hang"""
+        from services.request_coalescing import MicroBatcher
+        
+        async def handler(group, items):
+            raise asyncio.CancelledError()
+        
+        batcher = MicroBatcher(handler, window_seconds=0.01, max_size=2)
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.submit("m", 1), batcher.submit("m", 2), return_exceptions=True),
+            timeout=1,
+        )
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+class TestRateLimiter:
+    """Tests for the shared LLM rate limiter"""
+    
+    @staticmethod
+    def _rate_limit_error(retry_after_ms="10"):
+        import httpx
+        import openai
+        response = httpx.Response(
+            429,
+            headers={"retry-after-ms": retry_after_ms},
+            request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"),
+        )
+        return openai.RateLimitError("Rate limit reached", response=response, body=None)
+    
+    def test_parse_reset_duration(self):
+        """Reset headers use Go-style durations"""
+        assert parse_reset_duration("1s") == 1
+        assert parse_reset_duration("6m0s") == 360
+        assert parse_reset_duration("20ms") == pytest.approx(0.02)
+        assert parse_reset_duration("0.5") == 0.5
+        assert parse_reset_duration("soon") is None
+    
+    @pytest.mark.asyncio
+    async def test_acquire_waits_for_window(self):
+        """Calls beyond the per-minute budget queue until the window has room"""
+        limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000, window_seconds=0.2)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await limiter.acquire(10)
+        await limiter.acquire(10)
+        await limiter.acquire(10)
+        assert loop.time() - start >= 0.15
+        assert limiter.waits >= 1
+    
+    @pytest.mark.asyncio
+    async def test_headers_update_budget(self):
+        """Remaining budget reported by the server holds calls until it resets"""
+        limiter = RateLimiter(window_seconds=60)
+        limiter.observe({
+            "x-ratelimit-limit-requests": "60",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "150ms",
+            "x-ratelimit-limit-tokens": "90000",
+        })
+        assert limiter.requests_per_minute == 60
+        assert limiter.tokens_per_minute == 90000
+        
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await limiter.acquire(10)
+        assert loop.time() - start >= 0.1
+    
+    @pytest.mark.asyncio
+    async def test_run_retries_rate_limits(self):
+        """429s are retried after the server-suggested delay"""
+        limiter = RateLimiter()
+        call = Mock(side_effect=[self._rate_limit_error(), self._rate_limit_error(), "ok"])
+        
+        assert await limiter.run(call, tokens=10) == "ok"
+        assert call.call_count == 3
+        assert limiter.retries == 2
+    
+    @pytest.mark.asyncio
+    async def test_run_gives_up(self):
+        """Persistent transient errors raise RetriesExhausted; other errors are not retried"""
+        limiter = RateLimiter()
+        limiter.max_retries = 1
+        call = Mock(side_effect=self._rate_limit_error())
+        with pytest.raises(RetriesExhausted):
+            await limiter.run(call, tokens=10)
+        assert call.call_count == 2
+        
+        call = Mock(side_effect=ValueError("bad request"))
+        with pytest.raises(ValueError):
+            await limiter.run(call, tokens=10)
+        assert call.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_generator_fails_instead_of_fallback(self, sample_code, sample_run_options):
+        """A rate-limited generation fails the step rather than returning the stub suite"""
+        generator = TestGenerator()
+        generator.router.primary.rate_limiter.max_retries = 1
+        mock_client = Mock()
+        mock_client.chat.completions.create.side_effect = self._rate_limit_error()
+        generator._client = mock_client
+        
+        with pytest.raises(RetriesExhausted):
+            await generator.generate_tests(sample_code, "add", sample_run_options, "Adds", [])
+
+
+class TestLLMRouter:
+    """Tests for per-step model routing and endpoint failover"""
+    
+    ENV = {
+        "OPENAI_API_KEY": "sk-test",
+        "OPENAI_MODEL": "gpt-4o-mini",
+        "LLM_SECONDARY_BASE_URL": "http://localhost:8080/v1",
+        "LLM_SECONDARY_MODEL": "qwen2.5-coder:7b",
+        "LLM_ROUTE_FIX_TESTS": "gpt-4o",
+        "LLM_ROUTE_INFER_BEHAVIOR": "secondary:llama3:8b",
+    }
+    
+    @staticmethod
+    def _client(content):
+        mock_client = Mock()
+        mock_client.chat.completions.create.return_value.choices = [Mock()]
+        mock_client.chat.completions.create.return_value.choices[0].message.content = content
+        return mock_client
+    
+    def test_routes(self):
+        """Steps use their configured endpoint and model, others the primary defaults"""
+        with patch.dict(os.environ, self.ENV):
+            router = LLMRouter()
+        
+        assert router.route("fix_tests") == (router.primary, "gpt-4o")
+        assert router.route("infer_behavior") == (router.secondary, "llama3:8b")
+        assert router.route("generate_tests") == (router.primary, "gpt-4o-mini")
+        assert router.parse_route("llama3:8b") == (router.primary, "llama3:8b")
+        assert router.secondary.client.base_url.host == "localhost"
+    
+    def test_slow_endpoint_is_bypassed(self):
+        """A preferred endpoint with high recent latency moves behind the other one"""
+        with patch.dict(os.environ, self.ENV):
+            router = LLMRouter()
+        router.failover_latency = 5
+        assert router.candidates("generate_tests")[0][0] is router.primary
+        
+        router.primary.record_latency(30)
+        assert [e.name for e, _ in router.candidates("generate_tests")] == ["secondary", "primary"]
+        
+        # Once the probe interval passes, the slow endpoint gets another chance
+        router.primary.last_used -= router.probe_interval
+        assert router.candidates("generate_tests")[0][0] is router.primary
+    
+    @pytest.mark.asyncio
+    async def test_generator_fails_over(self, sample_code, sample_run_options):
+        """Calls move to the secondary endpoint when the primary keeps timing out"""
+        import httpx
+        import openai
+        with patch.dict(os.environ, self.ENV):
+            generator = TestGenerator()
+        generator.failover_retries = 0
+        primary = Mock()
+        primary.chat.completions.create.side_effect = openai.APITimeoutError(
+            request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        )
+        generator.router.primary._client = primary
+        generator.router.secondary._client = self._client("def test_ok():\n    assert True")
+        usage = []
+        
+        tests = await generator.generate_tests(
+            sample_code, "add", sample_run_options, "Adds", [], usage=usage
+        )
+        
+        assert tests == "def test_ok():\n    assert True"
+        primary.chat.completions.create.assert_called_once()
+        assert usage[0]["endpoint"] == "secondary"
+        assert usage[0]["model"] == "qwen2.5-coder:7b"
+
+
+class TestStructuredOutput:
+    """Tests for JSON-schema responses and the legacy line format fallback"""
+    
+    @staticmethod
+    def _client(content):
+        mock_client = Mock()
+        mock_client.chat.completions.create.return_value.choices = [Mock()]
+        mock_client.chat.completions.create.return_value.choices[0].message.content = content
+        return mock_client
+    
+    def test_parse_json(self):
+        """Behavior, targets and test code are read from JSON objects, fenced or not"""
+        assert parse_behavior('{"behavior": "Adds", "edge_cases": ["zero", " "]}') == ("Adds", ["zero"])
+        assert parse_behaviors(
+            '```json\n{"targets": [{"name": "add", "behavior": "Adds", "edge_cases": []}]}\n```'
+        ) == {"add": ("Adds", [])}
+        assert parse_test_code('{"test_code": "def test_a():\\n    pass\\n"}') == "def test_a():\n    pass"
+    
+    def test_parse_legacy(self):
+        """Plain replies from endpoints without structured outputs still parse"""
+        assert parse_behavior("BEHAVIOR: Adds\nEDGE_CASES: zero, negative") == ("Adds", ["zero", "negative"])
+        assert parse_behaviors("TARGET: a\nBEHAVIOR: A\nTARGET: b\nBEHAVIOR: B") == {
+            "a": ("A", []),
+            "b": ("B", []),
+        }
+        assert parse_test_code("```python\ndef test_a():\n    pass\n```") == "def test_a():\n    pass"
+        assert parse_behavior("no structure at all") == ("", [])
+    
+    @pytest.mark.asyncio
+    async def test_response_format_is_requested(self, sample_code, sample_run_options):
+        """Each step sends its JSON schema as the response format"""
+        generator = TestGenerator()
+        generator.client = self._client('{"test_code": "def test_ok():\\n    assert True"}')
+        
+        tests = await generator.generate_tests(sample_code, "add", sample_run_options, "Adds", [])
+        
+        assert tests == "def test_ok():\n    assert True"
+        kwargs = generator.client.chat.completions.create.call_args.kwargs
+        assert kwargs["response_format"] == {"type": "json_schema", "json_schema": TEST_CODE_SCHEMA}
+        
+        generator.client = self._client('{"behavior": "Adds numbers", "edge_cases": ["overflow"]}')
+        assert await generator.infer_behavior(sample_code, "add") == ("Adds numbers", ["overflow"])
+        kwargs = generator.client.chat.completions.create.call_args.kwargs
+        assert kwargs["response_format"]["json_schema"] == BEHAVIOR_SCHEMA
+    
+    @pytest.mark.asyncio
+    async def test_unsupported_endpoint_falls_back(self, sample_code, sample_run_options):
+        """An endpoint that rejects response_format is retried and then asked for plain text"""
+        import httpx
+        import openai
+        generator = TestGenerator()
+        mock_client = self._client("def test_ok():\n    assert True")
+        response = mock_client.chat.completions.create.return_value
+        rejected = openai.BadRequestError(
+            "response_format is not supported",
+            response=httpx.Response(
+                400, request=httpx.Request("POST", "http://localhost:8080/v1/chat/completions")
+            ),
+            body=None,
+        )
+        mock_client.chat.completions.create.side_effect = [rejected, response, response]
+        generator.client = mock_client
+        
+        for _ in range(2):
+            tests = await generator.generate_tests(sample_code, "add", sample_run_options, "Adds", [])
+            assert tests == "def test_ok():\n    assert True"
+        
+        calls = mock_client.chat.completions.create.call_args_list
+        assert ["response_format" in call.kwargs for call in calls] == [True, False, False]
+        assert generator.router.primary.structured_outputs is False
+    
+    @pytest.mark.asyncio
+    async def test_other_bad_requests_keep_structured_outputs(self, sample_code, sample_run_options):
+        """A 400 unrelated to response_format is not retried and the endpoint keeps using schemas"""
+        import httpx
+        import openai
+        generator = TestGenerator()
+        mock_client = self._client("def test_ok():\n    assert True")
+        mock_client.chat.completions.create.side_effect = openai.BadRequestError(
+            "This model's maximum context length is 8192 tokens",
+            response=httpx.Response(
+                400, request=httpx.Request("POST", "http://localhost:8080/v1/chat/completions")
+            ),
+            body={"code": "context_length_exceeded", "param": "messages"},
+        )
+        generator.client = mock_client
+        
+        tests = await generator.generate_tests(sample_code, "add", sample_run_options, "Adds", [])
+        
+        # The error reaches generate_tests, which falls back to its template
+        assert tests != "def test_ok():\n    assert True"
+        assert mock_client.chat.completions.create.call_count == 1
+        assert generator.router.primary.structured_outputs is True
+
+
 class TestTestRunner:
     """Tests for TestRunner service"""
     
@@ -272,6 +710,528 @@ def test_fail():
         
         assert result["exit_code"] != 0
         assert "stderr" in result or "stdout" in result
+    
+    @pytest.mark.asyncio
+    async def test_invalid_suite_skips_pytest(self, test_runner):
+        """Suites that fail static validation are reported without launching pytest"""
+        test_code = "from your_module import subtract\n\ndef test_sub():\n    assert subtract(2, 1) == 1\n"
+        
+        with patch.object(test_runner.sandbox, "run") as mock_run:
+            result = await test_runner.run_tests(
+                test_code, "def add(a, b): return a + b", "add", "test_run_789"
+            )
+        
+        mock_run.assert_not_called()
+        assert result["exit_code"] == 1
+        assert "cannot import name 'subtract'" in result["stderr"]
+        assert result["validation_errors"]
+
+
+class TestHypothesisProfile:
+    """Tests for phase-specific Hypothesis settings and the shared example database"""
+    
+    TEST_CODE = """from hypothesis import given, settings, strategies as st
+
+def test_profile():
+    assert (settings.default.max_examples, settings.default.deadline) == (7, None)
+
+@given(st.integers())
+def test_bounded(x):
+    assert x < 1000
+"""
+    
+    @pytest.mark.asyncio
+    async def test_phase_profile_and_database(self, tmp_path):
+        """Fix runs use the reduced profile and record failing examples per function"""
+        env = {
+            "HYPOTHESIS_DB_DIR": str(tmp_path),
+            "HYPOTHESIS_FIX_MAX_EXAMPLES": "7",
+            "HYPOTHESIS_FIX_DEADLINE_MS": "0",
+        }
+        code = "def bound(x):\n    return x\n"
+        with patch.dict(os.environ, env):
+            result = await TestRunner().run_tests(self.TEST_CODE, code, "bound", "test_run_hyp", phase="fix")
+        
+        assert "test_profile PASSED" in result["stdout"]
+        assert "test_bounded FAILED" in result["stdout"]
+        databases = os.listdir(tmp_path)
+        assert databases == [function_fingerprint(code, "bound")]
+        assert any(files for _, _, files in os.walk(tmp_path / databases[0]))
+    
+    def test_old_databases_pruned(self, tmp_path):
+        """Databases of functions not tested within the retention period are deleted"""
+        import services.hypothesis_profile as hypothesis_profile
+        stale = tmp_path / "stale"
+        stale.mkdir()
+        old = time.time() - 3 * 86400
+        os.utime(stale, (old, old))
+        env = {"HYPOTHESIS_DB_DIR": str(tmp_path), "HYPOTHESIS_DB_RETENTION_DAYS": "2"}
+        with patch.dict(os.environ, env), patch.object(hypothesis_profile, "_pruned_at", None):
+            path = hypothesis_profile.example_database_path("def f():\n    pass\n", "f")
+        
+        assert os.listdir(tmp_path) == [os.path.basename(path)]
+    
+    @pytest.mark.asyncio
+    async def test_conftest_only_for_hypothesis(self):
+        """Plain unit suites run without the profile conftest"""
+        runner = TestRunner()
+        run_dir = Path(runner.temp_dir) / "test_run_plain"
+        runner.prepare_run_dir(self.TEST_CODE, "def f(): pass", "f", "test_run_plain")
+        assert (run_dir / "conftest.py").exists()
+        
+        runner.prepare_run_dir("def test_a():\n    pass\n", "def f(): pass", "f", "test_run_plain")
+        assert not (run_dir / "conftest.py").exists()
+
+
+class TestFlakyDetector:
+    """Tests for randomized parallel reruns and quarantine"""
+    
+    # test_flip fails in exactly one rerun: whichever creates the marker file first
+    SUITE = """import os
+from your_module import add
+
+def test_add():
+    assert add(1, 2) == 3
+
+def test_flip():
+    try:
+        os.close(os.open("flip.marker", os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return
+    assert False, "first run"
+
+class TestAdd:
+    def test_wrong(self):
+        assert add(1, 1) == 3
+"""
+    
+    @pytest.mark.asyncio
+    async def test_classification(self):
+        """Tests are classified as stable, flaky or failing across the reruns"""
+        import uuid
+        code = "def add(a, b):\n    return a + b\n"
+        # A fresh directory, so the marker file does not exist yet
+        run_id = f"test_run_flaky_{uuid.uuid4().hex[:8]}"
+        TestRunner().prepare_run_dir(self.SUITE, code, "add", run_id)
+        usage = []
+        
+        report = await FlakyDetector().detect(self.SUITE, code, "add", run_id, 3, usage=usage)
+        
+        assert report["tests"]["test_add"]["status"] == "stable"
+        assert report["flaky"] == ["test_flip"]
+        assert report["failing"] == ["TestAdd::test_wrong"]
+        assert report["tests"]["test_flip"]["passed"] == 2
+        assert "first run" in FlakyDetector.fixer_output(report)
+        assert "ORDER-DEPENDENT" in FlakyDetector.fixer_output(report)
+        assert len(usage) == 3
+    
+    def test_quarantine(self):
+        """Quarantined tests get a skip mark, including methods and decorated tests"""
+        test_code = """from your_module import add
+
+@pytest.mark.parametrize("x", [1])
+def test_param(x):
+    pass
+
+class TestAdd:
+    def test_method(self):
+        pass
+
+    def test_kept(self):
+        pass
+"""
+        result = quarantine(test_code, ["test_param[1]", "TestAdd::test_method"])
+        lines = result.splitlines()
+        
+        assert lines[0] == "import pytest"
+        assert lines[lines.index('@pytest.mark.parametrize("x", [1])') - 1].startswith("@pytest.mark.skip")
+        assert lines[lines.index("    def test_method(self):") - 1].startswith("    @pytest.mark.skip")
+        assert result.count("quarantined") == 2
+
+
+class TestSuiteMinimizer:
+    """Tests for coverage-preserving suite minimization"""
+    
+    CODE = "def sign(x):\n    if x < 0:\n        return -1\n    return 1\n"
+    
+    SUITE = """import pytest
+from your_module import sign
+
+
+def test_negative():
+    assert sign(-2) == -1
+
+
+# Same path as test_negative
+def test_negative_again():
+    assert sign(-7) == -1
+
+
+@pytest.mark.parametrize("x", [1, 2])
+def test_positive(x):
+    assert sign(x) == 1
+
+
+class TestZero:
+    def test_zero(self):
+        assert sign(0) == 1
+"""
+    
+    def test_select_tests(self):
+        """The cheapest tests covering every requirement are kept"""
+        covered = {"a": {1, 2}, "b": {2, 3}, "c": {1, 2, 3}, "d": set()}
+        
+        assert select_tests(covered, {"a": 0.1, "b": 0.1, "c": 0.15}) == ["c"]
+        assert select_tests(covered, {"a": 0.1, "b": 0.1, "c": 5.0}) == ["a", "b"]
+    
+    def test_remove_tests(self):
+        """Removed tests take their decorators and comments; emptied classes go too"""
+        code = remove_tests(self.SUITE, {"test_negative_again", "TestZero::test_zero"})
+        
+        assert "test_negative_again" not in code
+        assert "Same path" not in code
+        assert "class TestZero" not in code
+        assert '@pytest.mark.parametrize("x", [1, 2])\ndef test_positive(x):' in code
+        assert "\n\n\n\n" not in code
+        compile(code, "test_sign.py", "exec")
+    
+    def test_mutant_killers_are_kept(self):
+        """A test that alone kills a mutant is kept even if its lines are covered"""
+        coverage = {
+            "t.py::test_a": {"lines": [2, 3], "arcs": []},
+            "t.py::test_b": {"lines": [2], "arcs": []},
+        }
+        mutation_report = {"mutants": [{"id": 0, "status": "killed", "killed_by": "t.py::test_b"}]}
+        
+        assert select_tests(requirements(coverage), {}) == ["t.py::test_a"]
+        assert select_tests(requirements(coverage, mutation_report), {}) == ["t.py::test_a", "t.py::test_b"]
+    
+    @pytest.mark.asyncio
+    async def test_minimize(self):
+        """Redundant tests are removed from the suite on disk and the savings reported"""
+        TestRunner().prepare_run_dir(self.SUITE, self.CODE, "sign", "test_run_minimize")
+        coverage_reporter = CoverageReporter()
+        await coverage_reporter.generate_report("test_run_minimize", "sign")
+        usage = []
+        
+        report = await SuiteMinimizer().minimize(
+            self.SUITE,
+            self.CODE,
+            "sign",
+            "test_run_minimize",
+            coverage_reporter.test_contexts("test_run_minimize"),
+            usage=usage,
+        )
+        
+        assert report["applied"]
+        assert report["original_tests"] == 5
+        # One of each duplicate pair is left; which one depends on the timings
+        assert report["minimized_tests"] in (2, 3)
+        assert len(report["removed"]) == 2
+        assert report["preserved"] == {"lines": 3, "arcs": 5, "mutants": 0}
+        assert report["size_reduction"] > 0
+        assert len(usage) == 2
+        with open(os.path.join("temp_runs", "test_run_minimize", "test_sign.py")) as f:
+            assert f.read() == report["generated_tests"]
+        # Exactly one negative and one non-negative test remain
+        assert report["generated_tests"].count("def test_") == 2
+
+
+class TestSuiteProfiler:
+    """Tests for cProfile runs of the generated suite"""
+    
+    @pytest.mark.asyncio
+    async def test_profile_reports_hot_code(self):
+        """Hot functions, time in the target and slow tests come from one profiled run"""
+        code = (
+            "def crunch(n):\n    return sum(_square(i) for i in range(n))\n\n\n"
+            "def _square(i):\n    return i * i\n"
+        )
+        test_code = (
+            "from your_module import crunch\n\n\n"
+            "def test_small():\n    assert crunch(3) == 5\n\n\n"
+            "class TestLarge:\n    def test_large(self):\n        assert crunch(300000) > 0\n"
+        )
+        runner = TestRunner()
+        runner.prepare_run_dir(test_code, code, "crunch", "test_run_profile")
+        
+        report, listing = await SuiteProfiler().profile(
+            test_code, code, "crunch", "test_run_profile", slow_seconds=0.05
+        )
+        
+        assert report["exit_code"] == 0
+        assert [entry["test"] for entry in report["durations"]] == ["TestLarge::test_large", "test_small"]
+        assert report["slow_tests"] == ["TestLarge::test_large"]
+        assert report["target"]["calls"] == 2
+        assert report["hot_functions"][0]["file"] == "your_module.py"
+        assert not any("_pytest" in row["file"] for row in report["hot_functions"])
+        assert "cumulative" in listing
+        assert not os.path.exists(os.path.join(runner.temp_dir, "test_run_profile", "veritas_profile.py"))
+
+
+class TestMutationTester:
+    """Tests for AST mutants and the coverage-filtered mutation score"""
+    
+    CODE = """def clamp(x, low=0, high=10):
+    '''Clamp x into [low, high]'''
+    if x < low:
+        return low
+    if x > high:
+        return high
+    return x
+"""
+    
+    SUITE = """from your_module import clamp
+
+def test_low():
+    assert clamp(-5) == 0
+
+def test_mid():
+    assert clamp(5) == 5
+"""
+    
+    def test_generate_mutants(self):
+        """Each mutant changes one point of the target and keeps the module valid"""
+        mutants = generate_mutants(self.CODE, "clamp", 40)
+        descriptions = {(m["line"], m["description"]) for m in mutants}
+        
+        assert (3, "< -> <=") in descriptions
+        assert (5, "> -> >=") in descriptions
+        assert (7, "return value -> None") in descriptions
+        # Defaults are attributed to the function's first statement, not the def line
+        assert (3, "0 -> 1") in descriptions
+        assert not any("Clamp" in m["description"] for m in mutants)
+        assert "if x <= low:" in next(m["source"] for m in mutants if m["description"] == "< -> <=")
+        assert len(generate_mutants(self.CODE, "clamp", 3)) == 3
+        assert generate_mutants(self.CODE, "missing", 40) == []
+    
+    @pytest.mark.asyncio
+    async def test_score_with_line_contexts(self):
+        """Mutants run only the tests covering their line; uncovered lines are not run"""
+        TestRunner().prepare_run_dir(self.SUITE, self.CODE, "clamp", "test_run_mutation")
+        coverage_reporter = CoverageReporter()
+        await coverage_reporter.generate_report("test_run_mutation", "clamp")
+        contexts = coverage_reporter.line_contexts("test_run_mutation")
+        assert contexts[4] == {"test_clamp.py::test_low"}
+        assert 6 not in contexts
+        usage = []
+        
+        report = await MutationTester().run(
+            self.CODE, "clamp", "test_run_mutation", contexts, usage=usage
+        )
+        
+        statuses = {(m["line"], m["description"]): m for m in report["mutants"]}
+        assert statuses[(4, "return value -> None")]["status"] == "killed"
+        assert statuses[(4, "return value -> None")]["killed_by"] == "test_clamp.py::test_low"
+        assert statuses[(6, "return value -> None")]["status"] == "no_coverage"
+        assert statuses[(3, "< -> <=")]["status"] == "survived"
+        assert report["total"] == len(report["mutants"])
+        assert report["score"] == round(100 * (report["killed"] + report["timeout"]) / report["total"], 1)
+        # Mutants on uncovered lines are never started
+        assert len(usage) == report["total"] - report["no_coverage"]
+
+
+class TestSandbox:
+    """Tests for resource-limited execution of generated tests"""
+    
+    @pytest.fixture
+    def sandbox(self):
+        sandbox = Sandbox()
+        sandbox.cpu_seconds = 1
+        sandbox.wall_seconds = 5
+        return sandbox
+    
+    def _python(self, sandbox, tmp_path, code):
+        return sandbox.run([sys.executable, "-c", code], str(tmp_path))
+    
+    def test_usage_is_reported(self, sandbox, tmp_path):
+        """Successful runs report their output and measured resource usage"""
+        result = self._python(sandbox, tmp_path, "print('ok')")
+        
+        assert result["exit_code"] == 0
+        assert result["stdout"] == "ok\n"
+        usage = result["resource_usage"]
+        assert usage["limit_exceeded"] is None
+        assert usage["max_rss_mb"] > 0
+        assert usage["cpu_seconds"] >= 0
+    
+    def test_limits(self, sandbox, tmp_path):
+        """Runaway loops, oversized allocations and hangs are stopped"""
+        result = self._python(sandbox, tmp_path, "while True: pass")
+        assert result["exit_code"] != 0
+        assert result["resource_usage"]["limit_exceeded"] == "cpu time (1s)"
+        
+        sandbox.memory_mb = 256
+        result = self._python(sandbox, tmp_path, "data = bytearray(1024 * 1024 * 1024)")
+        assert result["resource_usage"]["limit_exceeded"] == "memory (256 MB)"
+        
+        sandbox.wall_seconds = 0.5
+        result = self._python(sandbox, tmp_path, "import time; time.sleep(10)")
+        assert result["resource_usage"]["limit_exceeded"] == "wall clock (0.5s)"
+        assert result["resource_usage"]["wall_seconds"] < 5
+    
+    def test_limits_set_by_wrapper(self, sandbox, tmp_path):
+        """The command itself runs with the caps, and a missing command fails cleanly"""
+        import resource
+        sandbox.file_size_mb = 8
+        result = self._python(
+            sandbox, tmp_path, "import resource; print(resource.getrlimit(resource.RLIMIT_FSIZE))"
+        )
+        assert result["stdout"] == f"({8 * 1024 * 1024}, {8 * 1024 * 1024})\n"
+        assert resource.getrlimit(resource.RLIMIT_FSIZE)[0] != 8 * 1024 * 1024
+        
+        result = sandbox.run(["veritas-no-such-command"], str(tmp_path))
+        assert result["exit_code"] == 127
+        assert "cannot run veritas-no-such-command" in result["stderr"]
+    
+    def test_network_and_secrets(self, sandbox, tmp_path):
+        """Tests cannot open connections or read the server's credentials"""
+        code = (
+            "import os, socket\n"
+            "print(os.environ.get('OPENAI_API_KEY'))\n"
+            "socket.create_connection(('127.0.0.1', 9), timeout=1)\n"
+        )
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "sk-secret"}):
+            result = self._python(sandbox, tmp_path, code)
+        
+        assert result["stdout"] == "None\n"
+        assert result["exit_code"] != 0
+        assert "network access is disabled in the test sandbox" in result["stderr"]
+    
+    @pytest.mark.asyncio
+    async def test_runner_records_usage(self):
+        """Pytest runs append their usage to the run's resource log"""
+        usage = []
+        result = await TestRunner().run_tests(
+            "def test_pass():\n    assert True\n",
+            "def add(a, b): return a + b",
+            "add",
+            "test_run_usage",
+            usage=usage,
+        )
+        
+        assert result["exit_code"] == 0
+        assert usage[0]["command"] == "pytest"
+        assert usage[0]["max_rss_mb"] == result["resource_usage"]["max_rss_mb"]
+
+
+class TestTestValidator:
+    """Tests for static validation of generated test modules"""
+    
+    MODULE = "import math\nRATE = 0.1\n\ndef add(a, b):\n    return a + b\n\nclass Cart:\n    pass\n"
+    
+    @pytest.fixture
+    def validator(self):
+        return TestValidator()
+    
+    def test_valid_suite(self, validator):
+        """Fixtures, parametrize arguments and decorated tests are accepted"""
+        test_code = """import pytest
+import your_module
+from your_module import add, Cart, RATE
+from hypothesis import given, strategies as st
+
+@pytest.fixture
+def cart():
+    return Cart()
+
+@pytest.mark.parametrize("a,b", [(1, 2)])
+def test_add(a, b, cart, tmp_path):
+    assert your_module.add(a, b) == 3
+
+@given(st.integers())
+def test_property(x):
+    assert add(x, 0) == x
+
+class TestCart:
+    def test_cart(self, cart, expected=None):
+        assert cart is not None
+"""
+        assert validator.validate(test_code, self.MODULE) == []
+    
+    def test_syntax_and_markdown(self, validator):
+        """Leftover fences and syntax errors are reported with line numbers"""
+        diagnostics = validator.validate("```python\ndef test_a():\n    pass\n```", self.MODULE)
+        assert diagnostics[0].startswith("line 1: leftover markdown")
+        assert any("SyntaxError" in d for d in diagnostics)
+        
+        diagnostics = validator.validate("def test_a(:\n    pass\n", self.MODULE)
+        assert diagnostics == ["line 1: SyntaxError: invalid syntax: def test_a(:"]
+    
+    def test_unknown_names(self, validator):
+        """Imports and attributes missing from the module are reported"""
+        test_code = """import your_module as m
+from your_module import add, multiply
+
+def test_a():
+    assert m.divide(4, 2) == 2
+"""
+        diagnostics = validator.validate(test_code, self.MODULE)
+        assert len(diagnostics) == 2
+        assert "cannot import name 'multiply'" in diagnostics[0]
+        assert "has no attribute 'divide'" in diagnostics[1]
+    
+    def test_names_bound_in_blocks(self, validator):
+        """Definitions under module-level try/if blocks and module dunders are importable"""
+        module = """try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is None:
+    def f(x):
+        return x
+else:
+    def f(x):
+        return np.asarray(x)
+
+with open(__file__) as handle:
+    SOURCE = handle.read()
+"""
+        test_code = """import your_module
+from your_module import f, np, SOURCE
+
+def test_f():
+    assert f(1) == 1
+    assert your_module.__name__ == "your_module"
+    assert your_module.handle.closed
+"""
+        assert validator.validate(test_code, module) == []
+        
+        diagnostics = validator.validate("from your_module import g\n\ndef test_g():\n    pass\n", module)
+        assert diagnostics == [
+            "line 1: cannot import name 'g' from 'your_module'; it defines: SOURCE, f, handle, np"
+        ]
+    
+    def test_collection_problems(self, validator):
+        """Uncollectable classes, missing tests and unknown fixtures are reported"""
+        test_code = """class TestAdd:
+    def __init__(self):
+        pass
+
+    def test_add(self):
+        pass
+
+def test_fixture(missing_fixture):
+    pass
+"""
+        diagnostics = validator.validate(test_code, self.MODULE)
+        assert "defines __init__" in diagnostics[0]
+        assert "fixture 'missing_fixture'" in diagnostics[1]
+        
+        assert validator.validate("def check_add():\n    pass\n", self.MODULE) == [
+            "no tests found; test functions must be named test_* "
+            "(or be methods of a Test* class without __init__)"
+        ]
+    
+    def test_plugin_and_repo_fixtures(self, validator):
+        """Plugin fixtures are known, and unknown ones pass when a checkout supplies fixtures"""
+        test_code = "def test_a(event_loop, cov, no_cover):\n    pass\n"
+        assert validator.validate(test_code, self.MODULE) == []
+        
+        test_code = "def test_a(db_session):\n    pass\n"
+        assert validator.validate(test_code, self.MODULE)
+        assert validator.validate(test_code, self.MODULE, check_fixtures=False) == []
 
 
 class TestCoverageReporter:
@@ -290,6 +1250,237 @@ class TestCoverageReporter:
         assert result.branches == 0
         assert result.functions == 0
         assert len(result.files) == 0
+    
+    @pytest.mark.asyncio
+    async def test_per_test_contexts(self, coverage_reporter):
+        """Each test maps to the lines and arcs it executed; import-time lines are left out"""
+        code = "def sign(x):\n    if x < 0:\n        return -1\n    return 1\n"
+        suite = (
+            "from your_module import sign\n\n"
+            "def test_negative():\n    assert sign(-2) == -1\n\n"
+            "def test_positive():\n    assert sign(2) == 1\n"
+        )
+        TestRunner().prepare_run_dir(suite, code, "sign", "test_run_contexts")
+        
+        summary = await coverage_reporter.generate_report("test_run_contexts", "sign")
+        test_coverage = coverage_reporter.test_contexts("test_run_contexts")
+        
+        assert summary.lines == 100
+        assert summary.branches == 100
+        assert test_coverage == {
+            "test_sign.py::test_negative": {"lines": [2, 3], "arcs": [[-1, 2], [2, 3], [3, -1]]},
+            "test_sign.py::test_positive": {"lines": [2, 4], "arcs": [[-1, 2], [2, 4], [4, -1]]},
+        }
+        assert lines_to_tests(test_coverage)[2] == {
+            "test_sign.py::test_negative", "test_sign.py::test_positive"
+        }
+
+
+class TestDiffEngine:
+    """Tests for patches against a mirrored target repository"""
+    
+    EXISTING = (
+        "import pytest\nfrom your_module import add\n\n\n"
+        "def test_add():\n    assert add(1, 2) == 3\n\n\n"
+        "def test_zero():\n    assert add(0, 0) == 0\n"
+    )
+    
+    @staticmethod
+    def git(*args, cwd):
+        return subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+            cwd=cwd, capture_output=True, text=True, check=True,
+        ).stdout
+    
+    @pytest.fixture
+    def repo(self, tmp_path):
+        work = tmp_path / "repo"
+        (work / "tests").mkdir(parents=True)
+        (work / "tests" / "test_add.py").write_text(self.EXISTING)
+        self.git("init", "-q", "-b", "main", cwd=work)
+        self.git("add", ".", cwd=work)
+        self.git("commit", "-q", "-m", "init", cwd=work)
+        return work
+    
+    @pytest.fixture
+    def engine(self, tmp_path):
+        env = {"GIT_MIRROR_DIR": str(tmp_path / "mirrors"), "LOCAL_REPO_ROOTS": str(tmp_path)}
+        with patch.dict(os.environ, env):
+            yield DiffEngine()
+    
+    def test_new_file_diff(self, repo, tmp_path):
+        """A new file diff carries real blob ids and applies cleanly"""
+        content = "def test_one():\n    assert True"
+        patch_text = unified_diff("tests/test_new.py", None, content)
+        
+        (tmp_path / "new.txt").write_text(content)
+        blob = self.git("hash-object", str(tmp_path / "new.txt"), cwd=repo).strip()
+        assert f"index 0000000..{blob[:7]}" in patch_text
+        assert patch_text.endswith("\\ No newline at end of file\n")
+        (tmp_path / "new.diff").write_text(patch_text)
+        self.git("apply", "--check", str(tmp_path / "new.diff"), cwd=repo)
+        assert unified_diff("x.py", content, content) == ""
+    
+    def test_merge_test_module(self):
+        """Existing tests are replaced in place, new ones appended, imports added"""
+        generated = (
+            "import math\nfrom your_module import add\n\n\n"
+            "def test_add():\n    assert add(2, 2) == 4\n\n\n"
+            "def test_neg():\n    assert add(-1, 1) == 0\n"
+        )
+        merged = merge_test_module(self.EXISTING, generated)
+        
+        assert merged.splitlines()[:3] == ["import pytest", "from your_module import add", "import math"]
+        assert "assert add(2, 2) == 4" in merged
+        assert "assert add(1, 2) == 3" not in merged
+        assert "def test_zero" in merged
+        assert merged.endswith("def test_neg():\n    assert add(-1, 1) == 0\n")
+    
+    @pytest.mark.asyncio
+    async def test_patch_against_existing_file(self, repo, engine, tmp_path):
+        """Changes to a file already in the repo become minimal hunks"""
+        generated = "from your_module import add\n\n\ndef test_add():\n    assert add(2, 2) == 4\n"
+        
+        result = await engine.create_patch("run_1", "add", generated, str(repo), "main", "tests/test_add.py")
+        
+        assert result["base_commit"] == self.git("rev-parse", "HEAD", cwd=repo).strip()
+        assert "new file mode" not in result["patch"]
+        assert "-    assert add(1, 2) == 3\n+    assert add(2, 2) == 4" in result["patch"]
+        assert "test_zero" not in [l for l in result["patch"].splitlines() if l.startswith(("+", "-"))]
+        (tmp_path / "p.diff").write_text(result["patch"])
+        self.git("apply", "--check", str(tmp_path / "p.diff"), cwd=repo)
+    
+    @pytest.mark.asyncio
+    async def test_mirror_is_cached_and_fetched(self, repo, engine):
+        """The mirror is cloned once and picks up new commits with a fetch"""
+        result = await engine.create_patch("run_1", "add", "x = 1\n", str(repo), "main")
+        assert "new file mode" in result["patch"]
+        assert result["path"] == "experiments/run_1/test_add.py"
+        mirror = engine.mirror_path(str(repo))
+        assert os.path.isdir(mirror)
+        
+        (repo / "experiments" / "run_1").mkdir(parents=True)
+        (repo / "experiments" / "run_1" / "test_add.py").write_text("x = 1\n")
+        self.git("add", ".", cwd=repo)
+        self.git("commit", "-q", "-m", "add", cwd=repo)
+        # Within the fetch interval the cached mirror is used as is
+        assert (await engine.create_patch("run_1", "add", "x = 1\n", str(repo), "main"))["patch"]
+        engine.fetch_interval = 0
+        with patch("services.diff_engine.subprocess.run", wraps=subprocess.run) as git:
+            result = await engine.create_patch("run_1", "add", "x = 1\n", str(repo), "main")
+        assert result["patch"] == ""
+        assert not any("clone" in call.args[0] for call in git.call_args_list)
+    
+    @pytest.mark.asyncio
+    async def test_unreachable_repo_falls_back(self, engine, tmp_path):
+        """Without a readable repo the suite is diffed as a new file"""
+        result = await engine.create_patch(
+            "run_1", "add", "x = 1\n", str(tmp_path / "missing"), "main"
+        )
+        
+        assert result["base_commit"] is None
+        assert result["patch"].startswith("diff --git a/experiments/run_1/test_add.py")
+    
+    def test_clone_url_rejects_server_paths(self, engine, tmp_path):
+        """Only checkouts under LOCAL_REPO_ROOTS and network URLs are mirrored"""
+        assert engine.clone_url("octo/repo") == "https://github.com/octo/repo.git"
+        assert engine.clone_url("git@github.com:octo/repo.git") == "git@github.com:octo/repo.git"
+        assert engine.clone_url(str(tmp_path)) == os.path.realpath(tmp_path)
+        for repo_url in ("/etc", f"file://{tmp_path}", "ext::sh -c id", "--upload-pack=id"):
+            with pytest.raises(ValueError):
+                engine.clone_url(repo_url)
+
+
+class TestRepoEnvironments:
+    """Tests for running suites against a local checkout"""
+    
+    @pytest.fixture
+    def checkout(self, tmp_path):
+        repo = tmp_path / "checkouts" / "project"
+        (repo / "pkg" / "sub").mkdir(parents=True)
+        (repo / "pkg" / "__init__.py").write_text("")
+        (repo / "pkg" / "sub" / "__init__.py").write_text("")
+        (repo / "pkg" / "sub" / "helpers.py").write_text("SCALE = 10\n")
+        (repo / "pkg" / "sub" / "scale.py").write_text(
+            "from .helpers import SCALE\n\n\ndef scale(x):\n    return x * SCALE\n"
+        )
+        return repo
+    
+    @pytest.fixture
+    def environments(self, tmp_path):
+        with patch.dict(os.environ, {
+            "REPO_ENV_DIR": str(tmp_path / "envs"),
+            "LOCAL_REPO_ROOTS": str(tmp_path / "checkouts"),
+        }):
+            yield RepoEnvironments()
+    
+    def test_resolve_restricts_roots(self, environments, checkout, tmp_path):
+        """Only existing checkouts under LOCAL_REPO_ROOTS are accepted"""
+        assert environments.resolve(str(checkout)) == os.path.realpath(checkout)
+        with pytest.raises(ValueError, match="outside"):
+            environments.resolve(str(tmp_path))
+        with pytest.raises(ValueError, match="not found"):
+            environments.resolve(str(tmp_path / "checkouts" / "missing"))
+        
+        with patch.dict(os.environ, {"LOCAL_REPO_ROOTS": ""}):
+            with pytest.raises(ValueError, match="disabled"):
+                RepoEnvironments().resolve(str(checkout))
+    
+    def test_module_package(self, checkout):
+        """The import root is the first directory above the package chain"""
+        assert module_package(str(checkout), "pkg/sub/scale.py") == (str(checkout), "pkg.sub")
+        assert module_package(str(checkout), "script.py") == (str(checkout), "")
+    
+    def test_prepare_reuses_environment(self, environments, checkout):
+        """The environment is built once per dependency set and reused after that"""
+        (checkout / "requirements.txt").write_text("attrs\n")
+        
+        def build(args):
+            if args[1:3] == ["-m", "venv"]:
+                os.makedirs(args[3])
+        
+        with patch.object(environments, "_run", side_effect=build) as mock_run:
+            first = environments.prepare(str(checkout), "pkg/sub/scale.py")
+            second = environments.prepare(str(checkout), "pkg/sub/scale.py")
+            assert mock_run.call_count == 3  # venv, test packages, requirements
+            assert not first["reused"] and second["reused"]
+            assert first["python"] == second["python"]
+            assert first["package"] == "pkg.sub"
+            assert first["pythonpath"] == [os.path.realpath(checkout)]
+            
+            # New dependencies get a new environment and the old one is pruned
+            (checkout / "requirements.txt").write_text("attrs\nidna\n")
+            third = environments.prepare(str(checkout))
+            assert not third["reused"]
+            assert [
+                entry for entry in os.listdir(environments.root) if not entry.endswith(".lock")
+            ] == [os.path.basename(os.path.dirname(os.path.dirname(third["python"])))]
+    
+    def test_install_hides_secrets(self, environments):
+        """Install commands run without the server's credentials"""
+        os.makedirs(environments.root)
+        check = "import os, sys; sys.exit('GITHUB_TOKEN' in os.environ)"
+        with patch.dict(os.environ, {"GITHUB_TOKEN": "ghp_secret"}):
+            environments._run([sys.executable, "-c", check])
+            with pytest.raises(RuntimeError, match="failed"):
+                environments._run([sys.executable, "-c", "import sys; sys.exit('boom')"])
+    
+    @pytest.mark.asyncio
+    async def test_runs_in_package_context(self, checkout):
+        """Relative imports of the module resolve against the checkout"""
+        runner = TestRunner()
+        run_id = "test_run_local_repo"
+        write_runtime(os.path.join(runner.temp_dir, run_id), {
+            "python": sys.executable,
+            "pythonpath": [str(checkout)],
+            "package": "pkg.sub",
+        })
+        original_code = (checkout / "pkg" / "sub" / "scale.py").read_text()
+        test_code = "from your_module import scale\n\n\ndef test_scale():\n    assert scale(2) == 20\n"
+        
+        result = await runner.run_tests(test_code, original_code, "scale", run_id)
+        
+        assert result["exit_code"] == 0, result["stdout"] + result["stderr"]
 
 
 class TestPRCreator:
@@ -317,6 +1508,25 @@ class TestPRCreator:
         assert result.url is None
         assert "test_func" in result.title
     
+    @pytest.mark.asyncio
+    async def test_create_pr_file_path(self, pr_creator):
+        """The PR touches the path the patch was made for"""
+        from models import CoverageSummary
+        
+        result = await pr_creator.create_pr(
+            None,
+            "main",
+            "test_func",
+            CoverageSummary(lines=80, branches=75, functions=90, files=[]),
+            "run_123",
+            "diff content",
+            "test code",
+            file_path="tests/test_func.py",
+        )
+        
+        assert result.changed_files == ["tests/test_func.py"]
+        assert "`tests/test_func.py`" in result.body
+    
     @pytest.mark.asyncio
     async def test_create_pr_no_token(self, pr_creator):
         """Test PR creation without GitHub token"""
@@ -355,3 +1565,506 @@ class TestPRCreator:
         """Test repository URL parsing with invalid URL"""
         with pytest.raises(ValueError):
             pr_creator._parse_repo_url("invalid-url")
+
+
+class TestResultCache:
+    """Tests for ResultCache service"""
+    
+    @pytest.fixture
+    def options(self):
+        return RunOptions(edge_case_categories=EdgeCaseCategory())
+    
+    @pytest.fixture
+    def module_code(self):
+        return """RATE = 2
+
+def helper(x):
+    return x * RATE
+
+def target(x):
+    return helper(x) + 1
+
+def unrelated():
+    return 0
+"""
+    
+    def _entry(self, key, function_name="target"):
+        return CacheEntry(
+            key=key,
+            function_name=function_name,
+            generated_tests="def test_ok(): pass",
+            inferred_spec="spec",
+            edge_cases=[],
+            coverage_summary=CoverageSummary(lines=100, branches=100, functions=100, files=[]),
+            patch_diff="",
+            source_run_id="run_1",
+        )
+    
+    def test_fingerprint_ignores_formatting_and_unrelated_code(self, module_code):
+        """Comments, docstrings, formatting and other functions do not change the hash"""
+        edited = module_code.replace(
+            "def target(x):\n", "def target(x):\n    \"\"\"Docs\"\"\"\n    # comment\n"
+        ).replace("return 0", "return 42")
+        assert function_fingerprint(module_code, "target") == function_fingerprint(edited, "target")
+    
+    def test_fingerprint_tracks_dependencies(self, module_code):
+        """Changing a dependency of the target changes the hash"""
+        edited = module_code.replace("RATE = 2", "RATE = 3")
+        assert function_fingerprint(module_code, "target") != function_fingerprint(edited, "target")
+        assert function_fingerprint("def broken(:", "target") is None
+    
+    def test_key_ignores_pr_options(self, module_code, options):
+        """PR-only options do not affect the cache key"""
+        cache = ResultCache()
+        pr_options = options.copy(update={"create_pr": True, "branch": "dev"})
+        style_options = options.copy(update={"test_style": "property-based"})
+        key = cache.make_key(module_code, "target", options)
+        assert key == cache.make_key(module_code, "target", pr_options)
+        assert key != cache.make_key(module_code, "target", style_options)
+    
+    def test_diff_functions(self, module_code):
+        """Module versions are compared function by function"""
+        new_code = module_code.replace("RATE = 2", "RATE = 3").replace(
+            "def unrelated():\n    return 0\n", "def added():\n    return 1\n"
+        )
+        diff = diff_functions(module_code, new_code)
+        
+        assert diff["changed"] == ["helper", "target"]
+        assert diff["added"] == ["added"]
+        assert diff["removed"] == ["unrelated"]
+        assert diff["unchanged"] == []
+    
+    def test_lru_eviction_and_invalidation(self):
+        """Entries are evicted least-recently-used first and can be invalidated"""
+        cache = ResultCache(max_entries=2)
+        cache.put(self._entry("a"))
+        cache.put(self._entry("b", function_name="other"))
+        assert cache.get("a") is not None
+        cache.put(self._entry("c"))
+        
+        assert cache.get("b") is None
+        assert cache.invalidate(function_name="target") == 2
+        assert cache.stats()["entries"] == 0
+
+
+class TestTokenBudget:
+    """Tests for TokenBudget service"""
+    
+    def test_small_output_is_unchanged(self):
+        """Output within budget is passed through"""
+        budget = TokenBudget(max_prompt_tokens=1000)
+        assert budget.trim_error_output("E   assert 1 == 2", "test_f.py", 1000) == "E   assert 1 == 2"
+    
+    def test_trim_keeps_relevant_frames(self):
+        """Frames outside your_module and the test file are dropped"""
+        budget = TokenBudget()
+        output = "\n".join([
+            "=================================== FAILURES ===================================",
+            "____ test_f ____",
+            "test_f.py:3: in test_f",
+            "    f()",
+            "/usr/lib/python3/site-packages/lib.py:10: in helper",
+            "    " + "x" * 2000,
+            "your_module.py:2: in f",
+            "    raise ValueError()",
+            "E   ValueError",
+            "=========================== short test summary info ============================",
+            "FAILED test_f.py::test_f - ValueError",
+        ])
+        
+        trimmed = budget.trim_error_output(output, "test_f.py", 200)
+        
+        assert "site-packages" not in trimmed
+        assert "your_module.py:2" in trimmed
+        assert "E   ValueError" in trimmed
+        assert "FAILED test_f.py::test_f" in trimmed
+    
+    def test_truncate_respects_budget(self):
+        """Unstructured output is cut down to the token budget"""
+        budget = TokenBudget()
+        trimmed = budget.trim_error_output("word " * 20000, "test_f.py", 300)
+        assert budget.count_tokens(trimmed) <= 300
+
+
+class TestRunIndex:
+    """Tests for RunIndex service"""
+    
+    @pytest.fixture
+    def index(self):
+        index = RunIndex()
+        index.add("run_1", "2024-01-01T00:00:00", "add", "success")
+        index.add("run_2", "2024-01-02T00:00:00", "sub", "failed")
+        index.add("run_3", "2024-01-03T00:00:00", "add", "running")
+        return index
+    
+    def test_filters_and_counts(self, index):
+        """Filtered counts come from the indexes"""
+        assert index.count() == 3
+        assert index.count(function_name="add") == 2
+        assert index.count(status="failed") == 1
+        assert index.count(created_after="2024-01-01T00:00:00") == 2
+        assert index.count(status="success", function_name="add") == 1
+    
+    def test_status_updates_move_runs(self, index):
+        """Status changes keep indexes and aggregates in sync"""
+        index.update_status("run_3", "success")
+        assert index.count(status="success") == 2
+        assert index.count(status="running") == 0
+        index.remove("run_1")
+        assert index.count(status="success", function_name="add") == 1
+    
+    def test_page_bounds_with_cursor(self, index):
+        """A cursor excludes the runs already returned"""
+        lower, upper, keys = index.page(cursor=encode_cursor(("2024-01-03T00:00:00", "run_3")))
+        assert [key[1] for key in keys[lower:upper]] == ["run_1", "run_2"]
+
+
+class TestModuleParser:
+    """Tests for ModuleParser service"""
+    
+    @pytest.fixture
+    def code(self):
+        return """class Cart:
+    def add(self, item, qty: int = 1) -> None:
+        if qty <= 0 or item is None:
+            raise ValueError("bad")
+        for _ in range(qty):
+            pass
+
+def total(prices):
+    return sum(p for p in prices if p > 0)
+"""
+    
+    def test_symbols(self, code):
+        """Functions, classes and methods are listed with metrics"""
+        module = ModuleParser().parse(code)
+        symbols = {symbol["qualname"]: symbol for symbol in module.symbols}
+        
+        assert set(symbols) == {"Cart", "Cart.add", "total"}
+        assert symbols["Cart.add"]["kind"] == "method"
+        assert symbols["Cart.add"]["signature"] == "def add(self, item, qty: int=1) -> None"
+        assert symbols["Cart.add"]["complexity"] == 4
+        assert symbols["total"]["lineno"] == 8
+        assert module.item_type("Cart") == "class"
+        assert module.item_type("missing") is None
+        assert module.symbol_at(4) == "Cart.add"
+    
+    def test_cache_by_content_hash(self, code):
+        """The same source is parsed once and evicted least-recently-used"""
+        parser = ModuleParser(max_entries=1)
+        first = parser.parse(code)
+        assert parser.parse(code) is first
+        parser.parse("x = 1")
+        assert parser.parse(code) is not first
+        assert parser.stats()["hits"] == 1
+
+
+class TestSQLiteStateBackend:
+    """Tests for the SQLite run store and event bus shared between workers"""
+    
+    def _run(self, run_id, created_at, status="running", function_name="add"):
+        from models import RunResult
+        return RunResult(
+            run_id=run_id,
+            status=status,
+            function_name=function_name,
+            code="def add(a, b): return a + b",
+            options=RunOptions(edge_case_categories=EdgeCaseCategory()),
+            inferred_spec="",
+            edge_cases=[],
+            generated_tests="",
+            test_run_output={"stdout": "", "stderr": "", "exit_code": 0},
+            coverage_summary=CoverageSummary(lines=0, branches=0, functions=0, files=[]),
+            patch_diff="",
+            artifacts_path=f"experiments/{run_id}",
+            iterations_used=0,
+            steps=[],
+            created_at=created_at,
+            updated_at=created_at,
+        )
+    
+    @pytest.fixture
+    def db_path(self, tmp_path):
+        return str(tmp_path / "state.db")
+    
+    def test_runs_visible_across_workers(self, db_path):
+        """A run saved by one worker can be read and cancelled by another"""
+        owner = SQLiteRunStore(SQLiteDatabase(db_path))
+        other = SQLiteRunStore(SQLiteDatabase(db_path))
+        run = self._run("run_1", "2024-01-01T00:00:00")
+        owner.add(run)
+        
+        remote = other["run_1"]
+        assert remote.function_name == "add"
+        remote.status = "cancelled"
+        other.save(remote)
+        
+        # The owner's stale copy must not resurrect the run
+        run.status = "success"
+        owner.save(run)
+        assert owner.is_cancelled("run_1")
+        assert other["run_1"].status == "cancelled"
+    
+    def test_list_runs(self, db_path):
+        """Listings use keyset pagination and maintained status counts"""
+        store = SQLiteRunStore(SQLiteDatabase(db_path))
+        for i in range(3):
+            store.add(self._run(f"run_{i}", f"2024-01-0{i + 1}T00:00:00", status="success"))
+        store.add(self._run("run_x", "2024-01-05T00:00:00", status="failed", function_name="sub"))
+        
+        page = store.list_runs(status="success", limit=2)
+        assert [item["run_id"] for item in page["items"]] == ["run_2", "run_1"]
+        assert page["total"] == 3
+        assert page["status_counts"] == {"success": 3, "failed": 1}
+        
+        rest = store.list_runs(status="success", limit=2, cursor=page["next_cursor"])
+        assert [item["run_id"] for item in rest["items"]] == ["run_0"]
+        assert rest["next_cursor"] is None
+        assert store.list_runs(function_name="sub")["total"] == 1
+    
+    def test_function_counts(self, db_path):
+        """Per-function totals follow status changes and are filled for existing databases"""
+        store = SQLiteRunStore(SQLiteDatabase(db_path))
+        run = self._run("run_1", "2024-01-01T00:00:00", status="running")
+        store.add(run)
+        store.add(self._run("run_2", "2024-01-02T00:00:00", status="success"))
+        run.status = "failed"
+        store.save(run)
+        assert store.list_runs(function_name="add")["total"] == 2
+        assert store.list_runs(function_name="add", status="failed")["total"] == 1
+        assert store.list_runs(function_name="add", status="running")["total"] == 0
+        assert store.list_runs(function_name="add", created_after="2024-01-01T12:00:00")["total"] == 1
+        
+        # A database created before the counters existed gets them on open
+        store.db.execute("DELETE FROM function_counts")
+        reopened = SQLiteRunStore(SQLiteDatabase(db_path))
+        assert reopened.list_runs(function_name="add", status="success")["total"] == 1
+        assert reopened.list_runs(function_name="add")["total"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_event_bus_fanout(self, db_path, tmp_path):
+        """Events published by one worker are read and awaited by another"""
+        notify_dir = str(tmp_path / "notify")
+        publisher = SQLiteEventBus(SQLiteDatabase(db_path), notify_dir)
+        consumer = SQLiteEventBus(SQLiteDatabase(db_path), notify_dir)
+        publisher.publish("run_1", {"type": "log", "message": "one"})
+        
+        waiter = asyncio.create_task(consumer.wait("run_1", timeout=5))
+        await asyncio.sleep(0.1)
+        publisher.publish("run_1", {"type": "log", "message": "two"})
+        await asyncio.wait_for(waiter, timeout=1)
+        
+        assert [e["message"] for e in consumer.read("run_1")] == ["one", "two"]
+        assert [e["message"] for e in consumer.read("run_1", 1)] == ["two"]
+    
+    def test_event_bus_seal_and_prune(self, db_path, tmp_path):
+        """Sealing keeps only the last snapshot and prunes runs idle past the retention"""
+        bus = SQLiteEventBus(SQLiteDatabase(db_path), str(tmp_path / "notify"))
+        for step in ("one", "two"):
+            bus.publish("run_1", {"type": "step_complete", "step": step, "data": {"status": "running"}})
+        bus.publish("run_1", {"type": "complete"})
+        bus.publish("run_old", {"type": "log", "message": "old"})
+        old = time.time() - 8 * 86400
+        os.utime(tmp_path / "notify" / "run_old", (old, old))
+        
+        bus.seal("run_1")
+        
+        events = bus.read("run_1")
+        assert [e["type"] for e in events] == ["step_complete", "step_complete", "complete"]
+        assert "data" not in events[0] and events[1]["data"] == {"status": "running"}
+        assert bus.read("run_old") == []
+        assert not (tmp_path / "notify" / "run_old").exists()
+
+
+class TestRunRecords:
+    """Tests for compact run records and the content-addressed blob store"""
+    
+    CODE = "def add(a, b):\n    return a + b\n" * 200
+    
+    def _run(self, run_id, status="running"):
+        run = TestSQLiteStateBackend()._run(run_id, "2024-01-01T00:00:00", status=status)
+        run.code = self.CODE
+        run.generated_tests = f"def test_{run_id}():\n    assert True\n"
+        run.checkpoints = {"generate_tests": {"generated_tests": run.generated_tests}}
+        return run
+    
+    def test_finished_runs_are_packed(self):
+        """Final runs become slotted records sharing one copy of identical text"""
+        store = MemoryRunStore()
+        for i in range(3):
+            run = self._run(f"run_{i}")
+            store.add(run)
+            run.status = "success"
+            store.save(run)
+        
+        record = store._records["run_0"]
+        assert not hasattr(record, "__dict__")
+        assert "def add" not in record.meta
+        assert not store._live
+        # One code and one test output blob, plus the tests and checkpoints of each run
+        assert len(store.blobs) == 2 + 2 * 3
+        
+        run = store["run_1"]
+        assert run.code == self.CODE
+        assert run.checkpoints["generate_tests"]["generated_tests"].startswith("def test_run_1")
+        assert store.list_runs()["items"][0]["run_id"] == "run_2"
+    
+    def test_view_loads_requested_blobs_only(self):
+        store = MemoryRunStore()
+        run = self._run("run_1", status="success")
+        store.add(run)
+        store.save(run)
+        
+        with patch.object(store.blobs, "get", wraps=store.blobs.get) as get:
+            summary = store.view("run_1", {"run_id", "status", "coverage_summary"})
+            assert summary["status"] == "success" and "code" not in summary
+            get.assert_not_called()
+            assert store.view("run_1", {"code"}) == {"code": self.CODE}
+            assert get.call_count == 1
+    
+    def test_retried_run_is_live_again(self):
+        """Saving a non-final status turns the record back into a working copy"""
+        store = MemoryRunStore()
+        run = self._run("run_1", status="failed")
+        store.add(run)
+        store.save(run)
+        
+        run = store.checkout("run_1")
+        run.status = "queued"
+        store.save(run)
+        assert store["run_1"] is run
+        assert "run_1" not in store._records
+    
+    def test_release_drops_finished_working_copy(self):
+        """A finished run checked out but never saved goes back to its record"""
+        store = MemoryRunStore()
+        run = self._run("run_1", status="success")
+        store.add(run)
+        store.save(run)
+        
+        store.checkout("run_1")
+        store.release("run_1")
+        assert not store._live
+    
+    def test_sqlite_rows_reference_blobs(self, tmp_path):
+        """Finished rows hold digests into the shared blobs table; older inline rows still load"""
+        db = SQLiteDatabase(str(tmp_path / "state.db"))
+        store = SQLiteRunStore(db)
+        for run_id in ("run_1", "run_2"):
+            run = self._run(run_id)
+            blobs_before = len(store.blobs)
+            store.add(run)
+            # Steps of a run in progress do not leave blobs behind
+            for step in range(3):
+                run.generated_tests = f"def test_{run_id}_{step}():\n    assert True\n"
+                store.save(run)
+            assert len(store.blobs) == blobs_before
+            run.generated_tests = f"def test_{run_id}():\n    assert True\n"
+            run.status = "success"
+            store.save(run)
+        data = db.execute("SELECT data FROM runs WHERE run_id = 'run_1'")[0][0]
+        assert "def add" not in data
+        assert len(store.blobs) == 2 + 2 * 2
+        
+        other = SQLiteRunStore(SQLiteDatabase(str(tmp_path / "state.db")))
+        assert other["run_2"].code == self.CODE
+        assert other.view("run_2", {"generated_tests"}) == {"generated_tests": "def test_run_2():\n    assert True\n"}
+        
+        legacy = self._run("run_3")
+        db.execute(
+            "INSERT INTO runs (run_id, status, function_name, created_at, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ("run_3", "running", "add", legacy.created_at, legacy.updated_at, legacy.json()),
+        )
+        assert other["run_3"].code == self.CODE
+
+
+class TestEventLog:
+    """Tests for the compressed per-run event log"""
+    
+    @pytest.fixture
+    def log(self, tmp_path):
+        with patch.dict(os.environ, {"EVENT_SEGMENT_EVENTS": "3"}):
+            yield EventLog(str(tmp_path / "events"))
+    
+    def _events(self, log, run_id, start, end):
+        for i in range(start, end):
+            event = {"type": "step_complete" if i % 2 else "log", "seq": i}
+            if i % 2:
+                event["data"] = {"status": "running", "seq": i}
+            log.append(run_id, event)
+    
+    def test_segments_and_tail(self, log):
+        """Full segments go to disk and reads from any offset span them and the tail"""
+        self._events(log, "run_1", 0, 7)
+        
+        assert len(os.listdir(os.path.join(log.root, "run_1"))) == 2
+        assert [event["seq"] for event in log.read("run_1")] == list(range(7))
+        assert [event["seq"] for event in log.read("run_1", 5)] == [5, 6]
+        assert list(log.read("run_1", 7)) == []
+        assert list(log.read("missing")) == []
+    
+    def test_seal_compacts_to_last_snapshot(self, log):
+        """A sealed run keeps nothing in memory, its offsets, and one snapshot"""
+        self._events(log, "run_1", 0, 7)
+        log.seal("run_1")
+        
+        assert len(log) == 0
+        assert os.listdir(os.path.join(log.root, "run_1")) == ["000000000000-000007.jsonl.gz"]
+        events = list(log.read("run_1"))
+        assert [event["seq"] for event in events] == list(range(7))
+        assert [event["seq"] for event in events if "data" in event] == [5]
+        
+        # A retried run appends after the compacted log
+        self._events(log, "run_1", 7, 9)
+        assert [event["seq"] for event in log.read("run_1", 6)] == [6, 7, 8]
+    
+    def test_prune_old_logs(self, log):
+        """Logs of runs idle past the retention are deleted; runs with a tail are kept"""
+        self._events(log, "run_old", 0, 4)
+        log.seal("run_old")
+        self._events(log, "run_live", 0, 4)
+        stale = time.time() - 3600
+        for run_id in ("run_old", "run_live"):
+            os.utime(os.path.join(log.root, run_id), (stale, stale))
+        
+        assert log.prune(60) == 1
+        assert list(log.read("run_old")) == []
+        assert len(list(log.read("run_live"))) == 4
+        assert log.prune(60) == 0
+
+
+class TestJobQueue:
+    """Tests for the durable pipeline job queue"""
+    
+    @pytest.fixture
+    def queue(self, tmp_path):
+        return JobQueue(SQLiteDatabase(str(tmp_path / "state.db")), lease_seconds=30)
+    
+    def test_claim_in_order(self, queue):
+        """Jobs are leased oldest first and only once"""
+        queue.enqueue("run_1", {"function_name": "add"})
+        queue.enqueue("run_2", {"function_name": "sub"})
+        
+        assert queue.claim("worker_a") == ("run_1", {"function_name": "add"}, 1)
+        assert queue.claim("worker_b")[0] == "run_2"
+        assert queue.claim("worker_c") is None
+        assert queue.stats()["leased"] == 2
+    
+    def test_expired_lease_is_reclaimed(self, queue):
+        """A job whose worker stopped renewing its lease goes to another worker"""
+        queue.enqueue("run_1", {})
+        queue.claim("worker_a")
+        queue.db.execute("UPDATE jobs SET lease_expires = 0")
+        assert queue.stats()["expired"] == 1
+        
+        assert queue.claim("worker_b") == ("run_1", {}, 2)
+        assert not queue.heartbeat("run_1", "worker_a")
+        assert queue.heartbeat("run_1", "worker_b")
+        
+        # The worker that lost the lease cannot finish the job
+        assert not queue.complete("run_1", "worker_a")
+        assert queue.stats()["leased"] == 1
+        assert queue.complete("run_1", "worker_b")
+        assert queue.claim("worker_c") is None
+        assert queue.stats()["done"] == 1
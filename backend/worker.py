@@ -0,0 +1,80 @@
+"""Pipeline worker: executes queued runs outside the API process
+
+Start the API with VERITAS_EXECUTION=queue and VERITAS_STATE_BACKEND=sqlite,
+then run one or more workers against the same state database:
+
+    VERITAS_EXECUTION=queue VERITAS_STATE_BACKEND=sqlite python worker.py
+"""
+import asyncio
+import os
+import socket
+import uuid
+
+from main import execute_pipeline, job_queue, runs, set_run_status
+from models import StartRunPayload
+
+
+async def process_job(worker_id: str, run_id: str, payload: dict, attempts: int):
+    """Execute one leased job, renewing its lease until the pipeline finishes"""
+    if attempts > job_queue.max_attempts:
+        # The run crashed every worker that picked it up; stop retrying it
+        print(f"[Worker {worker_id}] Giving up on {run_id} after {attempts - 1} attempts")
+        run = runs.checkout(run_id)
+        set_run_status(run, "failed")
+        runs.release(run_id)
+        job_queue.complete(run_id, worker_id)
+        return
+
+    pipeline = asyncio.create_task(execute_pipeline(run_id, StartRunPayload(**payload)))
+    lost = asyncio.Event()
+
+    async def keep_lease():
+        while True:
+            await asyncio.sleep(job_queue.lease_seconds / 3)
+            if not job_queue.heartbeat(run_id, worker_id):
+                # Another worker owns the job now; stop before both write the run
+                print(f"[Worker {worker_id}] Lost lease on {run_id}, stopping")
+                lost.set()
+                pipeline.cancel()
+                return
+
+    heartbeat = asyncio.create_task(keep_lease())
+    try:
+        await pipeline
+    except asyncio.CancelledError:
+        if not lost.is_set():
+            raise
+        return
+    finally:
+        heartbeat.cancel()
+    job_queue.complete(run_id, worker_id)
+
+
+async def worker_loop(worker_id: str, poll_interval: float):
+    while True:
+        job = job_queue.claim(worker_id)
+        if job is None:
+            await asyncio.sleep(poll_interval)
+            continue
+        run_id, payload, attempts = job
+        print(f"[Worker {worker_id}] Running {run_id} (attempt {attempts})")
+        try:
+            await process_job(worker_id, run_id, payload, attempts)
+        except Exception as e:
+            print(f"[Worker {worker_id}] Error processing {run_id}: {e}")
+
+
+async def main():
+    if job_queue is None:
+        raise SystemExit("worker.py requires VERITAS_EXECUTION=queue")
+    concurrency = int(os.getenv("WORKER_CONCURRENCY", "2"))
+    poll_interval = float(os.getenv("WORKER_POLL_INTERVAL", "0.5"))
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    print(f"[Worker {worker_id}] Started with concurrency {concurrency}")
+    await asyncio.gather(*(
+        worker_loop(f"{worker_id}/{slot}", poll_interval) for slot in range(concurrency)
+    ))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -36,6 +36,44 @@ export default function RepoConnectCard({ options, onOptionsChange }: RepoConnec
             className="mt-1 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
           />
         </div>
+        <div>
+          <label className="block text-sm font-medium text-neutral-700">
+            Test File Path
+          </label>
+          <input
+            type="text"
+            placeholder="experiments/<run>/test_<function>.py"
+            value={options.testPath || ''}
+            onChange={(e) => onOptionsChange({ testPath: e.target.value || undefined })}
+            className="mt-1 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
+          />
+        </div>
+        <div>
+          <label className="block text-sm font-medium text-neutral-700">
+            Local Checkout
+          </label>
+          <input
+            type="text"
+            placeholder="/srv/checkouts/repo"
+            value={options.localRepo || ''}
+            onChange={(e) => onOptionsChange({ localRepo: e.target.value || undefined })}
+            className="mt-1 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
+          />
+        </div>
+        {options.localRepo && (
+          <div>
+            <label className="block text-sm font-medium text-neutral-700">
+              Module Path
+            </label>
+            <input
+              type="text"
+              placeholder="src/package/module.py"
+              value={options.modulePath || ''}
+              onChange={(e) => onOptionsChange({ modulePath: e.target.value || undefined })}
+              className="mt-1 block w-full rounded-md border border-neutral-300 px-3 py-2 text-sm focus:border-sage-500 focus:outline-none focus:ring-1 focus:ring-sage-500"
+            />
+          </div>
+        )}
         <div className="flex items-center">
           <input
             type="checkbox"
@@ -51,7 +89,7 @@ export default function RepoConnectCard({ options, onOptionsChange }: RepoConnec
         {options.createPR && (
           <div className="rounded-md bg-sage-50 p-3 text-sm text-sage-800">
             When enabled, veritas-pytest will open a pull request with the generated tests after the run completes.
-            Outputs will be written to <code className="font-mono">experiments/</code> in the target repository.
+            Outputs will be written to {options.testPath ? <code className="font-mono">{options.testPath}</code> : <code className="font-mono">experiments/</code>} in the target repository.
           </div>
         )}
       </div>
@@ -13,6 +13,9 @@ const stepLabels: Record<PipelineStepName, string> = {
   run_tests: 'Run Tests',
   fix_tests: 'Fix Tests',
   coverage_report: 'Coverage Report',
+  mutation_testing: 'Mutation Testing',
+  minimize_suite: 'Minimize Suite',
+  profile_tests: 'Profile Tests',
   pr_ready_output: 'PR-Ready Output',
   open_pr: 'Open PR',
 }
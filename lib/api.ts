@@ -1,4 +1,4 @@
-import { RunResult, RunEvent, StartRunPayload, PipelineStepName } from './types'
+import { RunResult, RunEvent, StartRunPayload, PipelineStepName, RunPage, RunArtifact, TestCoverage, SuiteMinimization, SuiteProfile } from './types'
 import { saveRun } from './storage'
 
 // API configuration - set NEXT_PUBLIC_USE_MOCK_API=false to use real backend
@@ -50,6 +50,18 @@ function generateMockRunResult(payload: StartRunPayload): RunResult {
     { name: 'pr_ready_output', status: 'queued' },
   ]
   
+  if (payload.options.mutationTesting) {
+    steps.splice(6, 0, { name: 'mutation_testing', status: 'queued' })
+  }
+  
+  if (payload.options.minimizeSuite) {
+    steps.splice(steps.length - 1, 0, { name: 'minimize_suite', status: 'queued' })
+  }
+  
+  if (payload.options.profileTests) {
+    steps.splice(steps.length - 1, 0, { name: 'profile_tests', status: 'queued' })
+  }
+  
   if (payload.options.createPR) {
     steps.push({ name: 'open_pr', status: 'queued' })
   }
@@ -166,6 +178,16 @@ export async function startRun(payload: StartRunPayload): Promise<string> {
         create_pr: payload.options.createPR,
         repo_url: payload.options.repoUrl,
         branch: payload.options.branch,
+        test_path: payload.options.testPath,
+        flaky_reruns: payload.options.flakyReruns,
+        flaky_action: payload.options.flakyAction,
+        mutation_testing: payload.options.mutationTesting,
+        mutation_threshold: payload.options.mutationThreshold,
+        minimize_suite: payload.options.minimizeSuite,
+        local_repo: payload.options.localRepo,
+        module_path: payload.options.modulePath,
+        profile_tests: payload.options.profileTests,
+        slow_test_seconds: payload.options.slowTestSeconds,
       },
     }),
   }).catch((error) => {
@@ -201,54 +223,15 @@ export async function getRun(runId: string): Promise<RunResult | null> {
   // Real API call
   try {
     const apiBase = getApiBase()
-    const response = await fetch(`${apiBase}/runs/${runId}`)
+    // Poll the summary; the large fields are fetched by getRunArtifact when shown
+    const response = await fetch(`${apiBase}/runs/${runId}?view=summary`)
     if (!response.ok) {
       return null
     }
     const data = await response.json()
     
     // Transform backend format to frontend format
-    return {
-      runId: data.run_id,
-      status: data.status,
-      functionName: data.function_name,
-      code: data.code,
-      options: {
-        maxIterations: data.options.max_iterations,
-        testStyle: data.options.test_style,
-        coverageThreshold: data.options.coverage_threshold,
-        edgeCaseCategories: data.options.edge_case_categories,
-        createPR: data.options.create_pr,
-        repoUrl: data.options.repo_url,
-        branch: data.options.branch,
-      },
-      inferredSpec: data.inferred_spec,
-      edgeCases: data.edge_cases,
-      generatedTests: data.generated_tests,
-      testRunOutput: {
-        stdout: data.test_run_output.stdout,
-        stderr: data.test_run_output.stderr,
-        exitCode: data.test_run_output.exit_code,
-      },
-      coverageSummary: {
-        lines: data.coverage_summary.lines,
-        branches: data.coverage_summary.branches,
-        functions: data.coverage_summary.functions,
-        files: data.coverage_summary.files,
-      },
-      patchDiff: data.patch_diff,
-      pr: data.pr ? {
-        title: data.pr.title,
-        body: data.pr.body,
-        url: data.pr.url,
-        changedFiles: data.pr.changed_files,
-      } : undefined,
-      artifactsPath: data.artifacts_path,
-      iterationsUsed: data.iterations_used,
-      steps: data.steps,
-      createdAt: data.created_at,
-      updatedAt: data.updated_at,
-    }
+    return transformBackendRunToFrontend(data)
   } catch (error) {
     console.error('Error fetching run:', error)
     return null
@@ -339,15 +322,25 @@ function transformBackendRunToFrontend(data: any): RunResult {
       createPR: data.options.create_pr,
       repoUrl: data.options.repo_url,
       branch: data.options.branch,
+      testPath: data.options.test_path,
+      flakyReruns: data.options.flaky_reruns,
+      flakyAction: data.options.flaky_action,
+      mutationTesting: data.options.mutation_testing,
+      mutationThreshold: data.options.mutation_threshold,
+      minimizeSuite: data.options.minimize_suite,
+      localRepo: data.options.local_repo,
+      modulePath: data.options.module_path,
+      profileTests: data.options.profile_tests,
+      slowTestSeconds: data.options.slow_test_seconds,
     },
     inferredSpec: data.inferred_spec,
     edgeCases: data.edge_cases,
     generatedTests: data.generated_tests,
-    testRunOutput: {
+    testRunOutput: data.test_run_output ? {
       stdout: data.test_run_output.stdout,
       stderr: data.test_run_output.stderr,
       exitCode: data.test_run_output.exit_code,
-    },
+    } : undefined,
     coverageSummary: {
       lines: data.coverage_summary.lines,
       branches: data.coverage_summary.branches,
@@ -363,6 +356,9 @@ function transformBackendRunToFrontend(data: any): RunResult {
     } : undefined,
     artifactsPath: data.artifacts_path,
     iterationsUsed: data.iterations_used,
+    mutationScore: data.mutation_score,
+    minimization: mapMinimization(data.minimization),
+    profile: mapProfile(data.profile),
     steps: data.steps,
     createdAt: data.created_at,
     updatedAt: data.updated_at,
@@ -392,6 +388,18 @@ function streamMockEvents(
       'pr_ready_output',
     ]
     
+    if (payload.options.mutationTesting) {
+      stepNames.splice(6, 0, 'mutation_testing')
+    }
+    
+    if (payload.options.minimizeSuite) {
+      stepNames.splice(stepNames.length - 1, 0, 'minimize_suite')
+    }
+    
+    if (payload.options.profileTests) {
+      stepNames.splice(stepNames.length - 1, 0, 'profile_tests')
+    }
+    
     if (payload.options.createPR) {
       stepNames.push('open_pr')
     }
@@ -496,6 +504,31 @@ function streamMockEvents(
           })
           break
           
+        case 'mutation_testing':
+          run.mutationScore = 85
+          onEvent({
+            type: 'log',
+            message: `✓ Mutation score: ${run.mutationScore}% (17 of 20 mutants killed)`,
+            timestamp: new Date().toISOString(),
+          })
+          break
+          
+        case 'minimize_suite':
+          onEvent({
+            type: 'log',
+            message: '✓ No redundant tests found',
+            timestamp: new Date().toISOString(),
+          })
+          break
+          
+        case 'profile_tests':
+          onEvent({
+            type: 'log',
+            message: '✓ Suite profiled: 0.42s across 8 test(s)',
+            timestamp: new Date().toISOString(),
+          })
+          break
+          
         case 'pr_ready_output':
           run.patchDiff = `diff --git a/experiments/${runId}/test_${payload.functionName}.py b/experiments/${runId}/test_${payload.functionName}.py
 new file mode 100644
@@ -503,7 +536,7 @@ index 0000000..1234567
 --- /dev/null
 +++ b/experiments/${runId}/test_${payload.functionName}.py
 @@ -0,0 +1,25 @@
-${run.generatedTests.split('\n').map((l, i) => `+${l}`).join('\n')}
+${(run.generatedTests ?? '').split('\n').map((l, i) => `+${l}`).join('\n')}
 `
           onEvent({
             type: 'log',
@@ -517,7 +550,7 @@ ${run.generatedTests.split('\n').map((l, i) => `+${l}`).join('\n')}
           if (payload.options.repoUrl) {
             run.pr = {
               title: `Add tests for ${payload.functionName}`,
-              body: `This PR adds comprehensive test coverage for \`${payload.functionName}\`.\n\n- Coverage: ${run.coverageSummary.lines}% lines, ${run.coverageSummary.branches}% branches\n- Generated ${run.generatedTests.split('def test_').length - 1} test cases\n- Output location: \`experiments/${runId}/\`\n\nNote: This is a mock PR. In production, a real PR would be created.`,
+              body: `This PR adds comprehensive test coverage for \`${payload.functionName}\`.\n\n- Coverage: ${run.coverageSummary.lines}% lines, ${run.coverageSummary.branches}% branches\n- Generated ${(run.generatedTests ?? '').split('def test_').length - 1} test cases\n- Output location: \`experiments/${runId}/\`\n\nNote: This is a mock PR. In production, a real PR would be created.`,
               url: undefined, // No URL in mock mode
               changedFiles: [`experiments/${runId}/test_${payload.functionName}.py`],
             }
@@ -529,7 +562,7 @@ ${run.generatedTests.split('\n').map((l, i) => `+${l}`).join('\n')}
           } else {
             run.pr = {
               title: `Add tests for ${payload.functionName}`,
-              body: `This PR adds comprehensive test coverage for \`${payload.functionName}\`.\n\n- Coverage: ${run.coverageSummary.lines}% lines, ${run.coverageSummary.branches}% branches\n- Generated ${run.generatedTests.split('def test_').length - 1} test cases\n- Output location: \`experiments/${runId}/\`\n\nError: Repository URL not provided. Cannot create PR.`,
+              body: `This PR adds comprehensive test coverage for \`${payload.functionName}\`.\n\n- Coverage: ${run.coverageSummary.lines}% lines, ${run.coverageSummary.branches}% branches\n- Generated ${(run.generatedTests ?? '').split('def test_').length - 1} test cases\n- Output location: \`experiments/${runId}/\`\n\nError: Repository URL not provided. Cannot create PR.`,
               url: undefined,
               changedFiles: [`experiments/${runId}/test_${payload.functionName}.py`],
             }
@@ -572,6 +605,80 @@ ${run.generatedTests.split('\n').map((l, i) => `+${l}`).join('\n')}
   return cancel
 }
 
+function mapMinimization(data: any): SuiteMinimization | null {
+  if (!data) {
+    return null
+  }
+  return {
+    originalTests: data.original_tests,
+    minimizedTests: data.minimized_tests,
+    removed: data.removed,
+    originalSeconds: data.original_seconds,
+    minimizedSeconds: data.minimized_seconds,
+    runtimeReduction: data.runtime_reduction,
+    originalLines: data.original_lines,
+    minimizedLines: data.minimized_lines,
+    sizeReduction: data.size_reduction,
+    applied: data.applied,
+  }
+}
+
+function mapProfile(data: any): SuiteProfile | null {
+  if (!data) {
+    return null
+  }
+  return {
+    totalSeconds: data.total_seconds,
+    durations: data.durations,
+    slowTests: data.slow_tests,
+    slowThresholdSeconds: data.slow_threshold_seconds,
+    target: data.target ? {
+      calls: data.target.calls,
+      selfSeconds: data.target.self_seconds,
+      cumulativeSeconds: data.target.cumulative_seconds,
+    } : null,
+    hotFunctions: data.hot_functions.map((row: any) => ({
+      function: row.function,
+      file: row.file,
+      line: row.line,
+      calls: row.calls,
+      selfSeconds: row.self_seconds,
+      cumulativeSeconds: row.cumulative_seconds,
+    })),
+  }
+}
+
+export async function getRunArtifact(runId: string, artifact: RunArtifact): Promise<string | null> {
+  if (USE_MOCK) {
+    const { getRun: getStoredRun } = await import('./storage')
+    const run = getStoredRun(runId)
+    if (!run) {
+      return null
+    }
+    const artifacts: Record<RunArtifact, string | undefined> = {
+      code: run.code,
+      generated_tests: run.generatedTests,
+      stdout: run.testRunOutput?.stdout,
+      stderr: run.testRunOutput?.stderr,
+      patch_diff: run.patchDiff,
+      coverage: JSON.stringify(run.coverageSummary),
+      profile: undefined,
+    }
+    return artifacts[artifact] ?? null
+  }
+
+  // Real API call
+  const apiBase = getApiBase()
+  const response = await fetch(`${apiBase}/runs/${runId}/artifacts/${artifact}`)
+  if (response.status === 404) {
+    return null
+  }
+  if (!response.ok) {
+    throw new Error(`Failed to get ${artifact}: ${response.statusText}`)
+  }
+  return response.text()
+}
+
 export async function cancelRun(runId: string): Promise<void> {
   if (USE_MOCK) {
     const { getRun: getStoredRun, saveRun: saveStoredRun } = await import('./storage')
@@ -593,3 +700,82 @@ export async function cancelRun(runId: string): Promise<void> {
     throw new Error(`Failed to cancel run: ${response.statusText}`)
   }
 }
+
+export async function retryRun(runId: string, fromStep?: PipelineStepName): Promise<void> {
+  if (USE_MOCK) {
+    const { getRun: getStoredRun, saveRun: saveStoredRun } = await import('./storage')
+    const run = getStoredRun(runId)
+    if (run) {
+      run.status = 'queued'
+      saveStoredRun(run)
+    }
+    return
+  }
+
+  // Real API call
+  const apiBase = getApiBase()
+  const params = fromStep ? `?${new URLSearchParams({ from_step: fromStep })}` : ''
+  const response = await fetch(`${apiBase}/runs/${runId}/retry${params}`, {
+    method: 'POST',
+  })
+
+  if (!response.ok) {
+    throw new Error(`Failed to retry run: ${response.statusText}`)
+  }
+}
+
+export async function listRuns(cursor?: string, limit = 50): Promise<RunPage> {
+  if (USE_MOCK) {
+    const { getAllRuns } = await import('./storage')
+    const items = getAllRuns()
+    return { items, nextCursor: null, total: items.length }
+  }
+
+  // Real API call
+  const apiBase = getApiBase()
+  const params = new URLSearchParams({ limit: String(limit) })
+  if (cursor) {
+    params.set('cursor', cursor)
+  }
+  const response = await fetch(`${apiBase}/runs?${params}`)
+  if (!response.ok) {
+    throw new Error(`Failed to list runs: ${response.statusText}`)
+  }
+  const data = await response.json()
+  return {
+    items: data.items.map((item: any) => ({
+      runId: item.run_id,
+      status: item.status,
+      functionName: item.function_name,
+      coverageSummary: item.coverage_summary,
+      iterationsUsed: item.iterations_used,
+      createdAt: item.created_at,
+      updatedAt: item.updated_at,
+    })),
+    nextCursor: data.next_cursor,
+    total: data.total,
+  }
+}
+
+export async function getTestCoverage(runId: string, line?: number): Promise<TestCoverage | null> {
+  if (USE_MOCK) {
+    return null
+  }
+
+  // Real API call
+  const apiBase = getApiBase()
+  const params = line !== undefined ? `?${new URLSearchParams({ line: String(line) })}` : ''
+  const response = await fetch(`${apiBase}/runs/${runId}/test-coverage${params}`)
+  if (response.status === 404) {
+    return null
+  }
+  if (!response.ok) {
+    throw new Error(`Failed to get test coverage: ${response.statusText}`)
+  }
+  const data = await response.json()
+  return {
+    runId: data.run_id,
+    tests: data.tests,
+    lines: data.lines,
+  }
+}
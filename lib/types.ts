@@ -5,6 +5,9 @@ export type PipelineStepName =
   | 'run_tests'
   | 'fix_tests'
   | 'coverage_report'
+  | 'mutation_testing'
+  | 'minimize_suite'
+  | 'profile_tests'
   | 'pr_ready_output'
   | 'open_pr'
 
@@ -37,6 +40,53 @@ export interface RunOptions {
   createPR: boolean
   repoUrl?: string
   branch?: string
+  testPath?: string
+  flakyReruns?: number
+  flakyAction?: 'quarantine' | 'fix'
+  mutationTesting?: boolean
+  mutationThreshold?: number
+  minimizeSuite?: boolean
+  localRepo?: string
+  modulePath?: string
+  profileTests?: boolean
+  slowTestSeconds?: number
+}
+
+export interface SuiteMinimization {
+  originalTests: number
+  minimizedTests: number
+  removed: string[]
+  originalSeconds: number
+  minimizedSeconds: number
+  runtimeReduction: number
+  originalLines: number
+  minimizedLines: number
+  sizeReduction: number
+  applied: boolean
+}
+
+export interface TestDuration {
+  test: string
+  seconds: number
+  passed: boolean
+}
+
+export interface HotFunction {
+  function: string
+  file: string
+  line: number
+  calls: number
+  selfSeconds: number
+  cumulativeSeconds: number
+}
+
+export interface SuiteProfile {
+  totalSeconds: number
+  durations: TestDuration[]
+  slowTests: string[]
+  slowThresholdSeconds: number
+  target: { calls: number; selfSeconds: number; cumulativeSeconds: number } | null
+  hotFunctions: HotFunction[]
 }
 
 export interface CoverageFile {
@@ -64,26 +114,43 @@ export interface RunResult {
   runId: string
   status: RunStatus
   functionName: string
-  code: string
+  // Large fields are left out of the summary view; load them with getRunArtifact
+  code?: string
   options: RunOptions
   inferredSpec: string
   edgeCases: string[]
-  generatedTests: string
-  testRunOutput: {
+  generatedTests?: string
+  testRunOutput?: {
     stdout: string
     stderr: string
     exitCode: number
   }
   coverageSummary: CoverageSummary
-  patchDiff: string
+  patchDiff?: string
   pr?: PRInfo
   artifactsPath: string
   iterationsUsed: number
+  mutationScore?: number | null
+  minimization?: SuiteMinimization | null
+  profile?: SuiteProfile | null
   steps: PipelineStep[]
   createdAt: string
   updatedAt: string
 }
 
+export type RunArtifact = 'code' | 'generated_tests' | 'stdout' | 'stderr' | 'patch_diff' | 'coverage' | 'profile'
+
+export type RunSummary = Pick<
+  RunResult,
+  'runId' | 'status' | 'functionName' | 'coverageSummary' | 'iterationsUsed' | 'createdAt' | 'updatedAt'
+>
+
+export interface RunPage {
+  items: RunSummary[]
+  nextCursor: string | null
+  total: number | null
+}
+
 export interface RunEvent {
   type: 'step_start' | 'step_complete' | 'step_error' | 'log' | 'run_complete'
   step?: PipelineStepName
@@ -92,6 +159,12 @@ export interface RunEvent {
   timestamp: string
 }
 
+export interface TestCoverage {
+  runId: string
+  tests: Record<string, { lines: number[]; arcs: [number, number][] }>
+  lines: Record<string, string[]>
+}
+
 export interface StartRunPayload {
   code: string
   functionName: string